@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Full-text and trigram product search
     'django.contrib.sites',  # Required for allauth
     'allauth',  # Allauth packages
     'allauth.account',
@@ -108,6 +109,33 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Shared by every worker process and management command: cached payloads
+# (homepage, cart quotes, PDP matrix, ...) are invalidated by bumping version
+# keys, and a bump made in one process must reach all of them.
+# Production runs on Redis (REDIS_URL=redis://host:6379/0, client in requirements.txt):
+# every version read and quote lookup is a cache round trip, cheap on Redis.
+# Without REDIS_URL the cache is a table in the database (created by cart
+# migration 0003), correct but one SQL query per cache call: development only.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -159,6 +187,10 @@ AUTH_USER_MODEL = 'accounts.User'
 # MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
+# Rendered invoice PDFs (order.invoices): not public, served by the download view only
+INVOICE_STORAGE_ROOT = os.getenv('INVOICE_STORAGE_ROOT', str(BASE_DIR / 'private' / 'invoices'))
+INVOICE_RENDER_WORKERS = int(os.getenv('INVOICE_RENDER_WORKERS', '2'))
+
 if os.getenv('PROJECT_STATUS') == 'DEVELOPMENT':
     EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
@@ -245,3 +277,10 @@ SOCIALACCOUNT_PROVIDERS = {
 
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
+
+# order.gateway: 'razorpay', or 'fake' for offline checkout load tests
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'razorpay')
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_CONNECT_TIMEOUT', '3.05'))
+PAYMENT_GATEWAY_READ_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_READ_TIMEOUT', '10'))
+PAYMENT_GATEWAY_RETRIES = int(os.getenv('PAYMENT_GATEWAY_RETRIES', '2'))
+PAYMENT_GATEWAY_FAKE_LATENCY = float(os.getenv('PAYMENT_GATEWAY_FAKE_LATENCY', '0'))
@@ -28,9 +28,14 @@ from decimal import Decimal
 from .models import User, Address, Wishlist, WalletTransaction, Wallet
 from order.models import Order, OrderItem, ProductReview, ProductReviewImage
 from products.models import ProductVariant, Product
+from products.utils import update_review_summary
+from products.inventory import restock
+from order.reservations import holds_reserved_stock, release_reservations
+from adminpanel.pagination import KeysetPaginationMixin
 import cloudinary.uploader
 import uuid
 from cart.models import Cart
+from cart.utils import refresh_cart_count
 
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
@@ -750,7 +755,7 @@ class PasswordView(LoginRequiredMixin, View):
             return render(request, self.template_name)
 
 
-class OrderListView(LoginRequiredMixin, ListView):
+class OrderListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
 
     model = Order
     template_name = 'accounts/order_list.html'
@@ -841,7 +846,7 @@ class OrderCancelView(LoginRequiredMixin, View):
                     }, status=400)
 
                 reason = request.POST.get('cancel_reason', 'Cancelled by user')
-                cancellable_items = order.items.select_related('product_variant').filter(
+                cancellable_items = order.items.filter(
                     status__in=['pending', 'confirmed']
                     )
 
@@ -851,9 +856,11 @@ class OrderCancelView(LoginRequiredMixin, View):
                     item.cancelled_at = timezone.now()
                     item.save(update_fields=['status', 'cancel_reason', 'cancelled_at'])
 
-                    variant = item.product_variant
-                    variant.stock += item.quantity
-                    variant.save(update_fields=['stock'])
+                if holds_reserved_stock(order):
+                    # Unpaid online order: only its still reserved stock goes back
+                    release_reservations(order)
+                else:
+                    restock([(item.product_variant_id, item.quantity) for item in cancellable_items])
 
                 refunded_to_wallet = False
                 can_refund = (
@@ -926,9 +933,10 @@ class OrderItemCancelView(LoginRequiredMixin, View):
                 item.cancelled_at = timezone.now()
                 item.save()
 
-                variant = item.product_variant
-                variant.stock += item.quantity
-                variant.save(update_fields=['stock'])
+                if holds_reserved_stock(order):
+                    release_reservations(order, variant_ids=[item.product_variant_id])
+                else:
+                    restock([(item.product_variant_id, item.quantity)])
 
                 order.sub_total -= (item.price_at_purchase * item.quantity)
                 order.total_amount -= refund_amount
@@ -1114,6 +1122,7 @@ class AddtoCartWishlistItem(LoginRequiredMixin, View):
 
                 logger.info(f'User {request.user.id} deleted variant {variant_id} from wishlist for add to cart')
 
+            refresh_cart_count(request)
             messages.success(request, 'Added to cart')
             return redirect('wishlist')
 
@@ -1127,7 +1136,7 @@ class AddtoCartWishlistItem(LoginRequiredMixin, View):
 
 
 @method_decorator(never_cache, name='dispatch')
-class WalletListView(LoginRequiredMixin, ListView):
+class WalletListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
 
     model = WalletTransaction
     template_name = 'accounts/wallet.html'
@@ -1206,13 +1215,15 @@ class AddReviewView(LoginRequiredMixin, View):
                     'success': False, 'message': 'You can only upload up to 5 images.'
                     }, status=400)
 
-            review_obj = ProductReview.objects.create(
-                user=request.user,
-                product=product,
-                variant=variant,
-                star=int(star),
-                review=review_text
-            )
+            with transaction.atomic():
+                review_obj = ProductReview.objects.create(
+                    user=request.user,
+                    product=product,
+                    variant=variant,
+                    star=int(star),
+                    review=review_text
+                )
+                update_review_summary(product.id, added_star=review_obj.star)
 
             # Handle Image Upload using Cloudinary directly
             for image in images:
@@ -1249,6 +1260,7 @@ class EditReviewView(LoginRequiredMixin, View):
     def post(self, request, review_id):
         try:
             review_obj = get_object_or_404(ProductReview, id=review_id, user=request.user)
+            old_star = review_obj.star
 
             star = request.POST.get('star')
             review_text = request.POST.get('review', '').strip()
@@ -1308,7 +1320,10 @@ class EditReviewView(LoginRequiredMixin, View):
                 except Exception as e:
                     logger.error(f"Cloudinary upload failed for review update: {e}")
 
-            review_obj.save()
+            with transaction.atomic():
+                review_obj.save()
+                if review_obj.star != old_star:
+                    update_review_summary(review_obj.product_id, added_star=review_obj.star, removed_star=old_star)
 
             return JsonResponse({'success': True, 'message': 'Review updated successfully.'})
 
@@ -1334,7 +1349,9 @@ class DeleteReviewView(LoginRequiredMixin, View):
                         logger.error(f"Failed to delete review image from Cloudinary during deletion: {e}")
 
             # Delete the parent object, cascades correctly to the ProductReviewImage models
-            review_obj.delete()
+            with transaction.atomic():
+                review_obj.delete()
+                update_review_summary(review_obj.product_id, removed_star=review_obj.star)
             return JsonResponse({'success': True, 'message': 'Review deleted successfully.'})
 
         except Exception as e:
@@ -0,0 +1,119 @@
+"""
+Sales analytics shared by the analytics page, the Excel export and the PDF report.
+
+sales_analytics(orders) computes every section of the report with grouped
+aggregates in the database, a fixed number of queries however many orders
+the period has. The top products section prorates the order level discounts
+(promotional + coupon) over the items in SQL: each item carries its line
+discount plus its share of the order discount, price * quantity / sub_total.
+"""
+from decimal import Decimal
+from django.db.models import Case, Count, DecimalField, F, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from order.models import OrderItem
+from returns.models import Return
+
+ZERO = Value(Decimal('0'), output_field=DecimalField())
+
+
+def safe_decimal(value):
+    return value if value is not None else Decimal('0')
+
+
+def order_summary(orders):
+    stats = orders.aggregate(
+        total_orders=Count('id'),
+        gross_revenue=Sum('sub_total'),
+        discount_amount=Sum('promotional_discount'),
+        coupon_discount_amount=Sum('coupon_discount'),
+    )
+    summary = {
+        'total_orders': stats['total_orders'],
+        'gross_revenue': safe_decimal(stats['gross_revenue']),
+        'discount_amount': safe_decimal(stats['discount_amount']),
+        'coupon_discount_amount': safe_decimal(stats['coupon_discount_amount']),
+    }
+    summary['overall_discount'] = summary['discount_amount'] + summary['coupon_discount_amount']
+    summary['net_revenue'] = summary['gross_revenue'] - summary['overall_discount']
+    return summary
+
+
+def return_summary(orders):
+    stats = Return.objects.filter(order__in=orders).aggregate(
+        total_returns=Count('id'),
+        accepted_returns=Count('id', filter=Q(status='accepted')),
+        total_refunded=Sum('refund_amount'),
+    )
+    return {
+        'total_returns': stats['total_returns'],
+        'accepted_returns': stats['accepted_returns'],
+        'total_refunded': safe_decimal(stats['total_refunded']),
+    }
+
+
+def payment_breakdown(orders):
+    """[{payment_method, total_amount, order_count}], largest amount first."""
+    return [
+        {**item, 'total_amount': safe_decimal(item['total_amount'])}
+        for item in orders.values('payment_method').annotate(
+            total_amount=Sum('total_amount'),
+            order_count=Count('id'),
+        ).order_by('-total_amount')
+    ]
+
+
+def coupon_breakdown(orders):
+    """[{coupon_code, discount_type, times_used, total_discount}], largest discount first."""
+    return [
+        {**item, 'total_discount': safe_decimal(item['total_discount'])}
+        for item in orders.filter(coupon__isnull=False).values(
+            coupon_code=F('coupon__coupon_code'),
+            discount_type=F('coupon__discount_type'),
+        ).annotate(
+            times_used=Count('id'),
+            total_discount=Sum('coupon_discount'),
+        ).order_by('-total_discount')
+    ]
+
+
+def top_products(orders, limit=10):
+    """
+    [{product_id, name, qty, gross_amount, discount, net_revenue}] of the limit
+    products with the highest gross amount, discount including the prorated
+    order discounts.
+    """
+    item_gross = F('price_at_purchase') * F('quantity')
+    order_discount = Coalesce('order__promotional_discount', ZERO) + Coalesce('order__coupon_discount', ZERO)
+    order_discount_share = Case(
+        When(order__sub_total__gt=0, then=item_gross * order_discount / F('order__sub_total')),
+        default=ZERO,
+        output_field=DecimalField(),
+    )
+
+    products = OrderItem.objects.filter(order__in=orders).values(
+        product_id=F('product_variant__product_id'),
+    ).annotate(
+        name=Min('product_name'),
+        qty=Sum('quantity'),
+        gross_amount=Sum(item_gross, output_field=DecimalField()),
+        discount=Sum(Coalesce('line_discount', ZERO) + order_discount_share, output_field=DecimalField()),
+    ).order_by('-gross_amount', 'product_id')[:limit]
+
+    return [
+        {**product, 'net_revenue': product['gross_amount'] - product['discount']}
+        for product in products
+    ]
+
+
+def sales_analytics(orders, product_limit=10):
+    """
+    Every section of the sales report for the orders queryset, in five queries:
+    order KPIs, returns, payment methods, coupons and top products.
+    """
+    return {
+        **order_summary(orders),
+        **return_summary(orders),
+        'payment_stats': payment_breakdown(orders),
+        'coupon_stats': coupon_breakdown(orders),
+        'top_products': top_products(orders, product_limit),
+    }
@@ -0,0 +1,303 @@
+import base64
+import binascii
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DatabaseError, connections
+from django.db.models import F, Q
+
+FIRST_PAGE = '1'
+LAST_PAGE = 'last'
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':'), default=_json_default).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Cannot put {type(value).__name__} in a cursor')
+
+
+def estimate_count(queryset):
+    """
+    Row estimate of the queryset from the PostgreSQL planner (EXPLAIN), no COUNT(*).
+    Returns None when the estimate is unavailable (other backends, explain errors).
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    try:
+        plan = json.loads(queryset.order_by().explain(format='json'))
+    except (DatabaseError, ValueError, TypeError):
+        return None
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPage:
+    """
+    Page of a KeysetPaginator. Mirrors the parts of django.core.paginator.Page the
+    templates use, next/previous_page_number return cursors instead of numbers.
+    """
+
+    def __init__(self, object_list, number, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Page {self.number} of ~{self.paginator.num_pages}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self.next_cursor
+
+    def previous_page_number(self):
+        return self.previous_cursor
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+
+class KeysetPaginator:
+    """
+    Cursor (keyset) paginator: pages continue from the sort key of the last row
+    seen (WHERE key > last ORDER BY key LIMIT n) instead of OFFSET, so every page
+    costs the same no matter how deep it is.
+
+    The ordering is read from the queryset (plain field / annotation names only)
+    and gets the primary key appended as a tie breaker. Nullable fields sort
+    NULLS LAST in both directions.
+
+    Cursors are opaque url-safe tokens. '1' (or anything unreadable) is the
+    first page and 'last' the final page, so old ?page=1 links keep working.
+    count is the planner estimate when estimate_count=True, small results
+    (below exact_count_below) are still counted exactly.
+    """
+
+    def __init__(self, queryset, per_page, estimate_count=True, exact_count_below=1000):
+        self.per_page = int(per_page)
+        self.estimate = estimate_count
+        self.exact_count_below = exact_count_below
+        self.ordering = self._resolve_ordering(queryset)
+        self.queryset = queryset.order_by(*self._order_expressions(reverse=False))
+        self._count = None
+        self._num_pages = None
+
+    # ----- ordering -----
+
+    def _resolve_ordering(self, queryset):
+        names = list(queryset.query.order_by or queryset.model._meta.ordering or [])
+        opts = queryset.model._meta
+        ordering = []
+
+        for name in names:
+            if not isinstance(name, str) or name == '?':
+                raise ValueError(f'KeysetPaginator only supports field names in order_by, got {name!r}')
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            if name == 'pk':
+                name = opts.pk.name
+            ordering.append((name, descending, self._is_nullable(opts, name)))
+
+        if not any(name == opts.pk.name for name, _, _ in ordering):
+            ordering.append((opts.pk.name, ordering[0][1] if ordering else False, False))
+        return ordering
+
+    @staticmethod
+    def _is_nullable(opts, name):
+        try:
+            return opts.get_field(name).null
+        except FieldDoesNotExist:
+            return False  # annotation
+
+    def _order_expressions(self, reverse):
+        expressions = []
+        for name, descending, nullable in self.ordering:
+            descending = descending != reverse
+            nulls = {}
+            if nullable:
+                nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+            expressions.append(F(name).desc(**nulls) if descending else F(name).asc(**nulls))
+        return expressions
+
+    def _seek_filter(self, values, reverse):
+        """
+        Rows strictly after `values` in the (possibly reversed) ordering:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q(pk__in=[])
+        equal = Q()
+
+        for (name, descending, nullable), value in zip(self.ordering, values):
+            forward = descending == reverse  # True -> next rows have a larger value
+            lookup = 'gt' if forward else 'lt'
+
+            if value is None:
+                # NULLs sort last: nothing follows them going forward, every value precedes them in reverse
+                after = Q(**{f'{name}__isnull': False}) if reverse else Q(pk__in=[])
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                after = Q(**{f'{name}__{lookup}': value})
+                if nullable and not reverse:
+                    after |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+
+            condition |= equal & after
+            equal &= same
+
+        return condition
+
+    def _key(self, obj):
+        opts = self.queryset.model._meta
+        values = []
+        for name, _, _ in self.ordering:
+            try:
+                attname = opts.get_field(name).attname
+            except FieldDoesNotExist:
+                attname = name
+            values.append(getattr(obj, attname))
+        return values
+
+    def _load_values(self, values):
+        opts = self.queryset.model._meta
+        loaded = []
+        for (name, _, _), value in zip(self.ordering, values):
+            if value is not None:
+                try:
+                    value = opts.get_field(name).to_python(value)
+                except FieldDoesNotExist:
+                    pass
+            loaded.append(value)
+        return loaded
+
+    # ----- counts -----
+
+    @property
+    def count(self):
+        if self._count is None:
+            count = estimate_count(self.queryset) if self.estimate else None
+            if count is None or count < self.exact_count_below:
+                count = self.queryset.count()
+            self._count = count
+        return self._count
+
+    @property
+    def num_pages(self):
+        if self._num_pages is None:
+            self._num_pages = max(1, math.ceil(self.count / self.per_page))
+        return self._num_pages
+
+    @property
+    def page_range(self):
+        return range(1, self.num_pages + 1)
+
+    # ----- pages -----
+
+    def _cursor(self, obj, reverse, number):
+        return encode_cursor({
+            'o': [name for name, _, _ in self.ordering],
+            'k': self._key(obj),
+            'r': reverse,
+            'n': number,
+        })
+
+    def _parse(self, cursor):
+        if not cursor or cursor == FIRST_PAGE:
+            return None
+        try:
+            payload = decode_cursor(cursor)
+            if payload['o'] != [name for name, _, _ in self.ordering] or len(payload['k']) != len(self.ordering):
+                return None
+            return self._load_values(payload['k']), bool(payload['r']), max(1, int(payload['n']))
+        except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+            # Stale or tampered cursors (and old ?page=N links) start over from the first page
+            return None
+
+    def page(self, cursor=None):
+        if cursor == LAST_PAGE:
+            rows = list(self.queryset.order_by(*self._order_expressions(reverse=True))[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            number = max(self.num_pages, 2) if has_more else 1
+            return self._build_page(rows, number, has_next=False, has_previous=has_more)
+
+        parsed = self._parse(cursor)
+        if parsed is None:
+            rows = list(self.queryset[:self.per_page + 1])
+            return self._build_page(rows[:self.per_page], 1, has_next=len(rows) > self.per_page, has_previous=False)
+
+        values, reverse, number = parsed
+        queryset = self.queryset.filter(self._seek_filter(values, reverse))
+        if reverse:
+            rows = list(queryset.order_by(*self._order_expressions(reverse=True))[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            # Walking back never goes below page 1, even if rows were added in between
+            return self._build_page(rows, number if has_more else 1, has_next=True, has_previous=has_more)
+
+        rows = list(queryset[:self.per_page + 1])
+        return self._build_page(rows[:self.per_page], number, has_next=len(rows) > self.per_page, has_previous=True)
+
+    def _build_page(self, rows, number, has_next, has_previous):
+        next_cursor = self._cursor(rows[-1], False, number + 1) if has_next and rows else None
+        previous_cursor = self._cursor(rows[0], True, number - 1) if has_previous and rows else None
+        if has_previous and not rows:
+            previous_cursor = LAST_PAGE
+
+        # Keep "page N of M" consistent when the estimate is off
+        if next_cursor is None:
+            self._num_pages = number
+            self._count = (number - 1) * self.per_page + len(rows)
+        elif self.num_pages <= number:
+            self._num_pages = number + 1
+
+        return KeysetPage(rows, number, self, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin swapping OFFSET pagination for KeysetPaginator.
+    Reads the cursor from the usual `page` query parameter, so templates that
+    preserve filters by dropping `page` (filter_params) keep working unchanged.
+    """
+    estimate_count = True
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, estimate_count=self.estimate_count)
+        page = paginator.page(self.request.GET.get(self.page_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
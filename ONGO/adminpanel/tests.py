@@ -1,3 +1,85 @@
-from django.test import TestCase
+import io
+from decimal import Decimal
+import openpyxl
+from django.test import RequestFactory, TestCase
+from accounts.models import Address, User
+from order.models import Order, OrderItem
+from products.models import Category, Product, ProductVariant
+from .analytics import sales_analytics
+from .utils import generate_analytics_excel
 
-# Create your tests here.
+
+class SalesAnalyticsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret-pass-1')
+        self.address = Address.objects.create(
+            user=self.user, name='Buyer', street_address='1 Street', city='Kochi', state='Kerala',
+            country='India', postal_code='682001', phone='9999999999',
+        )
+        category = Category.objects.create(name='Shirts')
+        self.variants = []
+        for number in range(3):
+            product = Product.objects.create(category=category, name=f'Shirt {number}', description='-')
+            self.variants.append(ProductVariant.objects.create(
+                product=product, size='M', color='Blue', price=Decimal('100'), stock=5, sku=f'shirt-{number}',
+            ))
+
+    def add_order(self, lines, promotional_discount='0', coupon_discount='0'):
+        """lines: [(variant, price, quantity, line_discount)]"""
+        order = Order.objects.create(
+            user=self.user, address=self.address, status='delivered', payment_method='cod',
+            sub_total=sum(Decimal(price) * quantity for _, price, quantity, _ in lines),
+            promotional_discount=Decimal(promotional_discount), coupon_discount=Decimal(coupon_discount),
+            total_amount=Decimal('0'),
+        )
+        for variant, price, quantity, line_discount in lines:
+            OrderItem.objects.create(
+                order=order, product_variant=variant, product_name=variant.product.name, variant_options={},
+                image_url='https://example.com/shirt.png', price_at_purchase=Decimal(price), quantity=quantity,
+                line_discount=Decimal(line_discount), final_line_price=Decimal(price) * quantity,
+            )
+        return order
+
+    def test_order_discounts_are_prorated_over_the_items(self):
+        first, second, _ = self.variants
+        # 300 + 100 of goods, the 40 of order discounts split 30 / 10
+        self.add_order([(first, '150', 2, '5'), (second, '100', 1, '0')], promotional_discount='25', coupon_discount='15')
+        self.add_order([(second, '100', 3, '0')])
+
+        products = {product['name']: product for product in sales_analytics(Order.objects.all())['top_products']}
+
+        self.assertEqual(list(products), ['Shirt 1', 'Shirt 0'])
+        self.assertEqual(products['Shirt 0']['qty'], 2)
+        self.assertEqual(products['Shirt 0']['gross_amount'], Decimal('300'))
+        self.assertEqual(products['Shirt 0']['discount'], Decimal('35'))
+        self.assertEqual(products['Shirt 1']['gross_amount'], Decimal('400'))
+        self.assertEqual(products['Shirt 1']['net_revenue'], Decimal('390'))
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self.add_order([(self.variants[0], '100', 1, '0')])
+        with self.assertNumQueries(5):
+            sales_analytics(Order.objects.all())
+
+        for number in range(20):
+            self.add_order([(variant, '100', 1, '0') for variant in self.variants[:number % 3 + 1]], promotional_discount='10')
+        with self.assertNumQueries(5):
+            analytics = sales_analytics(Order.objects.all())
+
+        self.assertEqual(analytics['total_orders'], 21)
+        self.assertEqual(analytics['overall_discount'], Decimal('200'))
+
+    def test_excel_formats_only_amounts_as_currency(self):
+        self.add_order([(self.variants[0], '150', 2, '0')], promotional_discount='20')
+
+        response = generate_analytics_excel(RequestFactory().get('/'), Order.objects.all())
+        sheet = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+
+        values = {row[0].value: row[1] for row in sheet.iter_rows(min_col=1, max_col=2) if row[0].value}
+        self.assertEqual(values['Total Orders'].value, 1)
+        self.assertEqual(values['Total Orders'].number_format, 'General')
+        self.assertEqual(values['Total Sales'].number_format, '#,##0.00')
+
+        # One blank row between sections, never two
+        blank = [all(cell.value is None for cell in row) for row in sheet.iter_rows()]
+        self.assertFalse(any(first and second for first, second in zip(blank, blank[1:])))
@@ -14,6 +14,9 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from .models import Banner
 from accounts.models import User, Wallet, WalletTransaction
 from products.models import Category, Product, ProductVariant, ProductImage
+from products.utils import refresh_product_thumbnails
+from products.inventory import restock
+from order.reservations import holds_reserved_stock, release_reservations
 from order.models import Order, OrderItem
 from order.utils import calculate_item_refund_amount
 from returns.models import Return, ReturnItem
@@ -27,7 +30,9 @@ from django.db import transaction
 from django.conf import settings
 from django.core.exceptions import ValidationError
 
+from .analytics import sales_analytics
 from .utils import generate_analytics_excel, generate_analytics_pdf
+from .pagination import KeysetPaginationMixin
 
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
@@ -101,7 +106,7 @@ class AdminLoginView(View):
 
 
 @method_decorator(never_cache, name='dispatch')
-class AdminCustomersView(LoginRequiredMixin, ListView):
+class AdminCustomersView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = User
     template_name = 'adminpanel/customers_panel.html'
     context_object_name = 'users'
@@ -434,7 +439,7 @@ class EditCategoryView(LoginRequiredMixin, View):
 
 
 @method_decorator(never_cache, name='dispatch')
-class AdminProductsView(LoginRequiredMixin, ListView):
+class AdminProductsView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
 
     model = Product
     template_name = 'adminpanel/products_panel.html'
@@ -644,6 +649,9 @@ class ProductCreateView(LoginRequiredMixin, View):
                         is_primary=(i == 0)
                     )
 
+            # Representative variant and thumbnail from the uploaded images
+            refresh_product_thumbnails([product.pk])
+
             messages.success(request, "Product created successfully")
             return redirect("products")
 
@@ -958,6 +966,9 @@ class ProductEditView(LoginRequiredMixin, View):
                         current_images[0].is_primary = True
                         current_images[0].save(update_fields=['is_primary'])
 
+            # Bulk image updates (is_primary resets) skip signals, rebuild the card once at the end
+            refresh_product_thumbnails([product.pk])
+
             messages.success(request, "Product updated successfully")
             return redirect("products")
 
@@ -975,7 +986,7 @@ class ProductEditView(LoginRequiredMixin, View):
 
 
 @method_decorator(never_cache, name='dispatch')
-class AdminOrderListView(LoginRequiredMixin, ListView):
+class AdminOrderListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
 
     model = Order
     template_name = 'adminpanel/orders_panel.html'
@@ -1137,9 +1148,10 @@ class ToggleOrderItemStatusView(LoginRequiredMixin, UserPassesTestMixin, View):
             return JsonResponse({'error': 'Cannot revert delivered item'}, status=400)
 
         if new_status == 'cancelled':
-            variant = item.product_variant
-            variant.stock += item.quantity
-            variant.save(update_fields=['stock'])
+            if holds_reserved_stock(order):
+                release_reservations(order, variant_ids=[item.product_variant_id])
+            else:
+                restock([(item.product_variant_id, item.quantity)])
 
             order.sub_total -= item.total_price
             order.total_amount -= item.total_price
@@ -1372,18 +1384,19 @@ class ReturnStatusToggleView(LoginRequiredMixin, UserPassesTestMixin, View):
                     if not variant:
                         return JsonResponse({'error': 'Product variant not found for return item'}, status=404)
 
-                    original_stock = variant.stock
-                    variant.stock += return_item.quantity
-                    variant.save(update_fields=['stock'])
-                    logger.info(
-                        f"Stock increased: Variant {variant.sku} | "
-                        f"+{return_item.quantity} (Return #{returns.id}) | "
-                        f"Old: {original_stock} -> New: {variant.stock}"
-                    )
-
                     selected_qty_by_item[order_item.id] = (selected_qty_by_item.get(order_item.id, 0) +
                                                            return_item.quantity)
 
+                # All returned quantities go back in one UPDATE, once every item is validated
+                returned = [(item.order_item.product_variant_id, item.quantity) for item in return_items]
+                new_stock = restock(returned)
+                for variant_id, quantity in returned:
+                    logger.info(
+                        f"Stock increased: Variant {variant_id} | "
+                        f"+{quantity} (Return #{returns.id}) | "
+                        f"New: {new_stock.get(variant_id)}"
+                    )
+
                 is_full_order_return = (
                     len(selected_qty_by_item) == len(order_items) and
                     all(selected_qty_by_item.get(oi.id, 0) == oi.quantity for oi in order_items)
@@ -2132,7 +2145,7 @@ class AnalyticsView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
     def get_queryset(self):
 
-        queryset = Order.objects.filter(status='delivered')
+        queryset = Order.objects.filter(status='delivered').select_related('user')
 
         # Date filter
         date_filter = self.request.GET.get('date_filter', 'all')
@@ -2166,75 +2179,34 @@ class AnalyticsView(LoginRequiredMixin, UserPassesTestMixin, ListView):
             'end_date': self.request.GET.get('end_date', ''),
         }
 
-        def safe_decimal(value):
-            return value if value is not None else Decimal('0')
-
-        # KPI
-
-        order_stats = base_orders.aggregate(
-            total_orders=Count('id'),
-            gross_revenue=Sum('sub_total'),
-            discount_amount=Sum('promotional_discount'),
-            coupon_discount_amount=Sum('coupon_discount'),
-        )
+        analytics = sales_analytics(base_orders)
 
-        context['total_orders'] = safe_decimal(order_stats['total_orders'])
-        context['gross_revenue'] = safe_decimal(order_stats['gross_revenue'])
-        context['discount_amount'] = safe_decimal(order_stats['discount_amount'])
-        context['coupon_discount_amount'] = safe_decimal(order_stats['coupon_discount_amount'])
-
-        overall_discount = context['discount_amount'] + context['coupon_discount_amount']
-        context['overall_discount'] = overall_discount
-        context['net_revenue'] = context['gross_revenue'] - overall_discount
-
-        # No. of returns
-
-        returns_data = Return.objects.filter(
-            order__in=base_orders
-        ).aggregate(
-            total_returns=Count('id'),
-            accepted_returns=Count('id', filter=Q(status='accepted')),
-            total_refunded=Sum('refund_amount')
-        )
-
-        context['total_returns'] = safe_decimal(returns_data['total_returns'])
-        context['accepted_returns'] = safe_decimal(returns_data['accepted_returns'])
-        context['total_refunded_amount'] = safe_decimal(returns_data['total_refunded'])
+        # KPI and returns
+        for key in ('total_orders', 'gross_revenue', 'discount_amount', 'coupon_discount_amount',
+                    'overall_discount', 'net_revenue', 'total_returns', 'accepted_returns'):
+            context[key] = analytics[key]
+        context['total_refunded_amount'] = analytics['total_refunded']
 
         # payment distribution
 
-        payment_stats = base_orders.values('payment_method').annotate(
-            total_amount=Sum('total_amount'),
-            order_count=Count('id')
-        ).order_by('-total_amount')
-
         context['payment_distribution'] = {
             item['payment_method']: {
-                'amount': safe_decimal(item['total_amount']),
-                'count': safe_decimal(item['order_count'])
-            } for item in payment_stats
+                'amount': item['total_amount'],
+                'count': item['order_count'],
+            } for item in analytics['payment_stats']
         }
         context['payment_total'] = sum(p['amount'] for p in context['payment_distribution'].values())
 
         # coupon usage
 
-        coupon_orders = base_orders.filter(coupon__isnull=False)
-
-        coupon_stats = coupon_orders.values(
-            'coupon__coupon_code', 'coupon_discount', 'coupon__discount_type'
-        ).annotate(
-            times_used=Count('id'),
-            total_discount=Sum('coupon_discount')
-        ).order_by('-total_discount')
-
         context['coupon_breakdown'] = [
             {
-                'coupon_code': item['coupon__coupon_code'] or 'Unknown',
+                'coupon_code': item['coupon_code'] or 'Unknown',
                 'times_used': item['times_used'],
-                'discount_type': item['coupon__discount_type'] or 'Unknown',
-                'total_discount': safe_decimal(item['total_discount'])
+                'discount_type': item['discount_type'] or 'Unknown',
+                'total_discount': item['total_discount'],
             }
-            for item in coupon_stats
+            for item in analytics['coupon_stats']
         ]
 
         context['coupon_total_usage'] = sum(c['times_used'] for c in context['coupon_breakdown'])
@@ -2242,50 +2214,7 @@ class AnalyticsView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
         # top 10 products
 
-        order_items = OrderItem.objects.filter(
-            order__in=base_orders
-        ).select_related('product_variant__product').only(
-            'product_name', 'final_line_price', 'quantity', 'line_discount',
-            'order__sub_total', 'order__promotional_discount', 'order__coupon_discount',
-            'product_variant__product__id'
-        )
-        print(order_items)
-
-        product_map = {}
-        for item in order_items:
-            pid = item.product_variant.product.id if item.product_variant else None
-            if not pid:
-                continue
-
-            if pid not in product_map:
-                product_map[pid] = {
-                    'name': item.product_name,
-                    'gross_amount': Decimal('0'),
-                    'discount': Decimal('0'),
-                }
-
-            item_price = safe_decimal((item.price_at_purchase * item.quantity))
-            item_discount = safe_decimal(item.line_discount)
-
-            product_map[pid]['gross_amount'] += item_price
-            product_map[pid]['discount'] += item_discount
-
-            if item.order.sub_total and item.order.sub_total > 0:
-                order_total_discount = (safe_decimal(item.order.promotional_discount) +
-                                        safe_decimal(item.order.coupon_discount))
-                item_share = item_price / safe_decimal(item.order.sub_total)
-                product_map[pid]['discount'] += item_share * order_total_discount
-
-        print(product_map)
-
-        product_breakdown = []
-        for pid, data in product_map.items():
-            data['net_revenue'] = data['gross_amount'] - data['discount']
-            product_breakdown.append(data)
-
-        product_breakdown.sort(key=lambda x: x['gross_amount'], reverse=True)
-
-        context['product_breakdown'] = product_breakdown[:10]
+        context['product_breakdown'] = analytics['top_products']
 
         context['product_total_gross'] = sum(p['gross_amount'] for p in context['product_breakdown'])
         context['product_total_discount'] = sum(p['discount'] for p in context['product_breakdown'])
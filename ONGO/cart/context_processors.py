@@ -1,16 +1,10 @@
-from django.db.models import Sum
-from .models import Cart
+from django.utils.functional import SimpleLazyObject
+from .utils import get_cart_count
 
 
 def cart_count(request):
     if request.user.is_authenticated:
-
-        cart_count = Cart.objects.filter(
-            user=request.user
-        ).aggregate(
-            total=Sum('quantity')
-        )['total'] or 0
-
-        return {'cart_count': int(cart_count)}
+        # Kept in the session, and only looked up when a template shows the badge
+        return {'cart_count': SimpleLazyObject(lambda: get_cart_count(request))}
 
     return {'cart_count': 0}
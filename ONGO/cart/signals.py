@@ -0,0 +1,17 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from accounts.models import Address
+from .models import Cart
+from .utils import bump_cart_version
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+@receiver(post_save, sender=Address)
+@receiver(post_delete, sender=Address)
+def cart_version_signal(sender, instance, **kwargs):
+    """
+    Any cart row write (and address edits, shipping is quoted per address)
+    orphans the user's cached cart quote.
+    """
+    bump_cart_version(instance.user_id)
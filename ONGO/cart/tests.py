@@ -1,3 +1,41 @@
-from django.test import TestCase
+from decimal import Decimal
+from django.test import RequestFactory, TransactionTestCase
+from accounts.models import User
+from products.models import Category, Product, ProductVariant
+from .context_processors import cart_count
+from .models import Cart
 
-# Create your tests here.
+
+class CartCountTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret-pass-1')
+        category = Category.objects.create(name='Shirts')
+        product = Product.objects.create(category=category, name='Shirt', description='-')
+        self.variants = [
+            ProductVariant.objects.create(
+                product=product, size=size, color='Blue', price=Decimal('300'), stock=5, sku=f'shirt-{size}',
+            )
+            for size in ('M', 'L')
+        ]
+        self.items = [
+            Cart.objects.create(user=self.user, product_variant=variant, quantity=quantity)
+            for variant, quantity in zip(self.variants, (2, 3))
+        ]
+        self.client.force_login(self.user)
+
+    def test_badge_costs_no_query_once_counted(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request.session = self.client.session
+        self.assertEqual(cart_count(request)['cart_count'], 5)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_count(request)['cart_count'], 5)
+
+    def test_cart_writes_update_the_badge(self):
+        self.client.get('/cart/')
+        self.assertEqual(self.client.session['cart_count'], 5)
+
+        self.client.post(f'/cart/remove/{self.items[1].pk}')
+        self.assertEqual(self.client.session['cart_count'], 2)
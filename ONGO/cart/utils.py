@@ -1,8 +1,17 @@
 from decimal import Decimal, ROUND_HALF_UP
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
 from cart.models import Cart
 from offers.models import GlobalOffer
-from products.utils import calculate_discount
-from locations.views import get_distance_to_customer
+from products.utils import get_active_offers, get_cache_version, bump_cache_version, get_catalog_version, cache_timeout_until_boundary
+from products.pricing import price_items
+from locations.geo import get_warehouse_version
+from locations.shipping import get_shipping_amount, UNKNOWN_DISTANCE_SHIPPING
+
+CART_VERSION_KEY = 'cart:{}:version'
+CART_QUOTE_CACHE_TIMEOUT = 60 * 30
+CART_COUNT_SESSION_KEY = 'cart_count'
 
 
 def _to_decimal(value, default='0'):
@@ -19,82 +28,54 @@ def _round_currency(value):
     return value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
 
-def get_cart_items_for_user(request, user):
-    cart = Cart.objects.filter(user=user).select_related(
-        'product_variant',
-        'product_variant__product',
-        'product_variant__product__category'  # Critical: avoid N+1 on category
-    ).prefetch_related(
-        'product_variant__images'
+def _build_quote(user):
+    """
+    Line stage of the cart: every line priced with its product / category offer.
+    Only depends on the cart rows and the catalog, so it is cached per cart version.
+    """
+    cart = list(
+        Cart.objects.filter(user=user).select_related(
+            'product_variant',
+            'product_variant__product',
+            'product_variant__product__category'  # Critical: avoid N+1 on category
+        ).prefetch_related(
+            'product_variant__images'
+        )
+    )
+
+    # Offers for the whole cart are loaded up front and every line is priced in one call
+    product_offers, category_offers = get_active_offers(
+        [item.product_variant.product_id for item in cart],
+        [item.product_variant.product.category_id for item in cart],
     )
+    priced_lines = price_items([
+        (
+            _to_decimal(item.product_variant.final_price, '0'),
+            product_offers.get(item.product_variant.product_id),
+            category_offers.get(item.product_variant.product.category_id),
+        )
+        for item in cart
+    ])
 
     cart_items = []
-    items_subtotal_exact = Decimal('0')
-    total_payable_exact = Decimal('0')
+    unit_prices = {}
 
-    for cart_item in cart:
+    for cart_item, (offer_price, offer, offer_scope) in zip(cart, priced_lines):
         variant = cart_item.product_variant
         product = variant.product
 
         original_price = _to_decimal(variant.final_price, '0')
-        offer_price = original_price
-        offer_type = None
-        offer_value = None
-        offer_scope = None
-        has_offer = False
-
-        # PRODUCT OFFER
-        product_offer = None
-        if hasattr(product, 'offer') and product.offer:
-            product_offer = (
-                product.offer
-                .filter(active=True)
-                .order_by('-priority')
-                .first()
-            )
-
-        if product_offer and product_offer.is_active_now():
-            offer_type = product_offer.discount_type
-            offer_value = _to_decimal(product_offer.value)
-            has_offer = True
-            offer_scope = 'product'
-
-            discounted = calculate_discount(original_price, product_offer)
-
-            offer_price = max(Decimal('0'), discounted)
-
-        # CATEGORY OFFER
-        category_offer = None
-        if product.category and hasattr(product.category, 'offer') and product.category.offer:
-            category_offer = (
-                product.category.offer
-                .filter(active=True)
-                .order_by('-priority')
-                .first()
-            )
-
-        if category_offer and category_offer.is_active_now():
-            cat_value = _to_decimal(category_offer.value)
-            cat_type = category_offer.discount_type
-            cat_price = calculate_discount(original_price, category_offer)
-
-            if cat_price < offer_price:
-                offer_price = cat_price
-                offer_type = cat_type
-                offer_value = cat_value
-                has_offer = True
-                offer_scope = 'category'
-
-        # IMAGE HANDLING
-        image_obj = variant.images.filter(is_primary=True).first() or variant.images.first()
-        image_url = image_obj.image_url if image_obj else "https://via.placeholder.com/150?text=No+Image"
+        has_offer = offer is not None
+        offer_type = offer.discount_type if offer else None
+        offer_value = _to_decimal(offer.value) if offer else None
 
-        line_subtotal_exact = original_price * cart_item.quantity
-        line_total_exact = offer_price * cart_item.quantity
-        items_subtotal_exact += line_subtotal_exact
-        total_payable_exact += line_total_exact
+        # IMAGE HANDLING (prefetched images are ordered primary first)
+        images = variant.images.all()
+        image_obj = images[0] if images else None
+        image_url = image_obj.image_url if image_obj else "https://via.placeholder.com/150?text=No+Image"
 
-        cart_items.append({
+        unit_prices[cart_item.id] = (original_price, offer_price)
+        line = {
             # Identity
             "cart_item_id": cart_item.id,
             "product_id": product.id,
@@ -104,54 +85,87 @@ def get_cart_items_for_user(request, user):
             "image_url": image_url,
             "color": variant.color,
             "size": variant.size,
-            # Quantity & stock
-            "quantity": cart_item.quantity,
+            # Quantity & stock (sales that keep a variant in stock do not bump the catalog
+            # version, so the cached quote carries availability, not the unit count)
+            "quantity": None,
             "max_qty_allowed": 5,
             "in_stock": variant.is_in_stock,
-            "stock": variant.stock,
             # Pricing (unit-level) - ROUNDED FOR DISPLAY
             "unit_price": float(_round_currency(original_price)),
             "offer_price": float(_round_currency(offer_price)),
             "discount_per_unit": float(_round_currency(original_price - offer_price)),
-            # Pricing (line-level) - ROUNDED FOR DISPLAY
-            "line_subtotal": float(_round_currency(line_subtotal_exact)),
-            "total_discount": float(_round_currency(line_subtotal_exact - line_total_exact)),
-            "line_total": float(_round_currency(line_total_exact)),
+            # Pricing (line-level) - filled by _set_line_quantity
+            "line_subtotal": None,
+            "total_discount": None,
+            "line_total": None,
             # Applied offer
             "has_offer": has_offer,
             "applied_offer_scope": offer_scope,
             "applied_offer_type": offer_type,
             "applied_offer_value": float(_round_currency(offer_value)) if offer_value is not None else None,
-        })
+        }
+        _set_line_quantity(line, unit_prices[cart_item.id], cart_item.quantity)
+        cart_items.append(line)
+
+    return {'items': cart_items, 'unit_prices': unit_prices, 'shipping': {}}
+
 
-    # shipping amount caluclation based on pincode.
+def _set_line_quantity(line, unit_prices, quantity):
+    original_price, offer_price = unit_prices
+    line_subtotal_exact = original_price * quantity
+    line_total_exact = offer_price * quantity
 
-    shipping = Decimal('0')
+    line["quantity"] = quantity
+    # Pricing (line-level) - ROUNDED FOR DISPLAY
+    line["line_subtotal"] = float(_round_currency(line_subtotal_exact))
+    line["total_discount"] = float(_round_currency(line_subtotal_exact - line_total_exact))
+    line["line_total"] = float(_round_currency(line_total_exact))
+
+
+def _quote_totals(quote):
+    items_subtotal_exact = Decimal('0')
+    total_payable_exact = Decimal('0')
+    for line in quote['items']:
+        original_price, offer_price = quote['unit_prices'][line['cart_item_id']]
+        items_subtotal_exact += original_price * line['quantity']
+        total_payable_exact += offer_price * line['quantity']
+    return items_subtotal_exact, total_payable_exact
+
+
+def _shipping_for_session(request, quote):
+    """
+    Shipping for the checkout address in the session. Remembered in the quote per
+    address, so the address and pincode lookups run once per cart version.
+    """
     checkout_information = request.session.get('checkout_information', {})
-    if checkout_information:
-        address = checkout_information.get('address_id')
-        try:
-            from accounts.models import Address
-            address = Address.objects.get(id=address) if address else None
-        except Address.DoesNotExist:
-            address = None
-
-        get_distance = get_distance_to_customer(address.postal_code) if address else None
-
-        if get_distance is not None:
-            if get_distance <= 50:
-                shipping = Decimal('50')
-            elif get_distance <= 75:
-                shipping = Decimal('75')
-            elif get_distance <= 100:
-                shipping = Decimal('100')
-            else:
-                shipping = Decimal('500')
-        else:
-            shipping = Decimal('100')
-    else:
-        shipping = Decimal('0')
+    if not checkout_information:
+        return Decimal('0')
+
+    address_id = checkout_information.get('address_id')
+    if address_id not in quote['shipping']:
+        quote['shipping'][address_id] = _shipping_for_address(address_id)
+    return quote['shipping'][address_id]
+
+
+def _shipping_for_address(address):
+    # shipping amount caluclation based on pincode, bands precomputed per warehouse (locations.shipping)
+
+    try:
+        from accounts.models import Address
+        address = Address.objects.get(id=address) if address else None
+    except Address.DoesNotExist:
+        address = None
 
+    if address is None:
+        return UNKNOWN_DISTANCE_SHIPPING
+    return get_shipping_amount(address.postal_code)
+
+
+def _summarize(request, items_subtotal_exact, total_payable_exact, shipping):
+    """
+    Global offer and coupon stage of the cart summary, run on every request:
+    it depends on the session, the time and the user's orders, not just the cart.
+    """
     # Apply global offers
 
     applied_global_offers = []
@@ -266,4 +280,102 @@ def get_cart_items_for_user(request, user):
         "applied_coupon": request.session.get('applied_coupon', {})
     }
 
-    return cart_items, summary
+    return summary
+
+
+def get_cart_version(user_id):
+    return get_cache_version(CART_VERSION_KEY.format(user_id))
+
+
+def bump_cart_version(user_id):
+    bump_cache_version(CART_VERSION_KEY.format(user_id))
+
+
+def count_cart_units(user_id):
+    return Cart.objects.filter(user_id=user_id).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def get_cart_count(request):
+    """
+    Units in the user's cart (header badge), kept in the session so rendering the
+    badge costs no query. Updated by the cart writes of this session and by every
+    cart page render, counted once when the session has none yet.
+    """
+    count = request.session.get(CART_COUNT_SESSION_KEY)
+    if count is None:
+        count = count_cart_units(request.user.id)
+        _store_cart_count(request, count)
+    return count
+
+
+def _store_cart_count(request, count):
+    # Only a change marks the session for saving
+    if request.session.get(CART_COUNT_SESSION_KEY) != count:
+        request.session[CART_COUNT_SESSION_KEY] = count
+
+
+def refresh_cart_count(request):
+    """
+    Recounts the badge after a cart write, once the write is committed, and keeps
+    it in the session for the next page renders.
+    """
+    transaction.on_commit(lambda: _store_cart_count(request, count_cart_units(request.user.id)))
+
+
+def _quote_key(user_id, cart_version):
+    return f'cart:quote:{user_id}:{cart_version}:{get_catalog_version()}:{get_warehouse_version()}'
+
+
+def _store_quote(user_id, cart_version, quote):
+    cache.set(_quote_key(user_id, cart_version), quote, cache_timeout_until_boundary(CART_QUOTE_CACHE_TIMEOUT))
+
+
+def get_cart_items_for_user(request, user):
+    """
+    Cart lines and summary. The priced lines (and shipping per address) are cached
+    per cart version and catalog version, offers and coupons are applied on top.
+    """
+    cart_version = get_cart_version(user.id)
+    quote = cache.get(_quote_key(user.id, cart_version))
+    cached = quote is not None
+    if not cached:
+        quote = _build_quote(user)
+
+    known_addresses = len(quote['shipping'])
+    shipping = _shipping_for_session(request, quote)
+    if not cached or len(quote['shipping']) != known_addresses:
+        _store_quote(user.id, cart_version, quote)
+
+    _store_cart_count(request, sum(line['quantity'] for line in quote['items']))
+    items_subtotal_exact, total_payable_exact = _quote_totals(quote)
+    return quote['items'], _summarize(request, items_subtotal_exact, total_payable_exact, shipping)
+
+
+def change_cart_quantity(request, cart_item, quantity):
+    """
+    Saves a new quantity on a cart line and returns (cart_items, summary) like
+    get_cart_items_for_user. With a cached quote only that line is recomputed and
+    the offer / coupon stage rerun, otherwise the cart is priced from scratch.
+    """
+    user = request.user
+    cart_version = get_cart_version(user.id)
+    quote = cache.get(_quote_key(user.id, cart_version))
+
+    cart_item.quantity = quantity
+    cart_item.save()  # bumps the cart version, right away outside a transaction
+
+    new_version = get_cart_version(user.id)
+    if quote is None or cart_item.id not in quote['unit_prices'] or new_version != cart_version + 1:
+        # Nothing cached, another write got in between or the bump waits for a commit: price the whole cart
+        return get_cart_items_for_user(request, user)
+
+    for line in quote['items']:
+        if line['cart_item_id'] == cart_item.id:
+            _set_line_quantity(line, quote['unit_prices'][cart_item.id], quantity)
+
+    shipping = _shipping_for_session(request, quote)
+    _store_quote(user.id, new_version, quote)
+    _store_cart_count(request, sum(line['quantity'] for line in quote['items']))
+
+    items_subtotal_exact, total_payable_exact = _quote_totals(quote)
+    return quote['items'], _summarize(request, items_subtotal_exact, total_payable_exact, shipping)
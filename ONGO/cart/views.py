@@ -16,7 +16,7 @@ from django.views.decorators.csrf import csrf_exempt
 
 from django.contrib.auth.decorators import login_required
 
-from .utils import get_cart_items_for_user
+from .utils import get_cart_items_for_user, change_cart_quantity, refresh_cart_count
 # from django.utils import timezone
 
 import json
@@ -70,14 +70,14 @@ class QtyChangeView(LoginRequiredMixin, View):
                     }, status=400)
 
                 if cart_item.quantity < 5:
-                    cart_item.quantity += 1
+                    quantity = cart_item.quantity + 1
                 else:
                     return JsonResponse({
                         'error': 'Max quantity reached'
                     }, status=400)
             elif action == 'decrease':
                 if cart_item.quantity > 1:
-                    cart_item.quantity -= 1
+                    quantity = cart_item.quantity - 1
                 else:
                     return JsonResponse({
                         'error': 'Minimum quantity is 1.'
@@ -85,8 +85,8 @@ class QtyChangeView(LoginRequiredMixin, View):
             else:
                 return JsonResponse({'error': 'Invalid action.'}, status=400)
 
-            cart_item.save()
-            _, summary = get_cart_items_for_user(self.request, self.request.user)
+            # Saves the row, only this line and the offer / coupon stage are recomputed
+            _, summary = change_cart_quantity(self.request, cart_item, quantity)
 
             # Return updated values
             return JsonResponse({
@@ -107,6 +107,7 @@ def DeleteCartView(request, pk):
         try:
             cart = Cart.objects.get(pk=pk, user=request.user)
             cart.delete()
+            refresh_cart_count(request)
             return JsonResponse({'success': True})
         except Cart.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Cart item not found.'}, status=404)
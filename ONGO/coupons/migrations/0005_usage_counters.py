@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:31
+
+import logging
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_codes_and_count_usage(apps, schema_editor):
+    Coupon = apps.get_model('coupons', 'Coupon')
+    CouponUsage = apps.get_model('coupons', 'CouponUsage')
+    CouponUserUsage = apps.get_model('coupons', 'CouponUserUsage')
+
+    taken = set(Coupon.objects.values_list('coupon_code', flat=True))
+    for coupon in Coupon.objects.all():
+        code = coupon.coupon_code.strip().upper()
+        if code == coupon.coupon_code:
+            continue
+        if code in taken:
+            # "save10" next to "SAVE10": the other one keeps the code, this one gets the pk appended
+            clashing, code = code, f'{code}-{coupon.pk}'
+            while code in taken:
+                code = f'{code}-{coupon.pk}'
+            logger.warning(f"Coupon {coupon.pk}: {coupon.coupon_code!r} clashes with {clashing!r}, renamed to {code!r}.")
+        taken.discard(coupon.coupon_code)
+        taken.add(code)
+        Coupon.objects.filter(pk=coupon.pk).update(coupon_code=code)
+
+    for row in CouponUsage.objects.values('coupon_id').annotate(used=Count('id')):
+        Coupon.objects.filter(pk=row['coupon_id']).update(times_used=row['used'])
+    CouponUserUsage.objects.bulk_create([
+        CouponUserUsage(coupon_id=row['coupon_id'], user_id=row['user_id'], times_used=row['used'])
+        for row in CouponUsage.objects.values('coupon_id', 'user_id').annotate(used=Count('id'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0004_couponusage_order_couponusage_user_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='times_used',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='CouponUserUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('times_used', models.PositiveIntegerField(default=0)),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_usage', to='coupons.coupon')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coupon_usage_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('coupon', 'user')},
+            },
+        ),
+        migrations.RunPython(normalize_codes_and_count_usage, migrations.RunPython.noop),
+    ]
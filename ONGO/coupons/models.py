@@ -8,6 +8,11 @@ from order.models import Order
 # Create your models here.
 
 
+def normalize_coupon_code(code):
+    # Codes are stored like this, so lookups are exact matches on the unique index
+    return code.strip().upper()
+
+
 class Coupon(models.Model):
     DISCOUNT_CHOICES = [
         ('percent', 'Percentage off cart'),
@@ -27,6 +32,8 @@ class Coupon(models.Model):
 
     usage_limit = models.PositiveSmallIntegerField(default=100)
     per_user_limit = models.PositiveSmallIntegerField(default=1)
+    # CouponUsage rows of the coupon, kept by coupons.utils.record_coupon_usage and coupons.signals
+    times_used = models.PositiveIntegerField(default=0, editable=False)
 
     active = models.BooleanField(default=True)
     start_date = models.DateTimeField(default=timezone.now)
@@ -36,21 +43,29 @@ class Coupon(models.Model):
 
     def is_active(self):
         now = timezone.now()
-        total_used = self.usage.count()
         return (
             self.active
-            and total_used < self.usage_limit
+            and self.times_used < self.usage_limit
             and self.start_date <= now
             and (self.end_date is None or self.end_date >= now)
         )
 
     def clean(self):
+        # Before the unique check of the form, "save10" must clash with "SAVE10"
+        if self.coupon_code:
+            self.coupon_code = normalize_coupon_code(self.coupon_code)
+
         if self.discount_type == 'percent' and self.value > 100:
             raise ValidationError("Percentage discount cannot exceed 100%")
 
         if self.discount_type == 'free_shipping' and self.value > 0:
             raise ValidationError("Free shipping coupon should not have a value")
 
+    def save(self, *args, **kwargs):
+        if self.coupon_code:
+            self.coupon_code = normalize_coupon_code(self.coupon_code)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.coupon_code}, {self.usage_limit}"
 
@@ -82,3 +97,20 @@ class CouponUsage(models.Model):
         indexes = [
             models.Index(fields=['coupon', 'user']),
         ]
+
+
+class CouponUserUsage(models.Model):
+    """
+    How many times a user has used a coupon, the per user counter next to
+    Coupon.times_used, kept with it.
+    """
+
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='user_usage')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='coupon_usage_counts')
+    times_used = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('coupon', 'user')
+
+    def __str__(self):
+        return f"{self.user_id} used {self.coupon_id} {self.times_used} times"
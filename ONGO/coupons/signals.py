@@ -0,0 +1,15 @@
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import Coupon, CouponUsage, CouponUserUsage
+
+
+@receiver(post_delete, sender=CouponUsage)
+def release_coupon_usage(sender, instance, **kwargs):
+    """
+    A deleted usage gives its use back to both counters (coupons.utils.record_coupon_usage takes it).
+    """
+    Coupon.objects.filter(pk=instance.coupon_id, times_used__gt=0).update(times_used=F('times_used') - 1)
+    CouponUserUsage.objects.filter(
+        coupon_id=instance.coupon_id, user_id=instance.user_id, times_used__gt=0
+    ).update(times_used=F('times_used') - 1)
@@ -1,3 +1,108 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase
+from accounts.models import Address, User
+from order.models import Order
+from order.utils import validate_and_apply_coupon
+from .models import Coupon, CouponUsage, CouponUserUsage
+from .utils import CouponLimitReached, record_coupon_usage
 
-# Create your tests here.
+
+def make_order(user):
+    address = Address.objects.create(
+        user=user, name='Buyer', street_address='1 Street', city='Kochi', state='Kerala',
+        country='India', postal_code='682001', phone='9999999999',
+    )
+    return Order.objects.create(user=user, address=address, sub_total=Decimal('1000'), total_amount=Decimal('1000'))
+
+
+def make_user(name):
+    return User.objects.create_user(username=name, email=f'{name}@example.com', password='secret-pass-1')
+
+
+class CouponUsageTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('buyer')
+        self.coupon = Coupon.objects.create(coupon_code=' save10 ', value=Decimal('10'), usage_limit=2, per_user_limit=1)
+
+    def test_code_is_stored_normalized_and_found_with_one_query(self):
+        self.assertEqual(self.coupon.coupon_code, 'SAVE10')
+
+        with self.assertNumQueries(1):
+            is_valid, discount, _, _ = validate_and_apply_coupon(self.user, 'Save10', Decimal('500'))
+
+        self.assertTrue(is_valid)
+        self.assertEqual(discount, Decimal('50'))
+
+    def test_counters_follow_usage_rows(self):
+        usage = record_coupon_usage(self.coupon, self.user, make_order(self.user))
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 1)
+        self.assertEqual(CouponUserUsage.objects.get(coupon=self.coupon, user=self.user).times_used, 1)
+
+        usage.delete()
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 0)
+        self.assertEqual(CouponUserUsage.objects.get(coupon=self.coupon, user=self.user).times_used, 0)
+
+    def test_per_user_limit(self):
+        record_coupon_usage(self.coupon, self.user, make_order(self.user))
+
+        with self.assertRaises(CouponLimitReached):
+            record_coupon_usage(self.coupon, self.user, make_order(self.user))
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 1)
+        self.assertEqual(CouponUsage.objects.count(), 1)
+        is_valid, _, _, _ = validate_and_apply_coupon(self.user, 'SAVE10', Decimal('500'))
+        self.assertFalse(is_valid)
+
+    def test_per_user_limit_zero_refuses_the_first_use(self):
+        Coupon.objects.filter(pk=self.coupon.pk).update(per_user_limit=0)
+
+        with self.assertRaises(CouponLimitReached):
+            record_coupon_usage(self.coupon, self.user, make_order(self.user))
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.times_used, 0)
+        self.assertFalse(CouponUserUsage.objects.filter(coupon=self.coupon).exists())
+
+
+class CouponLimitConcurrencyTests(TransactionTestCase):
+    """
+    Orders of different users racing for the last uses of a coupon must never
+    record more uses than usage_limit.
+    """
+    orders = 10
+
+    def test_usage_limit_holds_under_contention(self):
+        coupon = Coupon.objects.create(coupon_code='LAST3', value=Decimal('10'), usage_limit=3)
+        orders = [make_order(make_user(f'buyer{number}')) for number in range(self.orders)]
+        barrier = threading.Barrier(self.orders)
+        outcomes = []
+
+        def use_coupon(order):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    record_coupon_usage(coupon, order.user, order)
+                outcomes.append(True)
+            except CouponLimitReached:
+                outcomes.append(False)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=use_coupon, args=(order,)) for order in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        coupon.refresh_from_db()
+        self.assertEqual(outcomes.count(True), 3)
+        self.assertEqual(coupon.times_used, 3)
+        self.assertEqual(CouponUsage.objects.filter(coupon=coupon).count(), 3)
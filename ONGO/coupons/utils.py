@@ -0,0 +1,53 @@
+from django.db import connection, transaction
+from django.db.models import F
+from .models import Coupon, CouponUsage, CouponUserUsage
+
+
+class CouponLimitReached(Exception):
+    """Raised by record_coupon_usage when the coupon is used up (overall or for the user)."""
+
+    def __init__(self, coupon):
+        self.coupon = coupon
+        super().__init__(f"Coupon {coupon.coupon_code} has reached its usage limit")
+
+
+def _count_user_usage(coupon, user, enforce_limit):
+    # Upsert of the per user counter, refused (no row returned) at the per user limit:
+    # the first use is only inserted when the limit allows one, later ones only counted below it
+    table = CouponUserUsage._meta.db_table
+    coupon_table = Coupon._meta.db_table
+    insert_condition = 'AND per_user_limit > 0' if enforce_limit else ''
+    update_condition = (
+        f'WHERE c.times_used < (SELECT per_user_limit FROM {coupon_table} WHERE id = c.coupon_id)' if enforce_limit else ''
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} AS c (coupon_id, user_id, times_used)
+            SELECT id, %s, 1 FROM {coupon_table} WHERE id = %s {insert_condition}
+            ON CONFLICT (coupon_id, user_id) DO UPDATE SET times_used = c.times_used + 1
+            {update_condition}
+            RETURNING c.times_used
+            """,
+            [user.pk, coupon.pk],
+        )
+        return cursor.fetchone() is not None
+
+
+def record_coupon_usage(coupon, user, order, enforce_limits=True):
+    """
+    Records that order used coupon: the CouponUsage row plus both counters
+    (Coupon.times_used, CouponUserUsage), taken with conditional UPDATEs so
+    concurrent orders can never go past usage_limit / per_user_limit.
+    Raises CouponLimitReached with nothing recorded. enforce_limits=False
+    counts unconditionally (the customer already paid the discounted total).
+    """
+    with transaction.atomic():
+        coupons = Coupon.objects.filter(pk=coupon.pk)
+        if enforce_limits:
+            coupons = coupons.filter(times_used__lt=F('usage_limit'))
+        if not coupons.update(times_used=F('times_used') + 1):
+            raise CouponLimitReached(coupon)
+        if not _count_user_usage(coupon, user, enforce_limits):
+            raise CouponLimitReached(coupon)
+        return CouponUsage.objects.create(coupon=coupon, user=user, order=order)
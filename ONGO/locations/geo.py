@@ -0,0 +1,314 @@
+"""
+In-process pincode index.
+
+The whole PincodeLocation table (~19k rows) is loaded once per process into
+parallel arrays: a dict pincode -> position for O(1) lookups, and array('d')
+columns of latitude / longitude (degrees, plus radians for haversine over many
+rows in one pass, NaN when missing). Built lazily on first use and rebuilt when the index
+version is bumped (pincode writes, see locations.signals), so lookups never hit
+the database. The version is kept in the shared cache and read at most every
+few seconds, a bump from any process reaches every worker.
+"""
+import logging
+import math
+import threading
+import time
+from array import array
+from django.db import transaction
+from products.utils import get_cache_version, bump_cache_version
+from .models import PincodeLocation, Warehouse
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION_KEY = 'locations:pincode_index:version'
+WAREHOUSE_VERSION_KEY = 'locations:warehouses:version'
+# Seconds a process serves its index before reading the version again
+INDEX_VERSION_CHECK_INTERVAL = 5.0
+EARTH_RADIUS_KM = 6371.0
+NAN = float('nan')
+
+
+class PincodeIndex:
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.positions = {}
+        self.pincodes = []
+        self.districts = []
+        self.states = []
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self.latitudes_rad = array('d')
+        self.longitudes_rad = array('d')
+
+        for pincode, district, state, latitude, longitude in rows:
+            self.positions[pincode] = len(self.pincodes)
+            self.pincodes.append(pincode)
+            self.districts.append(district)
+            self.states.append(state)
+            # Same rule as before: a 0 / NULL coordinate counts as unknown
+            if not (latitude and longitude):
+                latitude = longitude = NAN
+            self.latitudes.append(latitude)
+            self.longitudes.append(longitude)
+            self.latitudes_rad.append(math.radians(latitude))
+            self.longitudes_rad.append(math.radians(longitude))
+
+    @classmethod
+    def load(cls, version=None):
+        rows = (
+            PincodeLocation.objects
+            .values_list('pincode', 'district', 'state', 'latitude', 'longitude')
+            .iterator(chunk_size=5000)
+        )
+        return cls(
+            (
+                (pincode, district, state, float(latitude) if latitude else None, float(longitude) if longitude else None)
+                for pincode, district, state, latitude, longitude in rows
+            ),
+            version,
+        )
+
+    def __len__(self):
+        return len(self.pincodes)
+
+    def position(self, pincode):
+        return self.positions.get(pincode.strip())
+
+    def stats(self, pincode):
+        """
+        Same dict as locations.views.location_stats, {} when the pincode is unknown.
+        """
+        position = self.position(pincode)
+        if position is None:
+            return {}
+        latitude, longitude = self.coordinates(position)
+        return {
+            'pincode': self.pincodes[position],
+            'district': self.districts[position],
+            'state': self.states[position],
+            'latitude': latitude,
+            'longitude': longitude,
+        }
+
+    def coordinates(self, position):
+        # Degrees, (None, None) when unknown
+        latitude = self.latitudes[position]
+        if math.isnan(latitude):
+            return None, None
+        return latitude, self.longitudes[position]
+
+    def distances_from(self, position, positions=None):
+        """
+        Haversine distance in km from one indexed pincode to many (all by default),
+        NaN where either side has no coordinates.
+        """
+        latitudes, longitudes = self.latitudes_rad, self.longitudes_rad
+        if positions is None:
+            positions = range(len(latitudes))
+
+        lat1, lon1 = latitudes[position], longitudes[position]
+        cos_lat1 = math.cos(lat1)
+        sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+
+        distances = array('d')
+        for other in positions:
+            lat2 = latitudes[other]
+            a = sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * cos(lat2) * sin((longitudes[other] - lon1) / 2) ** 2
+            distances.append(EARTH_RADIUS_KM * (2 * asin(sqrt(a))))
+        return distances
+
+    def distance(self, pincode_a, pincode_b):
+        """
+        km between two pincodes rounded to 0.1 like distance_between_location,
+        None when either is unknown or has no coordinates.
+        """
+        position_a, position_b = self.position(pincode_a), self.position(pincode_b)
+        if position_a is None or position_b is None:
+            return None
+        distance = self.distances_from(position_a, (position_b,))[0]
+        return None if math.isnan(distance) else round(distance, 1)
+
+
+_index = None
+_index_checked_at = float('-inf')
+_lock = threading.Lock()
+
+
+def get_pincode_index():
+    """
+    The process wide PincodeIndex, loaded on first use and reloaded after the
+    index version was bumped. The version lives in the shared cache, so a bump
+    made by another worker or by import_pincodes reaches this process too. It is
+    read at most every INDEX_VERSION_CHECK_INTERVAL seconds, lookups in between
+    cost nothing.
+    """
+    global _index, _index_checked_at
+    index = _index
+    now = time.monotonic()
+    if index is not None and now - _index_checked_at < INDEX_VERSION_CHECK_INTERVAL:
+        return index
+
+    version = get_cache_version(INDEX_VERSION_KEY)
+    if index is None or index.version != version:
+        with _lock:
+            if _index is None or _index.version != version:
+                _index = PincodeIndex.load(version)
+                logger.info(f"Pincode index loaded: {len(_index)} pincodes")
+            index = _index
+    _index_checked_at = now
+    return index
+
+
+def _recheck_pincode_index():
+    global _index_checked_at
+    _index_checked_at = float('-inf')
+
+
+def bump_pincode_index_version():
+    bump_cache_version(INDEX_VERSION_KEY)
+    # The process that made the write does not wait for the next check
+    transaction.on_commit(_recheck_pincode_index)
+
+
+def unit_vector(latitude, longitude):
+    # Degrees -> point on the unit sphere, straight line distance grows with great circle distance
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+    cos_latitude = math.cos(latitude)
+    return (cos_latitude * math.cos(longitude), cos_latitude * math.sin(longitude), math.sin(latitude))
+
+
+def chord_to_km(chord):
+    return EARTH_RADIUS_KM * (2 * math.asin(min(1.0, chord / 2)))
+
+
+class KDTree:
+    """
+    3-d tree over points on the unit sphere.
+    nearest() is a branch and bound search, O(log n) on average.
+    """
+
+    def __init__(self, points):
+        self.points = points
+        self.root = self._build(list(range(len(points))), 0)
+
+    def _build(self, positions, depth):
+        if not positions:
+            return None
+        axis = depth % 3
+        positions.sort(key=lambda position: self.points[position][axis])
+        middle = len(positions) // 2
+        return (
+            positions[middle],
+            axis,
+            self._build(positions[:middle], depth + 1),
+            self._build(positions[middle + 1:], depth + 1),
+        )
+
+    def nearest(self, point):
+        """
+        (position, chord) of the closest point, None when the tree is empty.
+        """
+        points = self.points
+        best = [None, math.inf]  # position, squared chord
+
+        def search(node):
+            if node is None:
+                return
+            position, axis, left, right = node
+            x, y, z = points[position]
+            squared = (x - point[0]) ** 2 + (y - point[1]) ** 2 + (z - point[2]) ** 2
+            if squared < best[1]:
+                best[0], best[1] = position, squared
+
+            offset = point[axis] - points[position][axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            search(near)
+            # The other side can only hold something closer if the splitting plane is
+            if offset * offset < best[1]:
+                search(far)
+
+        search(self.root)
+        if best[0] is None:
+            return None
+        return best[0], math.sqrt(best[1])
+
+
+class WarehouseIndex:
+    """
+    Active warehouses with known coordinates, in a KDTree.
+    """
+
+    def __init__(self, warehouses, pincode_index, version=None):
+        self.version = version
+        self.warehouse_ids = []
+        points = []
+        for warehouse_id, pincode in warehouses:
+            position = pincode_index.position(pincode)
+            if position is None:
+                logger.warning(f"Warehouse {warehouse_id}: pincode {pincode} has no location, skipped.")
+                continue
+            latitude, longitude = pincode_index.coordinates(position)
+            if latitude is None:
+                logger.warning(f"Warehouse {warehouse_id}: pincode {pincode} has no coordinates, skipped.")
+                continue
+            self.warehouse_ids.append(warehouse_id)
+            points.append(unit_vector(latitude, longitude))
+        self.tree = KDTree(points)
+
+    def __len__(self):
+        return len(self.warehouse_ids)
+
+    def nearest(self, latitude, longitude):
+        """
+        (warehouse_id, km) of the nearest warehouse, None when there is none.
+        """
+        found = self.tree.nearest(unit_vector(latitude, longitude))
+        if found is None:
+            return None
+        position, chord = found
+        return self.warehouse_ids[position], chord_to_km(chord)
+
+
+_warehouse_index = None
+
+
+def get_warehouse_index():
+    """
+    Process wide WarehouseIndex, rebuilt when the warehouses or the pincode index change.
+    """
+    global _warehouse_index
+    pincode_index = get_pincode_index()
+    version = (get_cache_version(WAREHOUSE_VERSION_KEY), pincode_index.version)
+    index = _warehouse_index
+    if index is None or index.version != version:
+        with _lock:
+            if _warehouse_index is None or _warehouse_index.version != version:
+                warehouses = Warehouse.objects.filter(is_active=True).values_list('id', 'pincode')
+                _warehouse_index = WarehouseIndex(warehouses, pincode_index, version)
+            index = _warehouse_index
+    return index
+
+
+def get_warehouse_version():
+    return get_cache_version(WAREHOUSE_VERSION_KEY)
+
+
+def bump_warehouse_version():
+    bump_cache_version(WAREHOUSE_VERSION_KEY)
+
+
+def nearest_warehouse(customer_pincode):
+    """
+    (warehouse_id, km) of the active warehouse nearest to the pincode, None when
+    there are no warehouses or the pincode is unknown.
+    """
+    pincode_index = get_pincode_index()
+    position = pincode_index.position(customer_pincode)
+    warehouse_index = get_warehouse_index()
+    if position is None or not len(warehouse_index):
+        return None
+    latitude, longitude = pincode_index.coordinates(position)
+    if latitude is None:
+        return None
+    return warehouse_index.nearest(latitude, longitude)
@@ -0,0 +1,70 @@
+import math
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from locations.geo import KDTree, unit_vector, chord_to_km
+
+
+def _brute_force(points, point):
+    best, best_squared = None, math.inf
+    for position, (x, y, z) in enumerate(points):
+        squared = (x - point[0]) ** 2 + (y - point[1]) ** 2 + (z - point[2]) ** 2
+        if squared < best_squared:
+            best, best_squared = position, squared
+    return best
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark nearest warehouse lookups (the warehouse a cart ships from): KD-tree vs brute '
+        'force over synthetic warehouses and customers spread over India. No database access.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouses', type=int, default=500, help='Synthetic warehouses (default: 500)')
+        parser.add_argument('--lookups', type=int, default=20000, help='Customer lookups per run (default: 20000)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path (default: 3)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+
+        def random_point():
+            # Rough bounding box of India
+            return unit_vector(rng.uniform(8.0, 35.0), rng.uniform(68.0, 97.0))
+
+        points = [random_point() for _ in range(options['warehouses'])]
+        customers = [random_point() for _ in range(options['lookups'])]
+
+        started = time.perf_counter()
+        tree = KDTree(points)
+        self.stdout.write(f"KD-tree over {len(points)} warehouses built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        paths = {
+            'brute force': lambda point: _brute_force(points, point),
+            'kd-tree': lambda point: tree.nearest(point)[0],
+        }
+
+        self.stdout.write(f"{'path':<14}{'us / lookup':>14}")
+        results = {}
+        for label, find in paths.items():
+            timings = []
+            for _ in range(options['repeat']):
+                begin = time.perf_counter()
+                results[label] = [find(point) for point in customers]
+                timings.append(time.perf_counter() - begin)
+            per_lookup = statistics.median(timings) / len(customers) * 1e6
+            self.stdout.write(f"{label:<14}{per_lookup:>14.1f}")
+
+        mismatches = 0
+        for point, expected, found in zip(customers, results['brute force'], results['kd-tree']):
+            # Ties at equal distance may pick another warehouse, the distance must match
+            if expected != found and not math.isclose(
+                chord_to_km(math.dist(point, points[expected])), chord_to_km(math.dist(point, points[found]))
+            ):
+                mismatches += 1
+
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f"{mismatches} lookups differ from brute force."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Benchmark finished, KD-tree matches brute force."))
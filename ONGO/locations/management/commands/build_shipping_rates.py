@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from locations.shipping import build_shipping_rates
+
+
+class Command(BaseCommand):
+    help = (
+        'Precompute the shipping charge of every pincode from every active warehouse (ShippingRate). '
+        'Only missing pairs are built unless --full is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every row, not only the missing ones')
+        parser.add_argument('--warehouse', type=int, action='append', dest='warehouses',
+                            help='Only this warehouse id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='bulk write batch size (default: 5000)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = build_shipping_rates(
+            warehouse_ids=options['warehouses'],
+            full=options['full'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Shipping rates built: {written} rows in {time.perf_counter() - started:.1f}s"
+        ))
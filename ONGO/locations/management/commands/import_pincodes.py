@@ -1,6 +1,7 @@
 import csv
 import os
 from decimal import Decimal, InvalidOperation
+from django.core.management import call_command
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from locations.models import PincodeLocation
@@ -87,3 +88,6 @@ class Command(BaseCommand):
             f"Skipped (invalid/missing data): {skipped}\n"
             f"Total processed rows: {created + updated + skipped}"
         ))
+
+        # Moved pincodes dropped their shipping rates, build the missing ones
+        call_command('build_shipping_rates', stdout=self.stdout)
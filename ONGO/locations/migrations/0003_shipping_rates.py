@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0002_warehouses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShippingRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pincode', models.CharField(max_length=6)),
+                ('distance_km', models.DecimalField(blank=True, decimal_places=1, max_digits=7, null=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shipping_rates', to='locations.warehouse')),
+            ],
+            options={
+                'unique_together': {('pincode', 'warehouse')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:40
+
+from django.db import migrations
+
+
+def create_default_warehouse(apps, schema_editor):
+    # The single warehouse shipping assumed so far (locations.views.WAREHOUSE_PINCODE)
+    Warehouse = apps.get_model('locations', 'Warehouse')
+    if not Warehouse.objects.exists():
+        Warehouse.objects.create(name='Kochi', pincode='682001')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0003_shipping_rates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_warehouse, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_default_warehouse'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='WarehouseStock',
+        ),
+    ]
@@ -3,6 +3,10 @@ from django.db import models
 # Create your models here.
 
 
+# Fields the in-process pincode index holds (locations.geo)
+INDEXED_FIELDS = ('pincode', 'district', 'state', 'latitude', 'longitude')
+
+
 class PincodeLocation(models.Model):
     pincode = models.CharField(max_length=6, unique=True, db_index=True)
     district = models.CharField(max_length=100, blank=True)
@@ -17,3 +21,60 @@ class PincodeLocation(models.Model):
 
     def __str__(self):
         return f"{self.pincode} - {self.state}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_location()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._remember_location()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The post_save receivers compared against the previous values, the next save compares against these
+        self._remember_location()
+
+    def _remember_location(self):
+        # As stored, so locations.signals can tell which fields a save changes without a query
+        # (import_pincodes saves every row again on a re-import). Deferred fields are left out.
+        self._previous_location = {field: self.__dict__[field] for field in INDEXED_FIELDS if field in self.__dict__}
+
+
+class Warehouse(models.Model):
+    name = models.CharField(max_length=100)
+    # Located through PincodeLocation
+    pincode = models.CharField(max_length=6, db_index=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.pincode})"
+
+
+class ShippingRate(models.Model):
+    """
+    Shipping charge from a warehouse to a pincode, precomputed by the
+    build_shipping_rates command (locations.shipping).
+    """
+    pincode = models.CharField(max_length=6)
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.CASCADE,
+        related_name='shipping_rates'
+    )
+    # NULL when the pincode has no coordinates
+    distance_km = models.DecimalField(max_digits=7, decimal_places=1, null=True, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        unique_together = ('pincode', 'warehouse')
+
+    def __str__(self):
+        return f"{self.pincode} from {self.warehouse_id}: {self.amount}"
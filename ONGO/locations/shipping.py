@@ -0,0 +1,115 @@
+"""
+Shipping charges by distance band, precomputed per (pincode, warehouse).
+
+ShippingRate holds the band of every PincodeLocation from every warehouse.
+build_shipping_rates fills it, incrementally by default: only the missing
+pairs are computed. Pincode edits drop their rows, and a new or moved
+warehouse gets its rows rebuilt (locations.signals). A missing row is
+computed live, so the charge is always right.
+"""
+import logging
+import math
+import time
+from decimal import Decimal
+from django.db import transaction
+from .geo import get_pincode_index, nearest_warehouse
+from .models import ShippingRate, Warehouse
+from .views import get_distance_to_customer
+
+logger = logging.getLogger(__name__)
+
+# (up to km, charge), anything farther pays FAR_SHIPPING
+SHIPPING_BANDS = [
+    (50, Decimal('50')),
+    (75, Decimal('75')),
+    (100, Decimal('100')),
+]
+FAR_SHIPPING = Decimal('500')
+UNKNOWN_DISTANCE_SHIPPING = Decimal('100')
+
+
+def shipping_for_distance(distance):
+    """
+    Charge for a distance in km (rounded to 0.1 like the distance helpers), None = unknown.
+    """
+    if distance is None:
+        return UNKNOWN_DISTANCE_SHIPPING
+    for limit, amount in SHIPPING_BANDS:
+        if distance <= limit:
+            return amount
+    return FAR_SHIPPING
+
+
+def build_shipping_rates(warehouse_ids=None, full=False, batch_size=5000):
+    """
+    Writes the ShippingRate rows of the given warehouses (all active ones by default).
+    full=False only creates the missing (pincode, warehouse) pairs, full=True
+    recomputes every row of those warehouses.
+    Returns the number of rows written.
+    """
+    pincode_index = get_pincode_index()
+    warehouses = Warehouse.objects.filter(is_active=True)
+    if warehouse_ids is not None:
+        warehouses = warehouses.filter(pk__in=warehouse_ids)
+
+    written = 0
+    for warehouse in warehouses:
+        started = time.perf_counter()
+        origin = pincode_index.position(warehouse.pincode)
+        if origin is None:
+            logger.warning(f"Warehouse {warehouse.pk}: pincode {warehouse.pincode} has no location, no rates built.")
+            continue
+
+        if full:
+            positions = range(len(pincode_index))
+        else:
+            existing = set(ShippingRate.objects.filter(warehouse=warehouse).values_list('pincode', flat=True))
+            positions = [
+                position for position, pincode in enumerate(pincode_index.pincodes) if pincode not in existing
+            ]
+        if not positions:
+            continue
+
+        # One haversine pass over every pincode of the batch
+        distances = pincode_index.distances_from(origin, positions)
+        rows = []
+        for position, distance in zip(positions, distances):
+            distance = None if math.isnan(distance) else round(distance, 1)
+            rows.append(ShippingRate(
+                pincode=pincode_index.pincodes[position],
+                warehouse=warehouse,
+                distance_km=distance,
+                amount=shipping_for_distance(distance),
+            ))
+
+        with transaction.atomic():
+            ShippingRate.objects.bulk_create(
+                rows,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['pincode', 'warehouse'],
+                update_fields=['distance_km', 'amount'],
+            )
+        written += len(rows)
+        logger.info(f"Shipping rates for warehouse {warehouse.pk}: {len(rows)} rows in {time.perf_counter() - started:.1f}s")
+
+    return written
+
+
+def get_shipping_amount(customer_pincode):
+    """
+    Shipping charge to a pincode from its nearest active warehouse, the rate from
+    one indexed ShippingRate lookup or computed live when the pair has no row.
+    """
+    fulfilment = nearest_warehouse(customer_pincode)
+    if fulfilment is None:
+        return shipping_for_distance(get_distance_to_customer(customer_pincode))
+
+    warehouse_id, distance = fulfilment
+    amount = (
+        ShippingRate.objects
+        .filter(pincode=customer_pincode.strip(), warehouse_id=warehouse_id)
+        .values_list('amount', flat=True)
+        .first()
+    )
+    return amount if amount is not None else shipping_for_distance(round(distance, 1))
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models.signals import pre_save, post_save, post_delete
+from .geo import bump_pincode_index_version, bump_warehouse_version
+from .models import INDEXED_FIELDS, PincodeLocation, ShippingRate, Warehouse
+from .shipping import build_shipping_rates
+
+
+def pincode_changed(instance, fields):
+    # Against the values loaded from the database (PincodeLocation.from_db), changed when unknown
+    previous = getattr(instance, '_previous_location', None)
+    return previous is None or any(field not in previous or previous[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(post_save, sender=PincodeLocation)
+def pincode_index_signal(sender, instance, **kwargs):
+    """
+    Every process reloads its pincode index on next use (imports, admin edits),
+    when the save changed an indexed field.
+    """
+    if pincode_changed(instance, INDEXED_FIELDS):
+        bump_pincode_index_version()
+
+
+@receiver(post_delete, sender=PincodeLocation)
+def pincode_deleted_index_signal(sender, instance, **kwargs):
+    bump_pincode_index_version()
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def warehouse_version_signal(sender, instance, **kwargs):
+    """
+    Rebuilds the warehouse index and orphans cart quotes (shipping depends on
+    the nearest warehouse).
+    """
+    bump_warehouse_version()
+
+
+@receiver(post_save, sender=PincodeLocation)
+def pincode_shipping_rate_signal(sender, instance, created, **kwargs):
+    """
+    A pincode that moved loses its rates, rebuilt by the next build_shipping_rates
+    run and computed live until then. Saves that keep the coordinates keep them.
+    """
+    if created or not pincode_changed(instance, ('pincode', 'latitude', 'longitude')):
+        return
+    previous = getattr(instance, '_previous_location', None) or {}
+    ShippingRate.objects.filter(pincode__in={previous.get('pincode', instance.pincode), instance.pincode}).delete()
+
+
+@receiver(post_delete, sender=PincodeLocation)
+def pincode_deleted_shipping_rate_signal(sender, instance, **kwargs):
+    ShippingRate.objects.filter(pincode=instance.pincode).delete()
+
+
+@receiver(pre_save, sender=Warehouse)
+def warehouse_moved_signal(sender, instance, **kwargs):
+    instance._previous_pincode = (
+        Warehouse.objects.filter(pk=instance.pk).values_list('pincode', flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Warehouse)
+def warehouse_shipping_rate_signal(sender, instance, created, **kwargs):
+    """
+    A new or moved warehouse gets its rates built once the write is committed.
+    """
+    if created or instance.pincode != getattr(instance, '_previous_pincode', instance.pincode):
+        transaction.on_commit(lambda: build_shipping_rates(warehouse_ids=[instance.pk], full=True))
@@ -1,3 +1,29 @@
+from decimal import Decimal
 from django.test import TestCase
+from .models import PincodeLocation, ShippingRate, Warehouse
 
-# Create your tests here.
+
+class PincodeSaveTests(TestCase):
+
+    def setUp(self):
+        PincodeLocation.objects.create(
+            pincode='682001', district='Ernakulam', state='Kerala', latitude=Decimal('9.9816'), longitude=Decimal('76.2999'),
+        )
+        self.warehouse = Warehouse.objects.create(name='Kochi', pincode='682001')
+        ShippingRate.objects.create(pincode='682001', warehouse=self.warehouse, distance_km=Decimal('0'), amount=Decimal('50'))
+
+    def test_saving_an_unmoved_pincode_only_updates_it(self):
+        location = PincodeLocation.objects.get(pincode='682001')
+        location.latitude = Decimal('9.981600')
+
+        with self.assertNumQueries(1):
+            location.save()
+
+        self.assertTrue(ShippingRate.objects.filter(pincode='682001').exists())
+
+    def test_moving_a_pincode_drops_its_rates(self):
+        location = PincodeLocation.objects.get(pincode='682001')
+        location.latitude = Decimal('10.5')
+        location.save()
+
+        self.assertFalse(ShippingRate.objects.filter(pincode='682001').exists())
@@ -1,33 +1,21 @@
 
 from django.http import JsonResponse
 import logging
-from .models import PincodeLocation
+from .geo import get_pincode_index
 
 logger = logging.getLogger(__name__)
 
+WAREHOUSE_PINCODE = "682001"
+
 # Create your views here.
 
 
 def location_stats(pincode: str) -> dict:
-    pincode = pincode.strip()
-    response_data = {}
-    try:
-        location = PincodeLocation.objects.get(pincode=pincode)
-        response_data = {
-            'pincode': location.pincode,
-            'district': location.district,
-            'state': location.state,
-            'latitude': float(location.latitude) if location.latitude else None,
-            'longitude': float(location.longitude) if location.longitude else None,
-        }
-        return response_data
-    except PincodeLocation.DoesNotExist:
-        logger.warning(f"Pincode {pincode} not found in database.")
-        return response_data
-
-    except Exception as e:
-        logger.error(f"Error fetching location stats for pincode {pincode}: {str(e)}")
-        return response_data
+    # Served from the in-process pincode index, no query
+    response_data = get_pincode_index().stats(pincode)
+    if not response_data:
+        logger.warning(f"Pincode {pincode.strip()} not found in database.")
+    return response_data
 
 
 def distance_between_location(lat1, lon1, lat2, lon2):
@@ -47,16 +35,10 @@ def distance_between_location(lat1, lon1, lat2, lon2):
 
 
 def get_distance_to_customer(customer_pincode):
-    loc1 = location_stats(customer_pincode)
-    loc2 = location_stats("682001")  # Assuming 110001 is the warehouse pincode
-
-    if not loc1 or not loc2:
-        return None
-
-    if loc1['latitude'] is None or loc1['longitude'] is None or loc2['latitude'] is None or loc2['longitude'] is None:
-        return None
-
-    return distance_between_location(loc1['latitude'], loc1['longitude'], loc2['latitude'], loc2['longitude'])
+    distance = get_pincode_index().distance(customer_pincode, WAREHOUSE_PINCODE)
+    if distance is None:
+        logger.warning(f"No distance between pincode {customer_pincode.strip()} and the warehouse.")
+    return distance
 
 
 def pincode_stats(request, pincode):
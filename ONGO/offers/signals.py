@@ -0,0 +1,21 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from products.models import Product
+from products.utils import bump_product_versions, refresh_product_prices
+from .models import ProductOffer, CategoryOffer
+
+
+@receiver(post_save, sender=ProductOffer)
+@receiver(post_delete, sender=ProductOffer)
+def product_offer_price_refresh_signal(sender, instance, **kwargs):
+    refresh_product_prices([instance.product_id])
+    bump_product_versions(product_ids=[instance.product_id])
+
+
+@receiver(post_save, sender=CategoryOffer)
+@receiver(post_delete, sender=CategoryOffer)
+def category_offer_price_refresh_signal(sender, instance, **kwargs):
+    refresh_product_prices(
+        Product.objects.filter(category_id=instance.category_id).values_list('pk', flat=True)
+    )
+    bump_product_versions(category_ids=[instance.category_id])
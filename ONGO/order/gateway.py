@@ -0,0 +1,233 @@
+"""
+Payment gateway adapter.
+
+Checkout talks to the gateway through get_payment_gateway() instead of a bare
+razorpay.Client built at import time:
+
+- RazorpayGateway: one pooled requests.Session per process, connect/read
+  timeouts on every call, a few retries with exponential backoff on
+  network and 5xx errors, and a circuit breaker that fails fast while the
+  gateway is down instead of piling up slow requests.
+- FakeGateway: in-process stand-in with the same interface and the same
+  signature scheme, for offline checkout load tests and local development
+  (settings.PAYMENT_GATEWAY = 'fake').
+"""
+import hashlib
+import hmac
+import logging
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal, ROUND_HALF_UP
+import razorpay
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentGatewayError(Exception):
+    """The gateway could not serve the call (down, timed out or rejected it)."""
+
+
+class GatewayUnavailable(PaymentGatewayError):
+    """Raised without calling the gateway while the circuit breaker is open."""
+
+
+def to_paisa(amount_inr):
+    return int((Decimal(str(amount_inr)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def payment_signature(secret, order_id, payment_id):
+    # Razorpay checkout signature: HMAC-SHA256 of "order_id|payment_id" with the key secret
+    return hmac.new(secret.encode(), f"{order_id}|{payment_id}".encode(), hashlib.sha256).hexdigest()
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures. While open every call
+    is refused for reset_timeout seconds, then one trial call is let through
+    (half open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Payment gateway circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class RazorpayGateway:
+
+    # Worth another attempt: the request may not have reached Razorpay, or Razorpay failed on its side
+    RETRYABLE = (
+        requests.ConnectionError,
+        requests.Timeout,
+        razorpay.errors.ServerError,
+        razorpay.errors.GatewayError,
+    )
+
+    def __init__(self, key_id, key_secret, timeout=(3.05, 10), retries=2, backoff=0.2,
+                 pool_size=10, breaker=None):
+        self.key_secret = key_secret
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        session = requests.Session()
+        # Keep-alive connections shared by every request of the process, urllib3 retries off (done here)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        self.client = razorpay.Client(session=session, auth=(key_id, key_secret))
+
+    def _call(self, operation, *args, **kwargs):
+        if not self.breaker.allow():
+            raise GatewayUnavailable("Payment gateway circuit is open")
+
+        for attempt in range(self.retries + 1):
+            try:
+                result = operation(*args, timeout=self.timeout, **kwargs)
+            except self.RETRYABLE as e:
+                if attempt == self.retries:
+                    self.breaker.record_failure()
+                    raise PaymentGatewayError(f"Payment gateway failed after {attempt + 1} attempts: {e}") from e
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"Payment gateway call failed ({e}), retrying in {delay:.2f}s")
+                # Full jitter, so parallel checkouts do not retry in lockstep
+                time.sleep(random.uniform(0, delay))
+            except razorpay.errors.BadRequestError as e:
+                # Razorpay answered: the gateway is healthy, the request is wrong
+                self.breaker.record_success()
+                raise PaymentGatewayError(str(e)) from e
+            else:
+                self.breaker.record_success()
+                return result
+
+    def create_order(self, amount_inr, receipt=None):
+        """
+        Creates the gateway order for an amount in INR.
+        Returns: {'id': 'order_xxx', 'amount': 50000, 'currency': 'INR', ...}
+        """
+        data = {'amount': to_paisa(amount_inr), 'currency': 'INR'}
+        if receipt:
+            data['receipt'] = receipt
+        return self._call(self.client.order.create, data)
+
+    def verify_signature(self, params):
+        """
+        params: razorpay_order_id, razorpay_payment_id, razorpay_signature.
+        Computed locally, no gateway call.
+        """
+        expected = payment_signature(self.key_secret, params['razorpay_order_id'], params['razorpay_payment_id'])
+        return hmac.compare_digest(expected, params['razorpay_signature'])
+
+
+class FakeGateway:
+    """
+    Gateway without network: orders are made up, signatures use the real
+    scheme with key_secret, so the verify endpoint works unchanged.
+    latency (seconds) and failure_rate simulate a slow or flaky gateway.
+    """
+
+    def __init__(self, key_secret='fake-secret', latency=0.0, failure_rate=0.0):
+        self.key_secret = key_secret
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def create_order(self, amount_inr, receipt=None):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise PaymentGatewayError("Fake gateway failure")
+
+        return {
+            'id': f"order_fake{uuid.uuid4().hex[:14]}",
+            'entity': 'order',
+            'amount': to_paisa(amount_inr),
+            'currency': 'INR',
+            'receipt': receipt,
+            'status': 'created',
+        }
+
+    def pay(self, order_id):
+        """
+        What the checkout popup would post back after a successful payment:
+        {'razorpay_order_id', 'razorpay_payment_id', 'razorpay_signature'}
+        """
+        payment_id = f"pay_fake{uuid.uuid4().hex[:14]}"
+        return {
+            'razorpay_order_id': order_id,
+            'razorpay_payment_id': payment_id,
+            'razorpay_signature': payment_signature(self.key_secret, order_id, payment_id),
+        }
+
+    def verify_signature(self, params):
+        expected = payment_signature(self.key_secret, params['razorpay_order_id'], params['razorpay_payment_id'])
+        return hmac.compare_digest(expected, params['razorpay_signature'])
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_payment_gateway():
+    """
+    The process wide gateway selected by settings.PAYMENT_GATEWAY ('razorpay' or 'fake'),
+    built on first use.
+    """
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                if settings.PAYMENT_GATEWAY == 'fake':
+                    _gateway = FakeGateway(
+                        key_secret=settings.RAZORPAY_KEY_SECRET or 'fake-secret',
+                        latency=settings.PAYMENT_GATEWAY_FAKE_LATENCY,
+                    )
+                else:
+                    _gateway = RazorpayGateway(
+                        settings.RAZORPAY_KEY_ID,
+                        settings.RAZORPAY_KEY_SECRET,
+                        timeout=(settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT, settings.PAYMENT_GATEWAY_READ_TIMEOUT),
+                        retries=settings.PAYMENT_GATEWAY_RETRIES,
+                    )
+    return _gateway
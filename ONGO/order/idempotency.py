@@ -0,0 +1,145 @@
+"""
+Idempotent POST endpoints.
+
+A view with IdempotentMixin runs once per (user, scope, key). The key comes
+from the Idempotency-Key header, or from the view itself (a key issued by
+the server, or a natural key of the request). The first request claims the
+key, and its successful response is stored. Every retry with the same key
+gets that stored response back without running the view again: no repricing,
+no stock writes, no gateway call. A duplicate that arrives while the first
+request is still running waits for its response.
+
+Failed responses are not stored: the claim is dropped so the client can retry.
+Keys expire after idempotency_ttl. purge_idempotency_keys deletes the old rows.
+"""
+import hashlib
+import logging
+import time
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# An in-progress claim older than this belongs to a request that died, it can be taken over
+IN_PROGRESS_LEASE = timedelta(seconds=60)
+# How long a duplicate waits for the first request's response before giving up with 409
+REPLAY_WAIT = 10.0
+POLL_INTERVAL = 0.05
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _replay(record):
+    response = HttpResponse(record.response_body, status=record.response_status, content_type=record.content_type)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def claim_idempotency_key(user, scope, key, fingerprint, ttl=IDEMPOTENCY_TTL, wait=REPLAY_WAIT):
+    """
+    Returns (record, None) when this request owns the key and must run, or
+    (None, response) when it must answer with response: the stored one,
+    409 (still running after wait seconds) or 422 (key reused for another request).
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        now = timezone.now()
+        # Looked up first, a replay then costs a single query
+        record = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+        if record is None:
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user=user, scope=scope, key=key, fingerprint=fingerprint, expires_at=now + ttl
+                    )
+                return record, None
+            except IntegrityError:
+                # Claimed by a concurrent duplicate meanwhile
+                continue
+
+        abandoned = record.status == 'in_progress' and record.updated_at <= now - IN_PROGRESS_LEASE
+        if record.expires_at <= now or abandoned:
+            # Only the request that still sees this very row deletes it, the others retry the claim
+            IdempotencyKey.objects.filter(pk=record.pk, updated_at=record.updated_at).delete()
+            continue
+
+        if record.fingerprint != fingerprint:
+            return None, JsonResponse({'error': 'Idempotency key already used for a different request.'}, status=422)
+
+        if record.status == 'completed':
+            return None, _replay(record)
+
+        if time.monotonic() >= deadline:
+            return None, JsonResponse({'error': 'This request is already being processed.'}, status=409)
+        time.sleep(POLL_INTERVAL)
+
+
+def complete_idempotency_key(record, response):
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        status='completed',
+        response_status=response.status_code,
+        response_body=response.content.decode(response.charset),
+        content_type=response.get('Content-Type', ''),
+        updated_at=timezone.now(),
+    )
+
+
+def release_idempotency_key(record):
+    IdempotencyKey.objects.filter(pk=record.pk, status='in_progress').delete()
+
+
+def purge_idempotency_keys(now=None):
+    """Deletes the expired keys, returns how many."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
+
+
+class IdempotentMixin:
+    """
+    Runs the POST of a view once per idempotency key (see the module docstring).
+    Put it after LoginRequiredMixin: keys belong to the logged in user.
+
+    idempotency_scope: endpoint name, keys of different endpoints never collide
+    get_idempotency_key(request): the Idempotency-Key header by default, views
+    override it to fall back on a key of their own. No key, no idempotency.
+    """
+    idempotency_scope = None
+    idempotency_ttl = IDEMPOTENCY_TTL
+
+    def get_idempotency_key(self, request):
+        return request.headers.get('Idempotency-Key')
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'POST' or not request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.get_idempotency_key(request)
+        if not key:
+            return super().dispatch(request, *args, **kwargs)
+
+        record, response = claim_idempotency_key(
+            request.user, self.idempotency_scope, str(key)[:255], request_fingerprint(request), self.idempotency_ttl
+        )
+        if response is not None:
+            logger.info(f"{self.idempotency_scope}: replayed key {key} ({response.status_code})")
+            return response
+
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except Exception:
+            release_idempotency_key(record)
+            raise
+
+        if 200 <= response.status_code < 300 and not response.streaming:
+            complete_idempotency_key(record, response)
+        else:
+            release_idempotency_key(record)
+        return response
@@ -0,0 +1,104 @@
+"""
+Invoice PDFs, rendered once and stored.
+
+A delivered order gets its invoice rendered by a small per-process thread
+pool once the delivery is committed (order.signals), never inside the request
+that delivers it. The PDF is stored in the private invoice storage under its
+SHA-256 (Invoice.content_hash), next to the hash of the template and CSS that
+produced it (Invoice.template_hash). Downloads stream the stored file.
+
+The regenerate_invoices command renders what the pool missed, and after a
+template change re-renders every invoice made with an older template.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Invoice, InvoiceCounter, Order, invoice_storage
+from .rendering import invoice_renderer
+from .utils import generate_invoice_pdf
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def invoice_template_hash():
+    """SHA-256 of the invoice template and stylesheet, what a stored PDF was rendered with."""
+    return invoice_renderer.source_hash()
+
+
+def create_invoices(orders):
+    """
+    Creates the Invoice rows of the orders that have none, for bulk deliveries:
+    one counter update numbers them all, one INSERT writes them. All or nothing,
+    an IntegrityError (another process invoiced one of the orders meanwhile)
+    gives the numbers back. Returns the created invoices.
+    """
+    orders = list(orders)
+    with transaction.atomic():
+        invoiced = set(Invoice.objects.filter(order__in=orders).values_list('order_id', flat=True))
+        missing = [order for order in orders if order.pk not in invoiced]
+        if not missing:
+            return []
+        numbers = InvoiceCounter.allocate(len(missing))
+        return Invoice.objects.bulk_create([
+            Invoice(order=order, invoice_number=number) for order, number in zip(missing, numbers)
+        ])
+
+
+def store_invoice_pdf(invoice, pdf_file, template_hash):
+    """
+    Stores pdf_file (bytes) under its content hash and points the invoice at it.
+    Identical renders share one file, concurrent renders of an invoice write the same name.
+    """
+    content_hash = hashlib.sha256(pdf_file).hexdigest()
+    name = f"{content_hash[:2]}/{content_hash}.pdf"
+    storage = invoice_storage()
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(pdf_file))
+
+    Invoice.objects.filter(pk=invoice.pk).update(
+        pdf=name, content_hash=content_hash, template_hash=template_hash, rendered_at=timezone.now()
+    )
+    invoice.pdf.name, invoice.content_hash, invoice.template_hash = name, content_hash, template_hash
+    return invoice
+
+
+def render_invoice(order, template_hash=None):
+    """Renders and stores the invoice of order (creating the Invoice if needed), returns it."""
+    invoice, pdf_file = generate_invoice_pdf(order)
+    return store_invoice_pdf(invoice, pdf_file, template_hash or invoice_template_hash())
+
+
+def _render_in_background(order_pk):
+    try:
+        order = Order.objects.select_related('user').get(pk=order_pk)
+        render_invoice(order)
+        logger.info(f"Invoice of order {order.order_id} rendered")
+    except Exception:
+        logger.exception(f"Invoice rendering failed for order {order_pk}, regenerate_invoices will retry it")
+    finally:
+        # Pool threads outlive requests, Django never closes their connections
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.INVOICE_RENDER_WORKERS, thread_name_prefix='invoice'
+                )
+    return _executor
+
+
+def schedule_invoice_render(order):
+    """Queues the invoice of order for the render pool, once the current transaction commits."""
+    transaction.on_commit(lambda: _get_executor().submit(_render_in_background, order.pk))
@@ -0,0 +1,73 @@
+import statistics
+import time
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from weasyprint import HTML
+from order.models import Invoice, Order
+from order.rendering import invoice_renderer
+
+
+def _legacy_render(context):
+    # Per invoice work as it was done before order.rendering: find and read the
+    # CSS, inline it, and let WeasyPrint parse it and set up fonts from scratch
+    css_path = finders.find('css/order/invoice.css')
+    with open(css_path, 'r') as f:
+        css_content = f.read()
+    html_string = render_to_string('order/invoice.html', context)
+    html_string = html_string.replace('</head>', f'<style>{css_content}</style></head>', 1)
+    return HTML(string=html_string, base_url=None).write_pdf()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark invoice PDF rendering: per invoice CSS lookup and parsing vs the shared '
+        'order.rendering renderer, on one existing order. Nothing is written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', help='order_id of the order to render (default: latest order with items)')
+        parser.add_argument('--invoices', type=int, default=20, help='Invoices rendered per run (default: 20)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path (default: 3)')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.select_related('user').filter(items__isnull=False).order_by('-created_at')
+        if options['order']:
+            orders = orders.filter(order_id=options['order'])
+        order = orders.first()
+        if order is None:
+            raise CommandError('No order with items to render.')
+
+        invoice = Invoice.objects.filter(order=order).first() or Invoice(order=order, invoice_number='INV-BENCH-00000')
+        context = {
+            'order': order,
+            'invoice': invoice,
+            'user': order.user,
+            # Fetched once: the benchmark measures rendering, not the items query
+            'items': list(order.items.all()),
+            'for_pdf': True,
+        }
+
+        paths = {
+            'legacy': _legacy_render,
+            'renderer': invoice_renderer.render,
+        }
+        started = time.perf_counter()
+        invoice_renderer.render(context)
+        self.stdout.write(f"Renderer warm-up (template, CSS, fonts): {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        self.stdout.write(f"{'path':<12}{'ms / invoice':>14}")
+        results = {}
+        for label, render in paths.items():
+            timings = []
+            for _ in range(options['repeat']):
+                begin = time.perf_counter()
+                for _ in range(options['invoices']):
+                    render(context)
+                timings.append(time.perf_counter() - begin)
+            results[label] = statistics.median(timings) / options['invoices'] * 1000
+            self.stdout.write(f"{label:<12}{results[label]:>14.2f}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Benchmark finished, renderer {results['legacy'] / results['renderer']:.1f}x the legacy path."
+        ))
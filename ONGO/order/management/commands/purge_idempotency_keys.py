@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from order.idempotency import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys of the checkout endpoints (stored responses included).'
+
+    def handle(self, *args, **options):
+        deleted = purge_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys"))
@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand
+from order.invoices import create_invoices, invoice_template_hash, render_invoice
+from order.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the invoice PDFs of delivered orders that have none, and re-render the ones made '
+        'with an older invoice template or stylesheet.'
+    )
+
+    batch_size = 200
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render every invoice, current or not')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the invoices to render')
+
+    def handle(self, *args, **options):
+        template_hash = invoice_template_hash()
+        orders = Order.objects.filter(status='delivered').select_related('user', 'invoice')
+        if not options['all']:
+            # No invoice, no PDF yet, or a PDF from another template
+            orders = orders.exclude(invoice__template_hash=template_hash, invoice__pdf__gt='')
+
+        if options['dry_run']:
+            self.stdout.write(f"{orders.count()} invoices to render with template {template_hash[:12]}")
+            return
+
+        started = time.perf_counter()
+        rendered = failed = 0
+        orders = list(orders)
+        for start in range(0, len(orders), self.batch_size):
+            batch = orders[start:start + self.batch_size]
+            # Numbers for the whole batch at once, instead of one counter update per invoice
+            create_invoices(order for order in batch if not hasattr(order, 'invoice'))
+            for order in batch:
+                try:
+                    render_invoice(order, template_hash)
+                    rendered += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"Order {order.order_id}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {rendered} invoices ({failed} failed) in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from order.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        'Put the stock of expired online payment reservations back on sale. '
+        'Run it from cron, or with --interval as a long running worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Reservations released per transaction (default: 500)')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, sweeping every INTERVAL seconds (default: run once)')
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_reservations(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Released {released} expired reservations"))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:33
+
+import order.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0007_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='pdf',
+            field=models.FileField(blank=True, storage=order.models.invoice_storage, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='rendered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='template_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
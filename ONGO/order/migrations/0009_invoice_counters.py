@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:34
+
+import re
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    # Continue every year after the highest number already issued in it
+    Invoice = apps.get_model('order', 'Invoice')
+    InvoiceCounter = apps.get_model('order', 'InvoiceCounter')
+    last_numbers = {}
+    for invoice_number in Invoice.objects.values_list('invoice_number', flat=True).iterator():
+        match = re.fullmatch(r'INV-(\d{4})-(\d+)', invoice_number)
+        if match:
+            year, number = int(match[1]), int(match[2])
+            last_numbers[year] = max(number, last_numbers.get(year, 0))
+    InvoiceCounter.objects.bulk_create([
+        InvoiceCounter(year=year, last_number=number) for year, number in last_numbers.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0008_invoice_pdf_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceCounter',
+            fields=[
+                ('year', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
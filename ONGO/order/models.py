@@ -1,5 +1,7 @@
 import uuid
-from django.db import models
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, models, transaction
 from django.utils import timezone
 from accounts.models import User, Address
 from django.core.validators import MinValueValidator
@@ -81,6 +83,10 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -130,27 +136,99 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class StockReservation(models.Model):
+    """
+    Stock held for an online order while it is being paid (order.reservations).
+    The quantity is taken from ProductVariant.stock when reserved, kept on
+    payment (converted) and put back on expiry or cancellation (released).
+    """
+
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('converted', 'Converted'),
+        ('released', 'Released'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_variant_id} for {self.order_id} ({self.status})"
+
+
+def invoice_storage():
+    # Private: invoices are only served through the download view
+    return FileSystemStorage(location=settings.INVOICE_STORAGE_ROOT)
+
+
 class Invoice(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='invoice')
     invoice_number = models.CharField(max_length=50, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Rendered PDF (order.invoices), named after its SHA-256
+    pdf = models.FileField(storage=invoice_storage, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)
+    # Hash of the template + CSS the PDF was rendered with, stale after a template change
+    template_hash = models.CharField(max_length=64, blank=True)
+    rendered_at = models.DateTimeField(null=True, blank=True)
+
     def __str__(self):
         return f"Invoice {self.invoice_number} for Order {self.order.order_id}"
 
     def save(self, *args, **kwargs):
-        if not self.invoice_number:
-            last_invoice = Invoice.objects.order_by('-created_at').first()
-            if last_invoice:
-                try:
-                    last_number = int(last_invoice.invoice_number.split('-')[-1])
-                    new_number = last_number + 1
-                except (ValueError, IndexError):
-                    new_number = 1
-            else:
-                new_number = 1
-            self.invoice_number = f"INV-{timezone.now().year}-{new_number:05d}"
-        super().save(*args, **kwargs)
+        if self.invoice_number:
+            return super().save(*args, **kwargs)
+        # Number and row commit or roll back together, a failed insert leaves no gap
+        with transaction.atomic():
+            self.invoice_number = InvoiceCounter.allocate()[0]
+            super().save(*args, **kwargs)
+
+
+class InvoiceCounter(models.Model):
+    """
+    Last invoice number issued per year. Numbers are taken with one atomic
+    upsert of this row, in the caller's transaction: concurrent deliveries
+    queue on the row lock instead of racing to the same number, and numbers
+    of a rolled back transaction are given back (no gaps).
+    """
+
+    year = models.PositiveSmallIntegerField(primary_key=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.year}: {self.last_number}"
+
+    @classmethod
+    def allocate(cls, count=1, year=None):
+        """
+        Takes the next count invoice numbers of year (current year by default),
+        returns them as ['INV-2026-00042', ...]. Keep the calling transaction
+        short: the counter row stays locked until it commits.
+        """
+        year = year or timezone.now().year
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} AS c (year, last_number) VALUES (%s, %s)
+                ON CONFLICT (year) DO UPDATE SET last_number = c.last_number + EXCLUDED.last_number
+                RETURNING c.last_number
+                """,
+                [year, count],
+            )
+            last = cursor.fetchone()[0]
+        return [f"INV-{year}-{number:05d}" for number in range(last - count + 1, last + 1)]
 
 
 class ProductReview(models.Model):
@@ -183,3 +261,33 @@ class ProductReviewImage(models.Model):
 
     def __str__(self):
         return f"Image for Review #{self.review.id}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    One keyed request of a user to an idempotent endpoint (order.idempotency)
+    and, once it succeeded, its response, replayed to every retry until expires_at.
+    """
+
+    STATUS_CHOICES = [
+        ('in_progress', 'In progress'),
+        ('completed', 'Completed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='in_progress')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'scope', 'key')
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.status})"
@@ -0,0 +1,58 @@
+"""
+PDF rendering with the template, stylesheet and fonts loaded once.
+
+A PdfRenderer keeps, per thread, the compiled Django template, the parsed
+WeasyPrint CSS and the FontConfiguration it was parsed with, built on the
+first render. Later renders only fill the template and lay out the HTML.
+State is per thread because WeasyPrint font configurations are not meant to
+be shared between threads: each request thread or invoice pool worker loads
+once and reuses its own copy.
+"""
+import hashlib
+import threading
+from django.contrib.staticfiles import finders
+from django.template.loader import get_template
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+
+class PdfRenderer:
+
+    def __init__(self, template_name, stylesheet):
+        self.template_name = template_name
+        # Static path of the stylesheet, found through the staticfiles finders
+        self.stylesheet = stylesheet
+        self._local = threading.local()
+
+    def _read_stylesheet(self):
+        path = finders.find(self.stylesheet)
+        if not path:
+            raise FileNotFoundError(f"Stylesheet {self.stylesheet} not found by the staticfiles finders")
+        with open(path, 'r') as f:
+            return f.read()
+
+    def _loaded(self):
+        local = self._local
+        if not hasattr(local, 'template'):
+            css_text = self._read_stylesheet()
+            local.font_config = FontConfiguration()
+            local.css = CSS(string=css_text, font_config=local.font_config)
+            local.template = get_template(self.template_name)
+            local.source_hash = hashlib.sha256(
+                local.template.template.source.encode() + css_text.encode()
+            ).hexdigest()
+        return local
+
+    def source_hash(self):
+        """SHA-256 of the template and stylesheet sources this thread renders with."""
+        return self._loaded().source_hash
+
+    def render(self, context):
+        """PDF bytes of the template filled with context."""
+        local = self._loaded()
+        html = local.template.render(context)
+        return HTML(string=html).write_pdf(stylesheets=[local.css], font_config=local.font_config)
+
+
+invoice_renderer = PdfRenderer('order/invoice.html', 'css/order/invoice.css')
+sales_report_renderer = PdfRenderer('adminpanel/sales_report.html', 'css/adminpanel/sales_report.css')
@@ -0,0 +1,143 @@
+"""
+Stock reservations for online payments.
+
+An online order takes its stock when it is created (products.inventory.deduct_stock,
+so listings, the PDP and the cart stock check only ever see what is still for sale)
+and records it as active StockReservation rows with an expiry. A verified payment
+converts them, an abandoned payment gets them released by the
+release_expired_reservations command, cancelling the unpaid order releases them
+right away.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from products.inventory import deduct_stock, restock
+from .models import StockReservation
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_TTL = timedelta(minutes=15)
+
+
+def holds_reserved_stock(order):
+    """
+    True while the order's stock is held by reservations instead of sold
+    (online order not paid yet). Cancelling it must release, not restock.
+    """
+    return order.payment_method == 'online' and order.payment_status != 'paid'
+
+
+def retry_reserved_quantities(order_id, user, variant_ids):
+    """
+    {variant_id: quantity} the user's order order_id still holds in active
+    reservations: stock that order's payment retry may take on top of what is on sale.
+    """
+    held = Counter()
+    for variant_id, quantity in StockReservation.objects.filter(
+        order__order_id=order_id, order__user=user, status='active', product_variant_id__in=variant_ids,
+    ).values_list('product_variant_id', 'quantity'):
+        held[variant_id] += quantity
+    return held
+
+
+def _missing_quantities(order, active):
+    # What the live order items need on top of what the active reservations already hold
+    needed = Counter()
+    for variant_id, quantity in order.items.exclude(status='cancelled').values_list('product_variant_id', 'quantity'):
+        needed[variant_id] += quantity
+    needed.subtract(active)
+    return {variant_id: quantity for variant_id, quantity in needed.items() if quantity > 0}
+
+
+def reserve_order_stock(order, ttl=RESERVATION_TTL):
+    """
+    Reserves the stock of every item of an online order until now + ttl.
+    Items already reserved (payment retry) get their expiry pushed back, the rest
+    is taken in one conditional UPDATE. Raises InsufficientStock, nothing reserved.
+    """
+    expires_at = timezone.now() + ttl
+    with transaction.atomic():
+        reservations = list(order.reservations.select_for_update().filter(status='active'))
+        active = Counter()
+        for reservation in reservations:
+            active[reservation.product_variant_id] += reservation.quantity
+
+        missing = _missing_quantities(order, active)
+        deduct_stock(missing)
+
+        order.reservations.filter(pk__in=[reservation.pk for reservation in reservations]).update(
+            expires_at=expires_at, updated_at=timezone.now()
+        )
+        StockReservation.objects.bulk_create([
+            StockReservation(order=order, product_variant_id=variant_id, quantity=quantity, expires_at=expires_at)
+            for variant_id, quantity in missing.items()
+        ])
+
+
+def convert_reservations(order):
+    """
+    Payment received: the reserved stock is sold. Lines whose reservation ran out
+    before the payment came back are taken again, raising InsufficientStock
+    (nothing converted) when that stock is gone meanwhile.
+    """
+    with transaction.atomic():
+        reservations = list(order.reservations.select_for_update().filter(status='active'))
+        active = Counter()
+        for reservation in reservations:
+            active[reservation.product_variant_id] += reservation.quantity
+
+        deduct_stock(_missing_quantities(order, active))
+        order.reservations.filter(pk__in=[reservation.pk for reservation in reservations]).update(
+            status='converted', updated_at=timezone.now()
+        )
+
+
+def _release(reservations):
+    reservations = list(reservations)
+    if not reservations:
+        return 0
+    restock([(reservation.product_variant_id, reservation.quantity) for reservation in reservations])
+    StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).update(
+        status='released', updated_at=timezone.now()
+    )
+    return len(reservations)
+
+
+def release_reservations(order, variant_ids=None):
+    """
+    Puts the actively reserved stock of an order (or only of variant_ids) back on sale.
+    Returns the number of reservations released.
+    """
+    with transaction.atomic():
+        reservations = order.reservations.select_for_update().filter(status='active')
+        if variant_ids is not None:
+            reservations = reservations.filter(product_variant_id__in=variant_ids)
+        return _release(reservations)
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """
+    Sweeper: releases every active reservation past its expiry, batch by batch.
+    Rows locked by a payment being verified right now are skipped, the next run
+    sees them again if they are still active. Returns the number released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects
+                .select_for_update(skip_locked=True)
+                .filter(status='active', expires_at__lte=now)
+                .order_by('expires_at')[:batch_size]
+            )
+            count = _release(batch)
+        released += count
+        if count < batch_size:
+            break
+
+    if released:
+        logger.info(f"Released {released} expired stock reservations")
+    return released
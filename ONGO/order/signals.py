@@ -1,13 +1,18 @@
 from django.dispatch import receiver
 from django.db.models.signals import post_save
-from .models import Order
-from .utils import generate_invoice_pdf
+from .invoices import schedule_invoice_render
+from .models import Invoice, Order
 
 
 @receiver(post_save, sender=Order)
-def invoice_generation_signal(sender, instance, created, **kwargs):
+def invoice_generation_signal(sender, instance, created, update_fields=None, **kwargs):
     """
-    Triggers invoice generation when order status changes to 'delivered'.
+    Queues invoice rendering (order.invoices) when order status changes to 'delivered'.
+    The PDF is rendered by the background pool after commit, not in this request.
     """
-    if instance.status == 'delivered' and not hasattr(instance, 'invoice'):
-        generate_invoice_pdf(instance)
+    if instance.status != 'delivered':
+        return
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    if not Invoice.objects.filter(order=instance).exclude(pdf='').exists():
+        schedule_invoice_render(instance)
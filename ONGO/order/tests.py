@@ -1,3 +1,269 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.db import connections, transaction
+from django.test import Client, TestCase, TransactionTestCase
+from django.utils import timezone
+from accounts.models import Address, User, Wallet, WalletTransaction
+from cart.models import Cart
+from products.models import Category, Product, ProductVariant
+from .gateway import FakeGateway
+from .invoices import create_invoices
+from .models import IdempotencyKey, Invoice, InvoiceCounter, Order, StockReservation
 
-# Create your tests here.
+
+class CheckoutIdempotencyTests(TransactionTestCase):
+    """
+    Duplicate submits of the checkout endpoints, sent together with the same
+    idempotency key, must run once and all get the first response back.
+    """
+    requests = 8
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='secret-pass-1', phone_number='9999999999'
+        )
+        self.address = Address.objects.create(
+            user=self.user, name='Buyer', street_address='1 Street', city='Kochi', state='Kerala',
+            country='India', postal_code='682001', phone='9999999999',
+        )
+        category = Category.objects.create(name='Shirts')
+        product = Product.objects.create(category=category, name='Shirt', description='-')
+        self.variant = ProductVariant.objects.create(
+            product=product, size='M', color='Blue', price=Decimal('500'), stock=5, sku='shirt-m-blue',
+        )
+        Cart.objects.create(user=self.user, product_variant=self.variant, quantity=2)
+        self.wallet = Wallet.objects.create(user=self.user, balance=Decimal('10000.00'))
+
+        self.client.force_login(self.user)
+
+    def start_checkout(self, payment_method):
+        session = self.client.session
+        session['checkout_information'] = {'address_id': self.address.id, 'payment_methode': payment_method}
+        session['checkout_step'] = 'confirmation'
+        session.save()
+
+    def post_in_parallel(self, path, data, **headers):
+        # Every client shares the session of self.client, like tabs of one browser
+        session_cookie = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        barrier = threading.Barrier(self.requests)
+        responses = []
+
+        def post():
+            client = Client()
+            client.cookies[settings.SESSION_COOKIE_NAME] = session_cookie
+            try:
+                barrier.wait()
+                responses.append(client.post(path, data, content_type='application/json', headers=headers))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=post) for _ in range(self.requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_concurrent_wallet_orders_with_one_key_debit_once(self):
+        self.start_checkout('wallet')
+
+        responses = self.post_in_parallel('/checkout/place-order/', {}, idempotency_key='double-click')
+
+        self.assertEqual([response.status_code for response in responses], [200] * self.requests)
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(sum(response.has_header('Idempotent-Replayed') for response in responses), self.requests - 1)
+
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(WalletTransaction.objects.filter(wallet=self.wallet, transaction_type='debit').count(), 1)
+        self.wallet.refresh_from_db()
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(self.wallet.balance, Decimal('10000.00') - order.total_amount)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 3)
+
+    def test_replay_uses_the_key_issued_by_the_confirmation_page(self):
+        self.start_checkout('cod')
+        session = self.client.session
+        session['checkout_idempotency_key'] = 'issued-by-server'
+        session.save()
+
+        first = self.client.post('/checkout/place-order/', {}, content_type='application/json')
+        with self.assertNumQueries(3):  # session, user, stored response
+            replay = self.client.post('/checkout/place-order/', {}, content_type='application/json')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(replay.content, first.content)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_failed_request_does_not_keep_the_key(self):
+        self.wallet.balance = Decimal('1.00')
+        self.wallet.save()
+        self.start_checkout('wallet')
+
+        response = self.client.post('/checkout/place-order/', {}, content_type='application/json',
+                                    headers={'idempotency-key': 'retry-me'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.filter(key='retry-me').exists())
+
+    def test_concurrent_payment_verifications_confirm_once(self):
+        gateway = FakeGateway()
+        self.start_checkout('online')
+        with mock.patch('order.utils.get_payment_gateway', return_value=gateway):
+            placed = self.client.post('/checkout/place-order/', {}, content_type='application/json').json()
+            payment = dict(gateway.pay(placed['razorpay_order_id']), internal_order_id=str(placed['internal_order_id']))
+
+            responses = self.post_in_parallel('/checkout/verify-payment/', json.dumps(payment))
+
+        self.assertEqual([response.status_code for response in responses], [200] * self.requests)
+        self.assertEqual(len({response.content for response in responses}), 1)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual((order.status, order.payment_status), ('confirmed', 'paid'))
+        self.assertEqual(list(order.reservations.values_list('status', flat=True)), ['converted'])
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 3)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        IdempotencyKey.objects.create(
+            user=self.user, scope='verify_payment', key='same', fingerprint='of another request',
+            status='completed', response_status=200, response_body='{}', content_type='application/json',
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+        response = self.client.post('/checkout/verify-payment/', json.dumps({'razorpay_payment_id': 'pay_2'}),
+                                    content_type='application/json', headers={'idempotency-key': 'same'})
+
+        self.assertEqual(response.status_code, 422)
+
+
+class CheckoutStepsTests(TestCase):
+    """
+    Information -> payment method -> confirmation, with the stock read live on every step.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret-pass-1')
+        self.address = Address.objects.create(
+            user=self.user, name='Buyer', street_address='1 Street', city='Kochi', state='Kerala',
+            country='India', postal_code='682001', phone='9999999999',
+        )
+        category = Category.objects.create(name='Shirts')
+        product = Product.objects.create(category=category, name='Shirt', description='-')
+        self.variant = ProductVariant.objects.create(
+            product=product, size='M', color='Blue', price=Decimal('300'), stock=5, sku='shirt-m-blue',
+        )
+        Cart.objects.create(user=self.user, product_variant=self.variant, quantity=2)
+        Wallet.objects.create(user=self.user, balance=Decimal('10000.00'))
+        self.client.force_login(self.user)
+
+    def test_checkout_steps(self):
+        self.assertEqual(self.client.get('/checkout/information/').status_code, 200)
+        response = self.client.post('/checkout/information/', {'shipping_address': self.address.id})
+        self.assertRedirects(response, '/checkout/payment-methode/', fetch_redirect_response=False)
+
+        self.assertEqual(self.client.get('/checkout/payment-methode/').status_code, 200)
+        response = self.client.post('/checkout/payment-methode/', {'payment_method': 'wallet'})
+        self.assertRedirects(response, '/checkout/order-confiramtion/', fetch_redirect_response=False)
+
+        response = self.client.get('/checkout/order-confiramtion/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session['checkout_step'], 'confirmation')
+
+    def test_every_step_sends_a_cart_the_stock_cannot_fill_back(self):
+        self.client.post('/checkout/information/', {'shipping_address': self.address.id})
+        self.client.post('/checkout/payment-methode/', {'payment_method': 'wallet'})
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock=1)
+
+        for path in ('/checkout/information/', '/checkout/payment-methode/', '/checkout/order-confiramtion/'):
+            self.assertRedirects(self.client.get(path), '/cart/', fetch_redirect_response=False)
+
+    def test_payment_retry_counts_its_own_reservation(self):
+        # An unpaid online order holding the last two units
+        order = Order.objects.create(
+            user=self.user, address=self.address, payment_method='online',
+            sub_total=Decimal('600'), total_amount=Decimal('600'),
+        )
+        StockReservation.objects.create(
+            order=order, product_variant=self.variant, quantity=2, expires_at=timezone.now() + timedelta(minutes=15),
+        )
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock=0)
+        self.client.post('/checkout/information/', {'shipping_address': self.address.id})
+        self.client.post('/checkout/payment-methode/', {'payment_method': 'wallet'})
+
+        self.assertRedirects(self.client.get('/checkout/order-confiramtion/'), '/cart/', fetch_redirect_response=False)
+
+        session = self.client.session
+        session['retry_payment'] = 'true'
+        session['retry_order_id'] = str(order.order_id)
+        session.save()
+        self.assertEqual(self.client.get('/checkout/order-confiramtion/').status_code, 200)
+
+
+class InvoiceNumberingStressTests(TransactionTestCase):
+    """
+    Thousands of invoices created in parallel, one by one and in batches,
+    must get unique numbers without gaps.
+    """
+    threads = 8
+    invoices_per_thread = 250
+
+    def setUp(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret-pass-1')
+        address = Address.objects.create(
+            user=user, name='Buyer', street_address='1 Street', city='Kochi', state='Kerala',
+            country='India', postal_code='682001', phone='9999999999',
+        )
+        self.orders = Order.objects.bulk_create([
+            Order(user=user, address=address, sub_total=Decimal('100'), total_amount=Decimal('100'), status='delivered')
+            for _ in range(self.threads * self.invoices_per_thread)
+        ])
+
+    def test_parallel_numbering_is_unique_and_gapless(self):
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def invoice(orders, batched):
+            try:
+                barrier.wait()
+                if batched:
+                    for start in range(0, len(orders), 25):
+                        create_invoices(orders[start:start + 25])
+                else:
+                    for order in orders:
+                        Invoice.objects.create(order=order)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        size = self.invoices_per_thread
+        threads = [
+            threading.Thread(target=invoice, args=(self.orders[number * size:(number + 1) * size], number % 2 == 0))
+            for number in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        total = len(self.orders)
+        numbers = sorted(int(number.rsplit('-', 1)[1]) for number in Invoice.objects.values_list('invoice_number', flat=True))
+        self.assertEqual(numbers, list(range(1, total + 1)))
+        self.assertEqual(InvoiceCounter.objects.get().last_number, total)
+
+    def test_rolled_back_invoice_gives_its_number_back(self):
+        first, second = self.orders[:2]
+        Invoice.objects.create(order=first)
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Invoice.objects.create(order=second)
+                raise RuntimeError('delivery failed')
+
+        self.assertEqual(Invoice.objects.create(order=second).invoice_number.rsplit('-', 1)[1], '00002')
@@ -1,52 +1,37 @@
-import weasyprint
-from django.template.loader import render_to_string
 from .models import Invoice
-from coupons.models import Coupon, CouponUsage
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from coupons.models import Coupon, CouponUserUsage, normalize_coupon_code
 from decimal import Decimal, ROUND_HALF_UP
 
-import razorpay
-from django.conf import settings
-
-
-from django.contrib.staticfiles import finders
+from .gateway import get_payment_gateway
+from .rendering import invoice_renderer
 
 
 def generate_invoice_pdf(order):
     invoice, created = Invoice.objects.get_or_create(order=order)
 
-    css_path = finders.find('css/order/invoice.css')
-    css_content = ""
-    if css_path:
-        try:
-            with open(css_path, 'r') as f:
-                css_content = f.read()
-        except Exception as e:
-            print(f"⚠️ CSS load error: {e}")
-    else:
-        print("⚠️ CSS file not found by staticfiles finders!")
-
     context = {
         'order': order,
         'invoice': invoice,
         'user': order.user,
         'items': order.items.all(),
         'for_pdf': True,
-        'css_content': css_content
     }
 
-    html_string = render_to_string('order/invoice.html', context)
-
-    pdf_file = weasyprint.HTML(
-        string=html_string,
-        base_url=None,
-    ).write_pdf()
+    # Template, invoice.css and fonts are loaded once per worker by the renderer
+    pdf_file = invoice_renderer.render(context)
 
     return invoice, pdf_file
 
 
 def validate_and_apply_coupon(user, coupon_code, base_total):
+    # One indexed query: the coupon by its normalized code, with the user's usage counter
+    user_usage = CouponUserUsage.objects.filter(coupon=OuterRef('pk'), user=user).values('times_used')[:1]
     try:
-        coupon = Coupon.objects.get(coupon_code__iexact=coupon_code.strip())
+        coupon = Coupon.objects.annotate(
+            user_times_used=Coalesce(Subquery(user_usage), 0)
+        ).get(coupon_code=normalize_coupon_code(coupon_code))
     except Coupon.DoesNotExist:
         return False, Decimal('0.00'), False, "Invalid coupon code"
 
@@ -55,7 +40,7 @@ def validate_and_apply_coupon(user, coupon_code, base_total):
         return False, Decimal('0.00'), False, "Coupon is expired or inactive"
 
     # Check user-specific usage limit
-    user_usage = CouponUsage.objects.filter(user=user, coupon=coupon).count()
+    user_usage = coupon.user_times_used
     if user_usage >= coupon.per_user_limit:
         return (False, Decimal('0.00'), False,
                 f"You've used this coupon {user_usage} times (limit: {coupon.per_user_limit})")
@@ -84,21 +69,13 @@ def validate_and_apply_coupon(user, coupon_code, base_total):
     return True, discount, free_shipping, ""
 
 
-razorpay_client = razorpay.Client(
-    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-)
-
-
-def create_razorpay_order(amount_inr: Decimal) -> dict:
+def create_razorpay_order(amount_inr: Decimal, receipt=None) -> dict:
     """
     Create Razorpay order (amount in INR, converted to paisa)
     Returns: {'id': 'order_xxx', 'amount': 50000, 'currency': 'INR', ...}
+    Raises order.gateway.PaymentGatewayError when the gateway cannot serve it.
     """
-    print('razorpay order creation called')
-    return razorpay_client.order.create({
-        'amount': int(amount_inr * 100),
-        'currency': 'INR',
-    })
+    return get_payment_gateway().create_order(amount_inr, receipt=receipt)
 
 
 def verify_razorpay_signature(params_dict: dict) -> bool:
@@ -107,8 +84,7 @@ def verify_razorpay_signature(params_dict: dict) -> bool:
     params_dict should contain: razorpay_order_id, razorpay_payment_id, razorpay_signature
     """
     try:
-        razorpay_client.utility.verify_payment_signature(params_dict)
-        return True
+        return get_payment_gateway().verify_signature(params_dict)
     except Exception:
         return False
 
@@ -1,7 +1,7 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 # from django.views.generic import ListView
-from cart.utils import get_cart_items_for_user
+from cart.utils import get_cart_items_for_user, refresh_cart_count
 from django.contrib.auth.mixins import LoginRequiredMixin
 
 from django.views.decorators.cache import never_cache
@@ -12,7 +12,7 @@ from django.views import View
 
 from django.shortcuts import get_object_or_404
 
-from django.http import JsonResponse, Http404, HttpResponse
+from django.http import FileResponse, JsonResponse, Http404
 # from django.views.decorators.csrf import csrf_exempt
 
 from django.contrib.auth.decorators import login_required
@@ -28,21 +28,28 @@ from django.utils import timezone
 from django.conf import settings
 
 from cart.models import Cart
-from .models import Order, OrderItem
+from .invoices import render_invoice
+from .models import Invoice, Order, OrderItem
+from .gateway import PaymentGatewayError
+from .idempotency import IdempotentMixin
+from .reservations import (
+    convert_reservations, holds_reserved_stock, release_reservations, reserve_order_stock, retry_reserved_quantities,
+)
 from products.models import ProductVariant
+from products.inventory import InsufficientStock, deduct_stock
 from accounts.models import Address, WalletTransaction
-from coupons.models import Coupon, CouponUsage
+from coupons.models import Coupon, normalize_coupon_code
+from coupons.utils import CouponLimitReached, record_coupon_usage
 
 from .utils import (
     validate_and_apply_coupon,
     create_razorpay_order,
     verify_razorpay_signature,
-    generate_invoice_pdf,
 )
 
 import logging
 import json
-from uuid import UUID
+from uuid import UUID, uuid4
 
 
 # Create your views here.
@@ -50,6 +57,32 @@ from uuid import UUID
 logger = logging.getLogger(__name__)
 
 
+def checkout_stock(request, variants):
+    """
+    {variant_id: units the checkout can take} for variants ({id: ProductVariant}).
+    Reserved units are already off ProductVariant.stock, a payment retry also
+    gets back what its own order still holds reserved.
+    """
+    stock = {variant_id: variant.stock for variant_id, variant in variants.items()}
+    retry_order_id = request.session.get('retry_order_id')
+    if request.session.get('retry_payment') == 'true' and retry_order_id:
+        for variant_id, quantity in retry_reserved_quantities(retry_order_id, request.user, list(stock)).items():
+            stock[variant_id] += quantity
+    return stock
+
+
+def first_short_item(request, cart_items):
+    """
+    First cart line the live stock can no longer fill, None when all can be.
+    The cached cart lines only say whether a variant is in stock, not how many.
+    """
+    stock = checkout_stock(request, ProductVariant.objects.in_bulk([item['variant_id'] for item in cart_items]))
+    for item in cart_items:
+        if stock.get(item['variant_id'], 0) < item['quantity']:
+            return item
+    return None
+
+
 @method_decorator(never_cache, name='dispatch')
 class CheckoutInformation(LoginRequiredMixin, View):
     template_name = 'checkout/information.html'
@@ -62,10 +95,10 @@ class CheckoutInformation(LoginRequiredMixin, View):
 
         cart_items, cart_summary = get_cart_items_for_user(request, user)
 
-        for item in cart_items:
-            if item.get('stock') < item.get('quantity'):
-                messages.error(request, f"Insufficient Stock for {item.get('product_name')}")
-                return redirect('cart')
+        short_item = first_short_item(request, cart_items)
+        if short_item:
+            messages.error(request, f"Insufficient Stock for {short_item.get('product_name')}")
+            return redirect('cart')
 
         total_payable = cart_summary['total_payable']
         now = timezone.now()
@@ -145,10 +178,10 @@ class PaymentMethode(LoginRequiredMixin, View):
         address = get_object_or_404(Address, user=user, id=address_id)
         cart_items, cart_summary = get_cart_items_for_user(request, user)
 
-        for item in cart_items:
-            if item.get('stock') < item.get('quantity'):
-                messages.error(request, f"Insufficient Stock for {item.get('product_name')}")
-                return None, redirect('cart')
+        short_item = first_short_item(request, cart_items)
+        if short_item:
+            messages.error(request, f"Insufficient Stock for {short_item.get('product_name')}")
+            return None, redirect('cart')
 
         wallet = user.wallet.first()
         wallet_balance = wallet.balance if wallet else Decimal('0.00')
@@ -231,23 +264,31 @@ class OrderConfirmation(LoginRequiredMixin, View):
 
         cart_items, cart_summary = get_cart_items_for_user(request, user)
 
-        for item in cart_items:
-            if item.get('stock') < item.get('quantity'):
-                messages.error(request, f"Insufficient Stock for {item.get('product_name')}")
-                return redirect('cart')
+        short_item = first_short_item(request, cart_items)
+        if short_item:
+            messages.error(request, f"Insufficient Stock for {short_item.get('product_name')}")
+            return redirect('cart')
 
         request.session["checkout_step"] = "confirmation"
+        # One key per confirmation page: every submit of this page is the same order
+        request.session["checkout_idempotency_key"] = uuid4().hex
         request.session.modified = True
 
         return render(request, self.template_name, {'address': address,
                                                     'cart_items': cart_items,
                                                     'payment_methode': payment_methode,
-                                                    'cart_summary': cart_summary})
+                                                    'cart_summary': cart_summary,
+                                                    'idempotency_key': request.session["checkout_idempotency_key"]})
 
 
-class PlaceOrder(LoginRequiredMixin, View):
+class PlaceOrder(LoginRequiredMixin, IdempotentMixin, View):
+
+    idempotency_scope = 'place_order'
+
+    def get_idempotency_key(self, request):
+        # Issued by OrderConfirmation when the client does not send its own
+        return super().get_idempotency_key(request) or request.session.get('checkout_idempotency_key')
 
-    @transaction.atomic
     def post(self, request):
         checkout_information = request.session.get('checkout_information', {})
         address_id = checkout_information.get('address_id')
@@ -269,17 +310,17 @@ class PlaceOrder(LoginRequiredMixin, View):
         if not cart_list:
             return JsonResponse({'error': 'Your Cart is Empty'}, status=400)
 
+        # Early, friendly check only: stock is taken by products.inventory.deduct_stock,
+        # which re-checks atomically, so no rows are locked here
         variant_ids = [item['variant_id'] for item in cart_list]
-        locked_variants = {
-            v.id: v for v in ProductVariant.objects.select_for_update().filter(id__in=variant_ids)
-        }
+        variants = ProductVariant.objects.in_bulk(variant_ids)
+        stock = checkout_stock(request, variants)
 
         for item in cart_list:
-            variant = locked_variants.get(item['variant_id'])
-            if not variant:
+            if item['variant_id'] not in variants:
                 return JsonResponse({'error': f"Item {item['product_name']} is no longer available."}, status=400)
 
-            if variant.stock < item['quantity']:
+            if stock[item['variant_id']] < item['quantity']:
                 return JsonResponse({
                     'error': f"Insufficient stock for {item['product_name']} ({item['size']}/{item['color']})"
                 }, status=400)
@@ -297,8 +338,7 @@ class PlaceOrder(LoginRequiredMixin, View):
         if coupon_code:
             try:
                 coupon = Coupon.objects.get(
-                    coupon_code__iexact=coupon_code,
-                    coupon_code__isnull=False,
+                    coupon_code=normalize_coupon_code(coupon_code),
                     active=True
                 )
             except Coupon.DoesNotExist:
@@ -306,130 +346,175 @@ class PlaceOrder(LoginRequiredMixin, View):
                     'error': 'Applied coupon is no longer valid. Please re-apply and try again.'
                 }, status=400)
 
+        rzp_order = None
         if payment_methode == 'online':
+            # Before any database write: gateway latency never keeps the transaction
+            # (and the stock rows it locks) open
             try:
                 rzp_order = create_razorpay_order(total_payable)
-                print('DEBUG: rzp_order: ', rzp_order)
+            except PaymentGatewayError as e:
+                logger.warning(f"Razorpay order creation failed: {e}")
+                return JsonResponse({
+                    'error': 'Payment gateway unavailable. Please try COD.'
+                }, status=500)
+
+        with transaction.atomic():
+            if payment_methode == 'online':
+                try:
+                    order = None
+
+                    if retry_payment == 'true' and retry_order_id:
+                        try:
+                            existing_order = Order.objects.get(order_id=retry_order_id, user=user)
+                            existing_order.razorpay_order_id = rzp_order['id']
+                            existing_order.save(update_fields=['razorpay_order_id'])
+                            if holds_reserved_stock(existing_order):
+                                # Fresh expiry, and the stock again if the reservation ran out
+                                reserve_order_stock(existing_order)
+                            order = existing_order
+                            print('-------------------------------------------')
+                            print(f"Updated existing order {existing_order.order_id} with new Razorpay order ID")
+                        except Order.DoesNotExist:
+                            logger.warning(f"Retry order ID {retry_order_id} not found for user {user.username}")
+                    else:
+                        order = self._create_order_and_deduct_stock(
+                            user, address, cart_list, variants,
+                            items_subtotal, total_payable, discount_amount,
+                            payment_methode, coupon, coupon_discount_amount, shipping,
+                            razorpay_order_id=rzp_order['id']
+                        )
+
+                    amount_in_paisa = int((total_payable * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+                    print(amount_in_paisa, '----', type(amount_in_paisa))
+
+                    return JsonResponse({
+                        'initilaize_razorpay': True,
+                        'razorpay_order_id': rzp_order['id'],
+                        'amount_paisa': amount_in_paisa,
+                        'amount_inr': float(total_payable),
+                        'currency': 'INR',
+                        'key_id': settings.RAZORPAY_KEY_ID,
+                        'internal_order_id': order.order_id,
+                        'message': 'procceding to secure payment gateway',
+                        "username": user.username,
+                        "email": user.email,
+                        "contact": '+91'+user.phone_number,
+                    })
+
+                except InsufficientStock as e:
+                    transaction.set_rollback(True)
+                    return self._insufficient_stock_response(cart_list, e)
+
+                except Exception as e:
+                    transaction.set_rollback(True)
+                    logger.exception(f"Online order creation failed: {e}")
+                    return JsonResponse({
+                        'error': 'Payment gateway unavailable. Please try COD.'
+                    }, status=500)
+
+            elif payment_methode == 'wallet':
+
+                wallet = user.wallet.first()
+                if not wallet or wallet.balance < total_payable:
+                    return JsonResponse({'error': 'Insufficient wallet balance'}, status=400)
+
+                wallet.balance -= total_payable
+                wallet.save(update_fields=['balance'])
                 order = None
 
                 if retry_payment == 'true' and retry_order_id:
                     try:
                         existing_order = Order.objects.get(order_id=retry_order_id, user=user)
-                        existing_order.razorpay_order_id = rzp_order['id']
-                        existing_order.save(update_fields=['razorpay_order_id'])
                         order = existing_order
+                        update_fields = []
+                        if order.payment_method == 'online':
+                            order.razorpay_order_id = None
+                            order.razorpay_payment_id = None
+                            order.razorpay_signature = None
+                            update_fields = ['razorpay_order_id', 'razorpay_payment_id', 'razorpay_signature']
+                            if holds_reserved_stock(order):
+                                # Paid now: the reserved stock is sold
+                                convert_reservations(order)
+                        order.payment_method = 'wallet'
+                        order.payment_status = 'paid'
+                        order.save(update_fields=['payment_method', 'payment_status'] + update_fields)
                         print('-------------------------------------------')
-                        print(f"Updated existing order {existing_order.order_id} with new Razorpay order ID")
+                        print(f"Retrying payment for existing order {existing_order.order_id} using wallet")
                     except Order.DoesNotExist:
                         logger.warning(f"Retry order ID {retry_order_id} not found for user {user.username}")
+                        return JsonResponse({'error': 'Previous order not found. Please try again.'}, status=400)
+                    except InsufficientStock as e:
+                        # The reservation ran out and the stock was sold meanwhile
+                        transaction.set_rollback(True)
+                        return self._insufficient_stock_response(cart_list, e)
                 else:
-                    order = self._create_order_and_deduct_stock(
-                        user, address, cart_list, locked_variants,
-                        items_subtotal, total_payable, discount_amount,
-                        payment_methode, coupon, coupon_discount_amount, shipping,
-                        razorpay_order_id=rzp_order['id']
-                    )
-
-                amount_in_paisa = int((total_payable * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
-                print(amount_in_paisa, '----', type(amount_in_paisa))
-
-                return JsonResponse({
-                    'initilaize_razorpay': True,
-                    'razorpay_order_id': rzp_order['id'],
-                    'amount_paisa': amount_in_paisa,
-                    'amount_inr': float(total_payable),
-                    'currency': 'INR',
-                    'key_id': settings.RAZORPAY_KEY_ID,
-                    'internal_order_id': order.order_id,
-                    'message': 'procceding to secure payment gateway',
-                    "username": user.username,
-                    "email": user.email,
-                    "contact": '+91'+user.phone_number,
-                })
-
-            except Exception as e:
-                transaction.set_rollback(True)
-                logger.exception(f"Razorpay order creation failed: {e}")
-                return JsonResponse({
-                    'error': 'Payment gateway unavailable. Please try COD.'
-                }, status=500)
-
-        elif payment_methode == 'wallet':
-
-            wallet = user.wallet.first()
-            if not wallet or wallet.balance < total_payable:
-                return JsonResponse({'error': 'Insufficient wallet balance'}, status=400)
-
-            wallet.balance -= total_payable
-            wallet.save(update_fields=['balance'])
-            order = None
-
-            if retry_payment == 'true' and retry_order_id:
-                try:
-                    existing_order = Order.objects.get(order_id=retry_order_id, user=user)
-                    order = existing_order
-                    update_fields = []
-                    if order.payment_method == 'online':
-                        order.razorpay_order_id = None
-                        order.razorpay_payment_id = None
-                        order.razorpay_signature = None
-                        update_fields = ['razorpay_order_id', 'razorpay_payment_id', 'razorpay_signature']
-                    order.payment_method = 'wallet'
-                    order.payment_status = 'paid'
-                    order.save(update_fields=['payment_method', 'payment_status'] + update_fields)
-                    print('-------------------------------------------')
-                    print(f"Retrying payment for existing order {existing_order.order_id} using wallet")
-                except Order.DoesNotExist:
-                    logger.warning(f"Retry order ID {retry_order_id} not found for user {user.username}")
-                    return JsonResponse({'error': 'Previous order not found. Please try again.'}, status=400)
-            else:
-
-                order = self._create_order_and_deduct_stock(
-                    user, address, cart_list, locked_variants,
-                    items_subtotal, total_payable, discount_amount,
-                    payment_methode, coupon, coupon_discount_amount, shipping
+                    try:
+                        order = self._create_order_and_deduct_stock(
+                            user, address, cart_list, variants,
+                            items_subtotal, total_payable, discount_amount,
+                            payment_methode, coupon, coupon_discount_amount, shipping
+                        )
+                    except InsufficientStock as e:
+                        transaction.set_rollback(True)
+                        return self._insufficient_stock_response(cart_list, e)
+                    except CouponLimitReached as e:
+                        transaction.set_rollback(True)
+                        return JsonResponse({'error': f"{e}. Please remove it and try again."}, status=400)
+
+                WalletTransaction.objects.create(
+                    wallet=wallet,
+                    order=order,
+                    amount=total_payable,
+                    transaction_type='debit',
+                    source_type='order_payment',
+                    description=f'Payment for Order {order.order_id}'
                 )
 
-            WalletTransaction.objects.create(
-                wallet=wallet,
-                order=order,
-                amount=total_payable,
-                transaction_type='debit',
-                source_type='order_payment',
-                description=f'Payment for Order {order.order_id}'
-            )
-
-        else:  # COD
+            else:  # COD
 
-            if retry_payment == 'true' and retry_order_id:
-                try:
-                    existing_order = Order.objects.get(order_id=retry_order_id, user=user)
-                    order = existing_order
-                    if order.payment_method == 'online':
-                        order.razorpay_order_id = None
-                        order.razorpay_payment_id = None
-                        order.razorpay_signature = None
-                    elif order.payment_method == 'wallet':
-                        wallet_txns = WalletTransaction.objects.filter(order=order, source_type='order_payment')
-                        for txn in wallet_txns:
-                            wallet = txn.wallet
-                            wallet.balance += txn.amount
-                            wallet.save(update_fields=['balance'])
-                            txn.delete()
-                    order.payment_method = 'cod'
-                    order.payment_status = 'pending'
-                    order.save(update_fields=['payment_method', 'payment_status'])
-                    print('-------------------------------------------')
-                    print(f"Retrying payment for existing order {existing_order.order_id} using COD")
-                except Order.DoesNotExist:
-                    logger.warning(f"Retry order ID {retry_order_id} not found for user {user.username}")
-                    return JsonResponse({'error': 'Previous order not found. Please try again.'}, status=400)
-            else:
-                order = self._create_order_and_deduct_stock(
-                    user, address, cart_list, locked_variants,
-                    items_subtotal, total_payable, discount_amount,
-                    payment_methode, coupon, coupon_discount_amount, shipping
-                )
+                if retry_payment == 'true' and retry_order_id:
+                    try:
+                        existing_order = Order.objects.get(order_id=retry_order_id, user=user)
+                        order = existing_order
+                        if order.payment_method == 'online':
+                            order.razorpay_order_id = None
+                            order.razorpay_payment_id = None
+                            order.razorpay_signature = None
+                            if holds_reserved_stock(order):
+                                # COD ships right away: the reserved stock is sold
+                                convert_reservations(order)
+                        elif order.payment_method == 'wallet':
+                            wallet_txns = WalletTransaction.objects.filter(order=order, source_type='order_payment')
+                            for txn in wallet_txns:
+                                wallet = txn.wallet
+                                wallet.balance += txn.amount
+                                wallet.save(update_fields=['balance'])
+                                txn.delete()
+                        order.payment_method = 'cod'
+                        order.payment_status = 'pending'
+                        order.save(update_fields=['payment_method', 'payment_status'])
+                        print('-------------------------------------------')
+                        print(f"Retrying payment for existing order {existing_order.order_id} using COD")
+                    except Order.DoesNotExist:
+                        logger.warning(f"Retry order ID {retry_order_id} not found for user {user.username}")
+                        return JsonResponse({'error': 'Previous order not found. Please try again.'}, status=400)
+                    except InsufficientStock as e:
+                        # The reservation ran out and the stock was sold meanwhile
+                        transaction.set_rollback(True)
+                        return self._insufficient_stock_response(cart_list, e)
+                else:
+                    try:
+                        order = self._create_order_and_deduct_stock(
+                            user, address, cart_list, variants,
+                            items_subtotal, total_payable, discount_amount,
+                            payment_methode, coupon, coupon_discount_amount, shipping
+                        )
+                    except InsufficientStock as e:
+                        transaction.set_rollback(True)
+                        return self._insufficient_stock_response(cart_list, e)
+                    except CouponLimitReached as e:
+                        transaction.set_rollback(True)
+                        return JsonResponse({'error': f"{e}. Please remove it and try again."}, status=400)
 
         request.session.pop('checkout_information', None)
         request.session.pop('checkout_step', None)
@@ -442,7 +527,15 @@ class PlaceOrder(LoginRequiredMixin, View):
             'redirect_url': f'/checkout/order-success/?order_id={order.order_id}'
         })
 
-    def _create_order_and_deduct_stock(self, user, address, cart_list, locked_variants,
+    def _insufficient_stock_response(self, cart_list, error):
+        item = next((item for item in cart_list if item['variant_id'] in error.variant_ids), None)
+        if item is None:
+            return JsonResponse({'error': 'Some items of this order are out of stock.'}, status=400)
+        return JsonResponse({
+            'error': f"Insufficient stock for {item['product_name']} ({item['size']}/{item['color']})"
+        }, status=400)
+
+    def _create_order_and_deduct_stock(self, user, address, cart_list, variants,
                                        sub_total, total_amount, discount, payment_method,
                                        coupon, coupon_discount_amount, shipping, razorpay_order_id=None):
 
@@ -461,21 +554,10 @@ class PlaceOrder(LoginRequiredMixin, View):
             razorpay_order_id=razorpay_order_id
         )
 
-        if coupon and payment_method != 'online':
-            CouponUsage.objects.create(
-                coupon=coupon,
-                user=user,
-                order=order,
-            )
-
         order_items = []
 
         for item in cart_list:
-            variant = locked_variants[item['variant_id']]
-
-            if payment_method != 'online':
-                variant.stock -= item['quantity']
-                variant.save(update_fields=['stock'])
+            variant = variants[item['variant_id']]
 
             order_items.append(
                 OrderItem(
@@ -494,14 +576,37 @@ class PlaceOrder(LoginRequiredMixin, View):
 
         OrderItem.objects.bulk_create(order_items)
 
-        if payment_method != 'online':
+        # Last write of the order, so the stock rows stay locked as briefly as possible.
+        # Raises InsufficientStock when another order took the stock meanwhile.
+        if payment_method == 'online':
+            # Held until the payment is verified or the reservation expires
+            reserve_order_stock(order)
+        else:
+            deduct_stock([(item['variant_id'], item['quantity']) for item in cart_list])
+            if coupon:
+                # Raises CouponLimitReached when concurrent orders used it up meanwhile
+                record_coupon_usage(coupon, user, order)
             Cart.objects.filter(user=user).delete()
+            refresh_cart_count(self.request)
 
         return order
 
 
 @method_decorator(never_cache, name='dispatch')
-class VerifyRazorpayPayment(LoginRequiredMixin, View):
+class VerifyRazorpayPayment(LoginRequiredMixin, IdempotentMixin, View):
+
+    idempotency_scope = 'verify_payment'
+
+    def get_idempotency_key(self, request):
+        # Without a client key, the Razorpay payment id: a payment is verified once
+        key = super().get_idempotency_key(request)
+        if key:
+            return key
+        try:
+            return json.loads(request.body).get('razorpay_payment_id')
+        except (ValueError, UnicodeDecodeError, AttributeError):
+            return None
+
     @transaction.atomic
     def post(self, request):
         try:
@@ -545,25 +650,21 @@ class VerifyRazorpayPayment(LoginRequiredMixin, View):
             order.status = 'failed'
             order.payment_status = 'failed'
             order.save(update_fields=['status', 'payment_status'])
+            # Back on sale, a payment retry reserves it again
+            release_reservations(order)
             return JsonResponse({'error': 'Payment verification failed'}, status=400)
 
-        # stock validation & deduction
+        # The stock was reserved with the order, only lines whose reservation expired are taken again
         try:
-            order_items = list(order.items.select_related('product_variant'))
-            variant_ids = [item.product_variant_id for item in order_items]
-            locked_variants = {
-                variant.id: variant
-                for variant in ProductVariant.objects.select_for_update().filter(id__in=variant_ids)
-            }
-
-            for item in order_items:
-                variant = locked_variants.get(item.product_variant_id)
-                if not variant:
-                    raise Exception(f"Product variant missing for {item.product_name}")
-                if variant.stock < item.quantity:
-                    raise Exception(f"Insufficient stock for {item.product_name}")
-                variant.stock -= item.quantity
-                variant.save(update_fields=['stock'])
+            order_items = list(order.items.all())
+            convert_reservations(order)
+        except InsufficientStock as e:
+            names = ', '.join(item.product_name for item in order_items if item.product_variant_id in e.variant_ids)
+            order.status = 'failed'
+            order.payment_status = 'failed'
+            order.save(update_fields=['status', 'payment_status'])
+            logger.error(f"Stock deduction failed: {e}")
+            return JsonResponse({'error': f"Insufficient stock for {names}"}, status=400)
         except Exception as e:
             order.status = 'failed'
             order.payment_status = 'failed'
@@ -581,16 +682,13 @@ class VerifyRazorpayPayment(LoginRequiredMixin, View):
             'razorpay_payment_id', 'razorpay_signature'
         ])
 
-        # Apply coupon usage successful payment
+        # Apply coupon usage successful payment, counted even past its limit: the discounted total is paid
         if order.coupon_id:
-            CouponUsage.objects.get_or_create(
-                coupon=order.coupon,
-                user=request.user,
-                order=order
-            )
+            record_coupon_usage(order.coupon, request.user, order, enforce_limits=False)
 
         # Cleanup
         Cart.objects.filter(user=request.user).delete()
+        refresh_cart_count(request)
         request.session.pop('checkout_information', None)
         request.session.pop('checkout_step', None)
         request.session.pop('applied_coupon', None)
@@ -654,10 +752,20 @@ def download_invoice(request, order_id):
     if order.status != 'delivered':
         raise Http404("Invoice not available yet")
 
-    invoice, pdf_file = generate_invoice_pdf(order)
-
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Invoice_{invoice.invoice_number}.pdf"'
+    invoice = Invoice.objects.filter(order=order).first()
+    try:
+        pdf = invoice.pdf.open('rb') if invoice and invoice.pdf else None
+    except FileNotFoundError:
+        pdf = None
+    if pdf is None:
+        # Not rendered by the pool yet (or the file is gone): rendered here once, stored for the next download
+        invoice = render_invoice(order)
+        pdf = invoice.pdf.open('rb')
+
+    response = FileResponse(
+        pdf, as_attachment=True, filename=f"Invoice_{invoice.invoice_number}.pdf", content_type='application/pdf'
+    )
+    response['ETag'] = f'"{invoice.content_hash}"'
     return response
 
 
@@ -0,0 +1,241 @@
+import hashlib
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from .models import Product, ProductVariant
+from .utils import get_catalog_version
+
+FACET_CACHE_TIMEOUT = 60 * 5
+
+# [low, high) on Product.effective_price, None = open ended
+PRICE_BUCKETS = [
+    (Decimal('0'), Decimal('500')),
+    (Decimal('500'), Decimal('1000')),
+    (Decimal('1000'), Decimal('2000')),
+    (Decimal('2000'), Decimal('5000')),
+    (Decimal('5000'), None),
+]
+PAISA = Decimal('0.01')
+SIZE_ORDER = ['Kids', 'XS', 'S', 'M', 'L', 'XL', 'XXL']
+
+
+def _to_price(value):
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+
+
+def parse_facet_selection(params):
+    """
+    Reads the facet filters of the product list from request.GET.
+    """
+    return {
+        'category': sorted(set(params.getlist('category'))),
+        'size': sorted(set(params.getlist('size'))),
+        'color': sorted(set(params.getlist('color'))),
+        'min': _to_price(params.get('min')),
+        'max': _to_price(params.get('max')),
+        'in_stock': params.get('in_stock') == '1',
+    }
+
+
+def apply_facet_filters(queryset, selection):
+    """
+    Applies the selected facets to a product queryset.
+    Size, color and availability must hold for the same variant
+    (size M in Red, in stock), not for three different variants.
+    """
+    if selection['category']:
+        queryset = queryset.filter(category__name__in=selection['category'])
+    if selection['min'] is not None:
+        queryset = queryset.filter(effective_price__gte=selection['min'])
+    if selection['max'] is not None:
+        queryset = queryset.filter(effective_price__lte=selection['max'])
+
+    variant_filters = {}
+    if selection['size']:
+        variant_filters['size__in'] = selection['size']
+    if selection['color']:
+        variant_filters['color__in'] = selection['color']
+    if selection['in_stock']:
+        variant_filters['stock__gt'] = 0
+    if variant_filters:
+        queryset = queryset.filter(
+            Exists(ProductVariant.objects.filter(product=OuterRef('pk'), **variant_filters))
+        )
+
+    return queryset
+
+
+def _price_bucket_sql():
+    whens = []
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        if high is None:
+            whens.append(f"WHEN p.effective_price >= {low} THEN {index}")
+        else:
+            whens.append(f"WHEN p.effective_price >= {low} AND p.effective_price < {high} THEN {index}")
+    return 'CASE ' + ' '.join(whens) + ' END'
+
+
+def _selection_sql(selection, category_ids):
+    """
+    SQL conditions (with params) for the selected facets.
+    Variant level: size, color, availability. Product level: category, price.
+    """
+    variant, product = {}, {}
+    if selection['size']:
+        variant['size'] = ('v.size = ANY(%s)', [selection['size']])
+    if selection['color']:
+        variant['color'] = ('v.color = ANY(%s)', [selection['color']])
+    if selection['in_stock']:
+        variant['availability'] = ('v.stock > 0', [])
+
+    if selection['category']:
+        product['category'] = ('category_id = ANY(%s)', [category_ids])
+    price_sql, price_params = [], []
+    if selection['min'] is not None:
+        price_sql.append('effective_price >= %s')
+        price_params.append(selection['min'])
+    if selection['max'] is not None:
+        price_sql.append('effective_price <= %s')
+        price_params.append(selection['max'])
+    if price_sql:
+        product['price'] = (' AND '.join(price_sql), price_params)
+
+    return variant, product
+
+
+def _all_but(conditions, facet, params):
+    where = []
+    for name, (sql, condition_params) in conditions.items():
+        if name != facet:
+            where.append(f'({sql})')
+            params.extend(condition_params)
+    return ' AND '.join(where) or 'TRUE'
+
+
+def _run_facet_query(base_queryset, selection, category_ids):
+    """
+    One statement, two steps:
+    1. product_rows: the variants of the base result set collapsed to one row per
+       product, with the sizes / colors / availability still reachable under the
+       other variant selections (size M in Red must be the same variant).
+    2. every facet is counted over product_rows with all selected facets applied
+       except its own (so selecting Red still shows how many products are Blue).
+    Counting products once per row keeps every aggregate a plain COUNT(*).
+    Returns {facet: {value: product_count}}.
+    """
+    base_sql, base_params = base_queryset.order_by().values('pk').query.sql_with_params()
+    variant, product = _selection_sql(selection, category_ids)
+
+    params = []
+    sizes_where = _all_but(variant, 'size', params)
+    colors_where = _all_but(variant, 'color', params)
+    available_where = _all_but(variant, 'availability', params)
+    matches_where = _all_but(variant, None, params)
+    params.extend(base_params)
+
+    branches = []
+    for facet, value_sql, from_sql in (
+        ('category', 'category_id::text', "product_rows WHERE matches"),
+        ('price', 'price_bucket::text', "product_rows WHERE matches AND price_bucket IS NOT NULL"),
+        ('size', 'size', "product_rows, unnest(sizes) AS size WHERE TRUE"),
+        ('color', 'color', "product_rows, unnest(colors) AS color WHERE TRUE"),
+        ('availability', "'true'", "product_rows WHERE available"),
+    ):
+        where_sql = _all_but(product, facet, params)
+        branches.append(
+            f"SELECT '{facet}', {value_sql}, COUNT(*) FROM {from_sql} AND {where_sql} GROUP BY 1, 2"
+        )
+
+    sql = f"""
+        WITH product_rows AS MATERIALIZED (
+            SELECT p.id, p.category_id, p.effective_price, {_price_bucket_sql()} AS price_bucket,
+                   array_agg(DISTINCT v.size) FILTER (WHERE {sizes_where}) AS sizes,
+                   array_agg(DISTINCT v.color) FILTER (WHERE {colors_where}) AS colors,
+                   COALESCE(bool_or(v.stock > 0) FILTER (WHERE {available_where}), FALSE) AS available,
+                   COALESCE(bool_or({matches_where}), FALSE) AS matches
+            FROM {Product._meta.db_table} p
+            JOIN {ProductVariant._meta.db_table} v ON v.product_id = p.id
+            WHERE p.id IN ({base_sql})
+            GROUP BY p.id
+        )
+        {' UNION ALL '.join(branches)}
+    """
+
+    counts = {'category': {}, 'price': {}, 'size': {}, 'color': {}, 'availability': {}}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for facet, value, count in cursor.fetchall():
+            counts[facet][value] = count
+    return counts
+
+
+def _cache_key(base_queryset, selection):
+    base_sql, base_params = base_queryset.order_by().values('pk').query.sql_with_params()
+    raw = repr((base_sql, base_params, sorted(selection.items())))
+    return f'facets:{get_catalog_version()}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def get_facets(base_queryset, selection, categories):
+    """
+    Facet counts for the product list sidebar.
+    base_queryset: products matching everything except the facets (active, search)
+    categories: the categories shown in the sidebar
+    Cached per catalog version and query for FACET_CACHE_TIMEOUT.
+    """
+    key = _cache_key(base_queryset, selection)
+    counts = cache.get(key)
+    if counts is None:
+        category_ids = [category.id for category in categories if category.name in selection['category']]
+        counts = _run_facet_query(base_queryset, selection, category_ids)
+        cache.set(key, counts, FACET_CACHE_TIMEOUT)
+
+    facets = {
+        'category': [
+            {
+                'value': category.name,
+                'label': category.name,
+                'count': counts['category'].get(str(category.id), 0),
+                'selected': category.name in selection['category'],
+            }
+            for category in categories
+        ],
+        'size': _value_facet(counts['size'], selection['size'], sort_key=_size_sort_key),
+        'color': _value_facet(counts['color'], selection['color']),
+        'price': [],
+        'in_stock': {
+            'count': counts['availability'].get('true', 0),
+            'selected': selection['in_stock'],
+        },
+    }
+
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        count = counts['price'].get(str(index), 0)
+        max_price = high - PAISA if high is not None else None
+        facets['price'].append({
+            'min': low,
+            'max': max_price,
+            'label': f'₹{low:,.0f} – ₹{high:,.0f}' if high is not None else f'₹{low:,.0f}+',
+            'count': count,
+            'selected': selection['min'] == low and selection['max'] == max_price,
+        })
+
+    return facets
+
+
+def _size_sort_key(size):
+    return (SIZE_ORDER.index(size) if size in SIZE_ORDER else len(SIZE_ORDER), size)
+
+
+def _value_facet(counts, selected, sort_key=None):
+    # Selected values stay listed with 0 so they can still be unchecked
+    values = set(counts) | set(selected)
+    return [
+        {'value': value, 'label': value, 'count': counts.get(value, 0), 'selected': value in selected}
+        for value in sorted(values, key=sort_key)
+    ]
@@ -0,0 +1,124 @@
+"""
+Set-based stock writes.
+
+All the stock deltas of an order go to the database in one UPDATE joined to a
+VALUES list, instead of one locked SELECT + save() per line. Deductions are
+conditional (stock >= quantity), so concurrent orders can never take the same
+unit twice, and the row locks are only held from that UPDATE to commit.
+
+The UPDATE bypasses model signals, so the materialized prices and the cache
+versions they would have refreshed are refreshed here, once committed.
+"""
+from collections import Counter
+from django.db import connection, transaction
+from .models import ProductVariant
+from .utils import bump_catalog_version, bump_product_versions, refresh_product_prices
+
+
+class InsufficientStock(Exception):
+    """
+    Raised by deduct_stock when some lines cannot be served, nothing is deducted.
+    variant_ids: the variants without enough stock (missing variants included)
+    """
+
+    def __init__(self, variant_ids):
+        self.variant_ids = sorted(variant_ids)
+        super().__init__(f"Insufficient stock for variants {self.variant_ids}")
+
+
+def _quantities(lines):
+    # [(variant_id, quantity)] or {variant_id: quantity} -> {variant_id: total quantity}
+    totals = Counter()
+    for variant_id, quantity in (lines.items() if isinstance(lines, dict) else lines):
+        totals[variant_id] += quantity
+    return {variant_id: quantity for variant_id, quantity in totals.items() if quantity}
+
+
+def _apply(quantities, sign, conditional):
+    """
+    UPDATE ... SET stock = stock + sign * qty FROM (VALUES ...) [WHERE stock >= qty]
+    Returns {variant_id: (product_id, new_stock)} for the updated rows.
+    """
+    table = ProductVariant._meta.db_table
+    values = ', '.join(['(%s::bigint, %s::integer)'] * len(quantities))
+    # Rows in id order, concurrent multi-row updates then tend to lock in the same order
+    params = [param for line in sorted(quantities.items()) for param in line]
+    condition = 'AND v.stock >= d.quantity' if conditional else ''
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} AS v
+            SET stock = v.stock {'-' if sign < 0 else '+'} d.quantity, updated_at = NOW()
+            FROM (VALUES {values}) AS d(id, quantity)
+            WHERE v.id = d.id {condition}
+            RETURNING v.id, v.product_id, v.stock
+            """,
+            params,
+        )
+        return {variant_id: (product_id, stock) for variant_id, product_id, stock in cursor.fetchall()}
+
+
+def _stock_changed(updated, quantities, sign):
+    """
+    What the ProductVariant post_save signals do for a stock write, run after
+    commit: it stays out of the locked section and caches never pick up
+    uncommitted stock.
+
+    Every write bumps the versions of its products (PDP matrix, cart quotes
+    holding them). Only a variant going in or out of stock changes what the
+    catalog shows (in_stock, materialized prices, availability facets), so only
+    then are the prices refreshed and the catalog version bumped: an ordinary
+    sale leaves the homepage, the facets and other carts cached.
+    """
+    product_ids = {product_id for product_id, _ in updated.values()}
+    if not product_ids:
+        return
+    availability_changed = {
+        product_id for variant_id, (product_id, stock) in updated.items()
+        if (stock > 0) != (stock - sign * quantities[variant_id] > 0)
+    }
+
+    def refresh():
+        bump_product_versions(product_ids=product_ids)
+        if availability_changed:
+            refresh_product_prices(availability_changed)
+            bump_catalog_version()
+
+    transaction.on_commit(refresh)
+
+
+def deduct_stock(lines):
+    """
+    Takes the quantities of all lines ([(variant_id, quantity)] or {variant_id: quantity})
+    in a single conditional UPDATE, all or nothing.
+    Returns {variant_id: stock left}. Raises InsufficientStock listing the failed
+    variants when any line is short, with every line left untouched.
+    """
+    quantities = _quantities(lines)
+    if not quantities:
+        return {}
+
+    with transaction.atomic():
+        updated = _apply(quantities, -1, conditional=True)
+        failed = set(quantities) - set(updated)
+        if failed:
+            # Leaves the savepoint, undoing the lines that did fit
+            raise InsufficientStock(failed)
+        _stock_changed(updated, quantities, -1)
+
+    return {variant_id: stock for variant_id, (_, stock) in updated.items()}
+
+
+def restock(lines):
+    """
+    Puts quantities back (cancellations, returns) in one UPDATE.
+    Returns {variant_id: new stock}, variants that no longer exist are skipped.
+    """
+    quantities = _quantities(lines)
+    if not quantities:
+        return {}
+
+    updated = _apply(quantities, 1, conditional=False)
+    _stock_changed(updated, quantities, 1)
+    return {variant_id: stock for variant_id, (_, stock) in updated.items()}
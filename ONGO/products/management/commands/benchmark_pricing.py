@@ -0,0 +1,122 @@
+import gc
+import random
+import statistics
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand
+from products.pricing import price_items
+
+PAISA = Decimal('0.01')
+
+
+def _legacy_discount(price, offer):
+    # Per item Decimal pricing as it was done before products.pricing
+    if offer.discount_type == 'percent':
+        discount = price * (offer.value / Decimal('100'))
+        if offer.max_discount_amount:
+            discount = min(discount, offer.max_discount_amount)
+        return price - discount
+    return max(price - offer.value, Decimal('0'))
+
+
+def _legacy_price(price, product_offer, category_offer):
+    offer_price = price
+    if product_offer:
+        offer_price = max(Decimal('0'), _legacy_discount(price, product_offer))
+    if category_offer:
+        offer_price = min(offer_price, max(Decimal('0'), _legacy_discount(price, category_offer)))
+    return offer_price.quantize(PAISA, rounding=ROUND_HALF_UP)
+
+
+def _reference_price(price, product_offer, category_offer):
+    # Exact spec: discount rounded half up to the paisa, capped, floored at zero
+    def apply(offer):
+        if offer.discount_type == 'percent':
+            discount = (price * offer.value / Decimal('100')).quantize(PAISA, rounding=ROUND_HALF_UP)
+            if offer.max_discount_amount:
+                discount = min(discount, offer.max_discount_amount)
+        else:
+            discount = offer.value
+        return max(price - discount, Decimal('0'))
+
+    best = price
+    if product_offer:
+        best = apply(product_offer)
+    if category_offer:
+        best = min(best, apply(category_offer))
+    return best
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark offer pricing: per item Decimal math vs products.pricing bulk (integer paise) '
+        'on synthetic prices and offers. No database access.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=200000, help='Variants to price per run (default: 200000)')
+        parser.add_argument('--offers', type=int, default=500, help='Distinct offers (default: 500)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path (default: 3)')
+
+    def handle(self, *args, **options):
+        total = options['items']
+        rng = random.Random(42)
+
+        offers = []
+        for pk in range(options['offers']):
+            percent = rng.random() < 0.8
+            offers.append(SimpleNamespace(
+                pk=pk,
+                discount_type='percent' if percent else 'fixed',
+                value=Decimal(rng.randint(100, 7500)) / 100 if percent else Decimal(rng.randint(50, 800)),
+                max_discount_amount=Decimal(rng.randint(100, 1500)) if percent and rng.random() < 0.3 else None,
+            ))
+
+        items = [
+            (
+                Decimal(rng.randint(19900, 999900)) / 100,
+                rng.choice(offers) if rng.random() < 0.4 else None,
+                rng.choice(offers) if rng.random() < 0.5 else None,
+            )
+            for _ in range(total)
+        ]
+
+        paths = {
+            'decimal per item': lambda: [_legacy_price(*item) for item in items],
+            'bulk integer paise': lambda: [price for price, _, _ in price_items(items)],
+        }
+
+        self.stdout.write(f"{'path':<22}{'median ms':>12}{'ns / item':>12}")
+        results = {}
+        for label, run in paths.items():
+            timings = []
+            for _ in range(options['repeat']):
+                # Like timeit: a collection mid run would be charged to whichever path triggered it
+                gc.collect()
+                gc.disable()
+                try:
+                    begin = time.perf_counter()
+                    results[label] = run()
+                    timings.append(time.perf_counter() - begin)
+                finally:
+                    gc.enable()
+            median = statistics.median(timings)
+            self.stdout.write(f"{label:<22}{median * 1000:>12.1f}{median / total * 1e9:>12.0f}")
+
+        mismatches = sum(
+            1 for item, price in zip(items, results['bulk integer paise'])
+            if price != _reference_price(*item)
+        )
+        differs_from_legacy = sum(
+            1 for old, new in zip(results['decimal per item'], results['bulk integer paise']) if old != new
+        )
+        self.stdout.write(
+            f"Exactness: {mismatches} mismatches against the paisa-rounded reference, "
+            f"{differs_from_legacy} items differ from the legacy rounding (half-paisa ties)"
+        )
+
+        if mismatches:
+            self.stdout.write(self.style.ERROR("Bulk pricing does not match the reference."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Benchmark finished."))
@@ -0,0 +1,92 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from products.models import Category, Product, ProductVariant
+from products.utils import refresh_search_vectors, search_products
+
+WORDS = [
+    'cotton', 'linen', 'denim', 'silk', 'wool', 'slim', 'regular', 'oversized', 'casual', 'formal',
+    'shirt', 'tshirt', 'kurta', 'jeans', 'trousers', 'shorts', 'jacket', 'hoodie', 'dress', 'skirt',
+    'printed', 'striped', 'solid', 'checked', 'floral', 'classic', 'premium', 'summer', 'winter', 'festive',
+]
+COLORS = ['Black', 'White', 'Navy', 'Olive', 'Maroon', 'Beige', 'Grey', 'Mustard', 'Teal', 'Peach']
+QUERIES = ['denim jacket', 'floral dress', 'olive', 'premium linen shirt', 'hodie', 'kurtaa']
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark catalog search (name__icontains vs full-text + trigram) on a synthetic catalog. '
+        'Everything is created inside a transaction that is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500000, help='Synthetic products to create (default: 500000)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query and path (default: 5)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='bulk_create batch size (default: 5000)')
+
+    def handle(self, *args, **options):
+        total = options['products']
+        repeat = options['repeat']
+        batch_size = options['batch_size']
+        rng = random.Random(42)
+
+        with transaction.atomic():
+            self.stdout.write(f"Creating {total} synthetic products...")
+            started = time.perf_counter()
+            categories = [
+                Category.objects.create(name=f'bench-{name}-{rng.getrandbits(32):08x}')
+                for name in ('men', 'women', 'kids', 'ethnic')
+            ]
+
+            for start in range(0, total, batch_size):
+                size = min(batch_size, total - start)
+                products = Product.objects.bulk_create([
+                    Product(
+                        category=rng.choice(categories),
+                        name=' '.join(rng.sample(WORDS, 4)),
+                        description=' '.join(rng.choices(WORDS, k=20)),
+                    )
+                    for _ in range(size)
+                ])
+                ProductVariant.objects.bulk_create([
+                    ProductVariant(
+                        product=product,
+                        size='M',
+                        color=rng.choice(COLORS),
+                        price=rng.randint(300, 5000),
+                        stock=rng.randint(0, 20),
+                        sku=f'bench-{product.pk}',
+                    )
+                    for product in products
+                ])
+
+            bench_products = Product.objects.filter(category__in=categories)
+            refresh_search_vectors(bench_products.values_list('pk', flat=True))
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Product._meta.db_table}')
+            self.stdout.write(f"Catalog ready in {time.perf_counter() - started:.1f}s\n")
+
+            base_qs = Product.objects.filter(is_active=True)
+            paths = {
+                'icontains': lambda q: base_qs.filter(name__icontains=q).order_by('-created_at'),
+                'fulltext+trigram': lambda q: search_products(base_qs, q).order_by('-search_rank', '-created_at'),
+            }
+
+            self.stdout.write(f"{'query':<22}{'path':<20}{'matches':>10}{'median ms':>12}")
+            for q in QUERIES:
+                for label, build in paths.items():
+                    timings = []
+                    matches = 0
+                    for _ in range(repeat):
+                        begin = time.perf_counter()
+                        # Same work as one list page: the COUNT plus the first page of 8
+                        matches = build(q).count()
+                        list(build(q)[:8])
+                        timings.append((time.perf_counter() - begin) * 1000)
+                    self.stdout.write(f"{q:<22}{label:<20}{matches:>10}{statistics.median(timings):>12.1f}")
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished, synthetic catalog rolled back."))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from order.models import ProductReview
+from products.models import Product
+from products.utils import REVIEW_STAR_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized rating summary (count, star total, per-star histogram) of every product'
+
+    def handle(self, *args, **options):
+        fields = ['review_count', 'review_star_total'] + list(REVIEW_STAR_FIELDS.values())
+
+        with transaction.atomic():
+            # Lock products first so review writes landing meanwhile apply their delta after the rebuild
+            products = list(Product.objects.select_for_update().only('pk', *fields))
+
+            summaries = {}
+            rows = (
+                ProductReview.objects
+                .order_by()
+                .values('product_id', 'star')
+                .annotate(total=Count('id'))
+            )
+            for row in rows:
+                summary = summaries.setdefault(row['product_id'], {})
+                summary[row['star']] = row['total']
+
+            for product in products:
+                histogram = summaries.get(product.pk, {})
+                product.review_count = sum(histogram.values())
+                product.review_star_total = sum(star * count for star, count in histogram.items())
+                for star, field in REVIEW_STAR_FIELDS.items():
+                    setattr(product, field, histogram.get(star, 0))
+
+            Product.objects.bulk_update(products, fields, batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rating summary for {len(products)} products "
+            f"({sum(sum(h.values()) for h in summaries.values())} reviews)."
+        ))
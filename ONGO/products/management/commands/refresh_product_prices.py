@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from products.models import Product
+from products.utils import refresh_product_prices
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute materialized product prices (base, offer price, in-stock flag). '
+        'Schedule it (e.g. every few minutes via cron) so timed offers flip on time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of products refreshed per batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+
+        for start in range(0, len(product_ids), batch_size):
+            refresh_product_prices(product_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed prices for {len(product_ids)} products."))
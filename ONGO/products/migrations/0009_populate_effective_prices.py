@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:52
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations
+from django.db.models import Q
+from django.utils import timezone
+
+
+def _offer_price(price, offer):
+    if offer is None:
+        return price
+    if offer.discount_type == 'percent':
+        discount = price * (offer.value / Decimal('100'))
+        if offer.max_discount_amount:
+            discount = min(discount, offer.max_discount_amount)
+        return max(price - discount, Decimal('0'))
+    return max(price - offer.value, Decimal('0'))
+
+
+def populate_effective_prices(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+    ProductOffer = apps.get_model('offers', 'ProductOffer')
+    CategoryOffer = apps.get_model('offers', 'CategoryOffer')
+
+    now = timezone.now()
+    running = Q(active=True, start_date__lte=now) & (Q(end_date__isnull=True) | Q(end_date__gte=now))
+
+    product_offers = {}
+    for offer in ProductOffer.objects.filter(running).order_by('-priority', '-start_date'):
+        product_offers.setdefault(offer.product_id, offer)
+    category_offers = {}
+    for offer in CategoryOffer.objects.filter(running).order_by('-priority', '-start_date'):
+        category_offers.setdefault(offer.category_id, offer)
+
+    for product in Product.objects.prefetch_related('variants').iterator(chunk_size=500):
+        base_price = None
+        effective_price = None
+        variants = list(product.variants.all())
+
+        for variant in variants:
+            final_price = variant.sale_price if variant.sale_price else variant.price
+            offer_price = _offer_price(final_price, product_offers.get(product.id))
+            category_price = _offer_price(final_price, category_offers.get(product.category_id))
+            offer_price = min(offer_price, category_price).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            variant.effective_price = offer_price
+
+            if variant.stock > 0:
+                base_price = final_price if base_price is None else min(base_price, final_price)
+                effective_price = offer_price if effective_price is None else min(effective_price, offer_price)
+
+        ProductVariant.objects.bulk_update(variants, ['effective_price'])
+        product.base_price = base_price
+        product.effective_price = effective_price
+        product.in_stock = base_price is not None
+        product.save(update_fields=['base_price', 'effective_price', 'in_stock'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_effective_price'),
+        ('offers', '0006_remove_categoryoffer_min_items_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_effective_prices, migrations.RunPython.noop)
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:10
+
+from django.db import migrations
+from django.db.models import Count
+
+STAR_FIELDS = {
+    5: 'review_five_star',
+    4: 'review_four_star',
+    3: 'review_three_star',
+    2: 'review_two_star',
+    1: 'review_one_star',
+}
+
+
+def populate_review_summary(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('order', 'ProductReview')
+
+    summaries = {}
+    for row in ProductReview.objects.order_by().values('product_id', 'star').annotate(total=Count('id')):
+        summaries.setdefault(row['product_id'], {})[row['star']] = row['total']
+
+    products = list(Product.objects.filter(pk__in=summaries.keys()))
+    for product in products:
+        histogram = summaries[product.pk]
+        product.review_count = sum(histogram.values())
+        product.review_star_total = sum(star * count for star, count in histogram.items())
+        for star, field in STAR_FIELDS.items():
+            setattr(product, field, histogram.get(star, 0))
+
+    Product.objects.bulk_update(
+        products,
+        ['review_count', 'review_star_total'] + list(STAR_FIELDS.values()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_review_summary'),
+        ('order', '0004_remove_invoice_pdf_file'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_review_summary, migrations.RunPython.noop)
+    ]
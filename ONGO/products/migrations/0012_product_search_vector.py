@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:53
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def populate_search_vectors(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Category = apps.get_model('products', 'Category')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    colors = Subquery(
+        ProductVariant.objects
+        .filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(colors=StringAgg('color', ' ', distinct=True))
+        .values('colors')
+    )
+    Product.objects.update(
+        search_vector=(
+            SearchVector('name', weight='A', config='english')
+            + SearchVector(category_name, weight='B', config='english')
+            + SearchVector(colors, weight='C', config='english')
+            + SearchVector('description', weight='D', config='english')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_populate_review_summary'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='products_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='products_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:01
+
+from django.db import migrations
+
+
+def populate_product_card_fields(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductImage = apps.get_model('products', 'ProductImage')
+
+    best_images = (
+        ProductImage.objects
+        .order_by('product_variant__product_id', '-is_primary', '-created_at')
+        .distinct('product_variant__product_id')
+        .values_list('product_variant__product_id', 'product_variant_id', 'image_url')
+    )
+
+    products = []
+    for product_id, variant_id, image_url in best_images.iterator(chunk_size=2000):
+        products.append(Product(pk=product_id, representative_variant_id=variant_id, thumbnail_url=image_url))
+
+    Product.objects.bulk_update(products, ['representative_variant', 'thumbnail_url'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_card_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_product_card_fields, migrations.RunPython.noop)
+    ]
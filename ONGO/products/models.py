@@ -1,4 +1,6 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 import uuid
 
 # Create your models here.
@@ -34,66 +36,84 @@ class Product(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+
+    # Materialized from variants and offers by products.utils.refresh_product_prices
+    base_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    in_stock = models.BooleanField(default=False, editable=False)
+
+    # Product card data, maintained by products.utils.refresh_product_thumbnails
+    representative_variant = models.ForeignKey(
+        'ProductVariant',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+'
+    )
+    thumbnail_url = models.URLField(blank=True, editable=False)
+
+    # Rating summary, maintained by products.utils.update_review_summary
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    review_star_total = models.PositiveIntegerField(default=0, editable=False)
+    review_five_star = models.PositiveIntegerField(default=0, editable=False)
+    review_four_star = models.PositiveIntegerField(default=0, editable=False)
+    review_three_star = models.PositiveIntegerField(default=0, editable=False)
+    review_two_star = models.PositiveIntegerField(default=0, editable=False)
+    review_one_star = models.PositiveIntegerField(default=0, editable=False)
+
+    # Weighted full-text document (name, category, colors, description),
+    # maintained by products.utils.refresh_search_vectors
+    search_vector = SearchVectorField(null=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'products'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'effective_price'], name='products_active_price_idx'),
+            models.Index(fields=['is_active', 'created_at', 'id'], name='products_active_created_idx'),
+            GinIndex(fields=['search_vector'], name='products_search_vector_idx'),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='products_name_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return 0.0
+        return self.review_star_total / self.review_count
+
+    @property
+    def rating_distribution(self):
+        return {
+            'five_star': self.review_five_star,
+            'four_star': self.review_four_star,
+            'three_star': self.review_three_star,
+            'two_star': self.review_two_star,
+            'one_star': self.review_one_star,
+        }
+
     def get_thumbnail_url(self):
         """
         Returns primary image of the product (variant → image)
         """
-
-        image = (
-            ProductImage.objects
-            .filter(
-                product_variant__product=self,
-                is_primary=True
-            )
-            .select_related('product_variant')
-            .first()
-        )
-
-        if not image:
-            image = (
-                ProductImage.objects
-                .filter(product_variant__product=self)
-                .select_related('product_variant')
-                .first()
-            )
-
-        if image:
-            return image.image_url
+        if self.thumbnail_url:
+            return self.thumbnail_url
 
         # fallback image
         return "https://placehold.co/600x400?text=No+Image"
 
     def get_display_price(self):
-        variant = (
-            self.variants.filter(stock__gt=0)
-            .order_by("sale_price", "price")
-            .first()
-        )
-
-        if variant:
-            return variant.final_price
-
-        return None
+        # Final price of the cheapest in-stock variant
+        return self.base_price
 
     def get_representative_variant(self):
-        image = (
-            ProductImage.objects
-            .filter(product_variant__product=self)
-            .select_related('product_variant')
-            .order_by('-is_primary', '-created_at')
-            .first()
-        )
-        return image.product_variant if image else None
+        return self.representative_variant
 
 
 class ProductVariant(models.Model):
@@ -113,6 +133,8 @@ class ProductVariant(models.Model):
     )
     stock = models.PositiveIntegerField()
     sku = models.CharField(max_length=100, unique=True)
+    # Best offer price, materialized by products.utils.refresh_product_prices
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -0,0 +1,103 @@
+"""
+Bulk offer pricing.
+
+Every price is handled as an integer number of paise and every offer as integer
+terms, so a whole page / cart / catalog batch is priced with plain int arithmetic
+in one pass: exact, and cheaper per item than Decimal. Rounding happens once, on
+the discount, half up to the paisa.
+
+Offer resolution (same everywhere: list, homepage, PDP, cart, materialized prices):
+the product offer always applies, the category offer wins only when it is cheaper,
+prices never go below zero.
+"""
+from decimal import Decimal
+
+PERCENT = 0
+FIXED = 1
+
+
+def to_paise(amount):
+    """
+    Decimal / int / str rupees -> int paise, half up beyond the second decimal.
+    """
+    if amount is None:
+        return 0
+    if not isinstance(amount, Decimal):
+        amount = Decimal(amount)
+    numerator, denominator = amount.as_integer_ratio()
+    paise, remainder = divmod(numerator * 100, denominator)
+    if remainder * 2 >= denominator:
+        paise += 1
+    return paise
+
+
+def from_paise(paise):
+    return Decimal(paise).scaleb(-2)
+
+
+def offer_terms(offer):
+    """
+    (kind, amount, cap) in integers, or None for no offer:
+    percent -> amount in basis points (12.5% = 1250), cap in paise or None
+    fixed   -> amount in paise
+    """
+    if offer is None:
+        return None
+    if offer.discount_type == 'percent':
+        cap = getattr(offer, 'max_discount_amount', None)
+        return (PERCENT, to_paise(offer.value), to_paise(cap) if cap else None)
+    return (FIXED, to_paise(offer.value), None)
+
+
+def _discounted(price, terms):
+    kind, amount, cap = terms
+    if kind == PERCENT:
+        discount, remainder = divmod(price * amount, 10000)
+        if remainder * 2 >= 10000:
+            discount += 1
+        if cap is not None and discount > cap:
+            discount = cap
+    else:
+        discount = amount
+    return price - discount if discount < price else 0
+
+
+def price_items(items):
+    """
+    Prices many (price, product_offer, category_offer) items in one call.
+    price is a Decimal already rounded to the paisa (DecimalField values),
+    offers are model instances or None.
+    Returns [(offer_price, offer, scope)] with offer_price a Decimal rounded to the paisa,
+    scope 'product', 'category' or None (the price is returned as is).
+    Offer terms are converted once per distinct offer.
+    """
+    terms_of = {}
+    results = []
+    append = results.append
+
+    for price, product_offer, category_offer in items:
+        if product_offer is None and category_offer is None:
+            append((price, None, None))
+            continue
+
+        paise = int(price * 100)
+        best = paise
+        offer = scope = None
+        if product_offer is not None:
+            terms = terms_of.get(id(product_offer))
+            if terms is None:
+                terms = terms_of[id(product_offer)] = offer_terms(product_offer)
+            best = _discounted(paise, terms)
+            offer, scope = product_offer, 'product'
+        if category_offer is not None:
+            terms = terms_of.get(id(category_offer))
+            if terms is None:
+                terms = terms_of[id(category_offer)] = offer_terms(category_offer)
+            category_price = _discounted(paise, terms)
+            if category_price < best:
+                best = category_price
+                offer, scope = category_offer, 'category'
+
+        append((from_paise(best), offer, scope) if offer is not None else (price, None, None))
+
+    return results
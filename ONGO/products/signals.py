@@ -0,0 +1,69 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from adminpanel.models import Banner
+from offers.models import ProductOffer, CategoryOffer
+from order.models import ProductReview
+from .models import Category, Product, ProductVariant, ProductImage
+from .utils import bump_catalog_version, bump_product_versions, refresh_product_prices, refresh_product_thumbnails, refresh_search_vectors
+
+
+@receiver(post_save, sender=Product)
+def product_price_refresh_signal(sender, instance, **kwargs):
+    """
+    Category change can change which category offer applies.
+    A full save() also writes back the card fields it loaded, so they are recomputed too.
+    """
+    refresh_product_prices([instance.pk])
+    refresh_search_vectors([instance.pk])
+    refresh_product_thumbnails([instance.pk])
+    bump_product_versions(product_ids=[instance.pk])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def variant_price_refresh_signal(sender, instance, **kwargs):
+    """
+    Keeps the materialized product price in sync with price and stock writes,
+    and the search document in sync with variant colors.
+    """
+    refresh_product_prices([instance.product_id])
+    refresh_search_vectors([instance.product_id])
+    bump_product_versions(product_ids=[instance.product_id])
+
+
+@receiver(post_delete, sender=ProductVariant)
+def variant_thumbnail_refresh_signal(sender, instance, **kwargs):
+    refresh_product_thumbnails([instance.product_id])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def image_thumbnail_refresh_signal(sender, instance, **kwargs):
+    # Looked up by id, the variant may already be gone when its images cascade
+    product_ids = list(ProductVariant.objects.filter(pk=instance.product_variant_id).values_list('product_id', flat=True))
+    refresh_product_thumbnails(product_ids)
+    bump_product_versions(product_ids=product_ids)
+
+
+@receiver(post_save, sender=Category)
+def category_search_refresh_signal(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_vectors(instance.products.values_list('pk', flat=True))
+
+
+CATALOG_MODELS = (
+    Category, Product, ProductVariant, ProductImage,
+    ProductOffer, CategoryOffer, Banner, ProductReview,
+)
+
+
+def catalog_change_signal(sender, instance, **kwargs):
+    """
+    Invalidates cached catalog payloads (homepage, ...) on any catalog write.
+    """
+    bump_catalog_version()
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_change_signal, sender=model, dispatch_uid=f'catalog_change_save_{model.__name__}')
+    post_delete.connect(catalog_change_signal, sender=model, dispatch_uid=f'catalog_change_delete_{model.__name__}')
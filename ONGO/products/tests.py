@@ -1,3 +1,124 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase
+from .inventory import InsufficientStock, deduct_stock, restock
+from .models import Category, Product, ProductVariant
+from .utils import PRODUCT_VERSION_KEY, get_cache_version, get_catalog_version
 
-# Create your tests here.
+
+def make_variant(sku, stock, product=None):
+    if product is None:
+        category, _ = Category.objects.get_or_create(name='Inventory')
+        product = Product.objects.create(category=category, name=f'Product {sku}', description='-')
+    return ProductVariant.objects.create(
+        product=product, size='M', color=sku, price=Decimal('500'), stock=stock, sku=sku,
+    )
+
+
+class DeductStockTests(TestCase):
+
+    def test_deducts_every_line_in_one_update(self):
+        shirt = make_variant('shirt', 5)
+        jeans = make_variant('jeans', 3)
+
+        with self.assertNumQueries(3):  # savepoint, UPDATE, release
+            left = deduct_stock([(shirt.id, 2), (jeans.id, 3), (shirt.id, 1)])
+
+        self.assertEqual(left, {shirt.id: 2, jeans.id: 0})
+        shirt.refresh_from_db()
+        jeans.refresh_from_db()
+        self.assertEqual((shirt.stock, jeans.stock), (2, 0))
+
+    def test_short_line_fails_the_whole_order(self):
+        shirt = make_variant('shirt', 5)
+        jeans = make_variant('jeans', 1)
+
+        with self.assertRaises(InsufficientStock) as raised:
+            deduct_stock({shirt.id: 2, jeans.id: 2, 999999: 1})
+
+        self.assertEqual(raised.exception.variant_ids, [jeans.id, 999999])
+        shirt.refresh_from_db()
+        jeans.refresh_from_db()
+        self.assertEqual((shirt.stock, jeans.stock), (5, 1))
+
+    def test_restock(self):
+        shirt = make_variant('shirt', 0)
+
+        self.assertEqual(restock([(shirt.id, 2), (shirt.id, 1)]), {shirt.id: 3})
+        shirt.refresh_from_db()
+        self.assertEqual(shirt.stock, 3)
+
+
+class DeductStockConcurrencyTests(TransactionTestCase):
+    """
+    Parallel orders on the same SKU, each in its own connection and transaction,
+    must never sell more than the stock.
+    """
+    orders = 12
+
+    def place_orders_in_parallel(self, lines):
+        barrier = threading.Barrier(self.orders)
+        outcomes = []
+
+        def place_order():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    deduct_stock(lines)
+                outcomes.append(True)
+            except InsufficientStock:
+                outcomes.append(False)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=place_order) for _ in range(self.orders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_no_oversell_on_one_sku(self):
+        last_units = make_variant('last-units', 5)
+
+        outcomes = self.place_orders_in_parallel([(last_units.id, 1)])
+
+        last_units.refresh_from_db()
+        self.assertEqual(outcomes.count(True), 5)
+        self.assertEqual(outcomes.count(False), self.orders - 5)
+        self.assertEqual(last_units.stock, 0)
+
+    def test_no_partial_orders_under_contention(self):
+        hot = make_variant('hot', 4)
+        plenty = make_variant('plenty', 100)
+
+        outcomes = self.place_orders_in_parallel([(plenty.id, 1), (hot.id, 2)])
+
+        hot.refresh_from_db()
+        plenty.refresh_from_db()
+        self.assertEqual(outcomes.count(True), 2)
+        self.assertEqual(hot.stock, 0)
+        # Failed orders did not keep the line that fitted
+        self.assertEqual(plenty.stock, 100 - 2)
+
+
+class StockVersionTests(TestCase):
+
+    def test_only_availability_changes_bump_the_catalog(self):
+        shirt = make_variant('shirt', 3)
+        catalog_version = get_catalog_version()
+        product_version = get_cache_version(PRODUCT_VERSION_KEY.format(shirt.product_id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deduct_stock([(shirt.id, 1)])
+
+        self.assertEqual(get_catalog_version(), catalog_version)
+        self.assertNotEqual(get_cache_version(PRODUCT_VERSION_KEY.format(shirt.product_id)), product_version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deduct_stock([(shirt.id, 2)])
+
+        self.assertNotEqual(get_catalog_version(), catalog_version)
+        shirt.product.refresh_from_db()
+        self.assertFalse(shirt.product.in_stock)
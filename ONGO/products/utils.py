@@ -1,11 +1,384 @@
-from decimal import Decimal
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, FloatField, Min, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Cast
+from django.utils import timezone
+from adminpanel.models import Banner
+from offers.models import ProductOffer, CategoryOffer
+from .models import Category, Product, ProductImage, ProductVariant
+from .pricing import price_items
 
+CATALOG_VERSION_KEY = 'catalog:version'
+PRODUCT_VERSION_KEY = 'product:{}:version'
+CATEGORY_VERSION_KEY = 'category:{}:version'
+VARIANT_MATRIX_CACHE_TIMEOUT = 60 * 60
+SEARCH_CONFIG = 'english'
 
-def calculate_discount(price, offer):
-    if offer.discount_type == 'percent':
-        discount = price * (offer.value / Decimal('100'))
-        if hasattr(offer, 'max_discount_amount') and offer.max_discount_amount:
-            discount = min(discount, offer.max_discount_amount)
-        return price - discount
-    else:  # fixed
-        return max(price - offer.value, Decimal('0'))
+
+def active_offer_filter(now=None):
+    now = now or timezone.now()
+    return (
+        Q(active=True) &
+        Q(start_date__lte=now) &
+        (Q(end_date__isnull=True) | Q(end_date__gte=now))
+    )
+
+
+def get_active_offers(product_ids, category_ids, now=None):
+    """
+    Loads the winning (highest priority) running offer for every product and
+    category in two queries, no matter how many ids are passed.
+    Returns: ({product_id: ProductOffer}, {category_id: CategoryOffer})
+    """
+    offer_filter = active_offer_filter(now)
+
+    product_offers = {}
+    if product_ids:
+        for offer in (
+            ProductOffer.objects
+            .filter(offer_filter, product_id__in=set(product_ids))
+            .order_by('-priority', '-start_date')
+        ):
+            product_offers.setdefault(offer.product_id, offer)
+
+    category_offers = {}
+    if category_ids:
+        for offer in (
+            CategoryOffer.objects
+            .filter(offer_filter, category_id__in=set(category_ids))
+            .order_by('-priority', '-start_date')
+        ):
+            category_offers.setdefault(offer.category_id, offer)
+
+    return product_offers, category_offers
+
+
+REVIEW_STAR_FIELDS = {
+    5: 'review_five_star',
+    4: 'review_four_star',
+    3: 'review_three_star',
+    2: 'review_two_star',
+    1: 'review_one_star',
+}
+
+
+def update_review_summary(product_id, added_star=None, removed_star=None):
+    """
+    Applies one review write to the product's rating summary.
+    Add -> added_star, delete -> removed_star, edit -> both.
+    Uses F() increments, call it inside the transaction that writes the review.
+    """
+    deltas = {}
+
+    def bump(field, amount):
+        deltas[field] = deltas.get(field, 0) + amount
+
+    if added_star:
+        bump('review_count', 1)
+        bump('review_star_total', added_star)
+        bump(REVIEW_STAR_FIELDS[added_star], 1)
+
+    if removed_star:
+        bump('review_count', -1)
+        bump('review_star_total', -removed_star)
+        bump(REVIEW_STAR_FIELDS[removed_star], -1)
+
+    changes = {field: F(field) + amount for field, amount in deltas.items() if amount}
+    if changes:
+        Product.objects.filter(pk=product_id).update(**changes)
+
+
+def refresh_product_prices(product_ids):
+    """
+    Recomputes the materialized prices used by the product list:
+    ProductVariant.effective_price (best offer price) and Product.base_price /
+    effective_price / in_stock (cheapest in-stock variant).
+    Called from signals on variant and offer writes, and from the
+    refresh_product_prices command to flip timed offers.
+    """
+    products = list(
+        Product.objects
+        .filter(pk__in=set(product_ids))
+        .prefetch_related('variants')
+    )
+    if not products:
+        return
+
+    product_offers, category_offers = get_active_offers(
+        [product.id for product in products],
+        [product.category_id for product in products],
+    )
+
+    # Every variant of the batch is priced in one call
+    priced = iter(price_items([
+        (variant.final_price, product_offers.get(product.id), category_offers.get(product.category_id))
+        for product in products
+        for variant in product.variants.all()
+    ]))
+
+    changed_variants = []
+    for product in products:
+        base_price = None
+        effective_price = None
+
+        for variant in product.variants.all():
+            offer_price, _, _ = next(priced)
+
+            if variant.effective_price != offer_price:
+                variant.effective_price = offer_price
+                changed_variants.append(variant)
+
+            if variant.stock > 0:
+                if base_price is None or variant.final_price < base_price:
+                    base_price = variant.final_price
+                if effective_price is None or offer_price < effective_price:
+                    effective_price = offer_price
+
+        product.base_price = base_price
+        product.effective_price = effective_price
+        product.in_stock = base_price is not None
+
+    # bulk_update skips signals and auto_now, so this never re-triggers a refresh
+    if changed_variants:
+        ProductVariant.objects.bulk_update(changed_variants, ['effective_price'])
+    Product.objects.bulk_update(products, ['base_price', 'effective_price', 'in_stock'])
+
+
+def refresh_product_thumbnails(product_ids):
+    """
+    Recomputes the product card fields: Product.representative_variant and
+    thumbnail_url, taken from the newest primary image (newest image when none
+    is primary). One DISTINCT ON query for the whole batch.
+    Called from signals on variant and image writes and from the admin product views.
+    """
+    products = list(Product.objects.filter(pk__in=set(product_ids)).only('representative_variant', 'thumbnail_url'))
+    if not products:
+        return
+
+    best_images = {
+        product_id: (variant_id, image_url)
+        for product_id, variant_id, image_url in (
+            ProductImage.objects
+            .filter(product_variant__product_id__in=[product.pk for product in products])
+            .order_by('product_variant__product_id', '-is_primary', '-created_at')
+            .distinct('product_variant__product_id')
+            .values_list('product_variant__product_id', 'product_variant_id', 'image_url')
+        )
+    }
+
+    changed = []
+    for product in products:
+        variant_id, image_url = best_images.get(product.pk, (None, ''))
+        if product.representative_variant_id != variant_id or product.thumbnail_url != image_url:
+            product.representative_variant_id = variant_id
+            product.thumbnail_url = image_url
+            changed.append(product)
+
+    if changed:
+        Product.objects.bulk_update(changed, ['representative_variant', 'thumbnail_url'])
+
+
+def get_cache_version(key):
+    """
+    Version number stored under `key`, used inside cache keys.
+    Bumping it orphans every cached entry built with the old number.
+    """
+    version = cache.get(key)
+    if version is None:
+        # A fresh value never collides with keys written before the cache was cleared
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key):
+    """
+    Moves `key` to the next version once the current transaction commits, so a
+    reader in another process never caches the old rows under the new version.
+    """
+    def bump():
+        version = cache.get(key)
+        # get + set rather than incr: the database backend does the same, and keeps timeout=None
+        cache.set(key, time.time_ns() if version is None else version + 1, timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def get_catalog_version():
+    """
+    Version of the whole catalog (homepage payload, facets, ...).
+    """
+    return get_cache_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_cache_version(CATALOG_VERSION_KEY)
+
+
+def bump_product_versions(product_ids=(), category_ids=()):
+    """
+    Invalidates per-product payloads (PDP variant matrix). Category offers bump
+    the category version instead of every product in the category.
+    """
+    for product_id in set(product_ids):
+        bump_cache_version(PRODUCT_VERSION_KEY.format(product_id))
+    for category_id in set(category_ids):
+        bump_cache_version(CATEGORY_VERSION_KEY.format(category_id))
+
+
+def next_promotion_boundary(now=None):
+    """
+    Returns the nearest future start_date / end_date among active product offers,
+    category offers and banners, or None when nothing is scheduled.
+    Cached payloads expire there so timed promotions flip on time.
+    """
+    now = now or timezone.now()
+    boundaries = []
+
+    for queryset in (
+        ProductOffer.objects.filter(active=True),
+        CategoryOffer.objects.filter(active=True),
+        Banner.objects.filter(is_active=True),
+    ):
+        result = queryset.aggregate(
+            next_start=Min('start_date', filter=Q(start_date__gt=now)),
+            next_end=Min('end_date', filter=Q(end_date__gt=now)),
+        )
+        boundaries.extend(value for value in result.values() if value)
+
+    return min(boundaries) if boundaries else None
+
+
+def cache_timeout_until_boundary(default_timeout, now=None):
+    now = now or timezone.now()
+    boundary = next_promotion_boundary(now)
+    if boundary is None:
+        return default_timeout
+    seconds = int((boundary - now).total_seconds()) + 1
+    return max(1, min(default_timeout, seconds))
+
+
+def build_variant_matrix(product):
+    """
+    PDP payload of a product: variants grouped by color with their offer prices,
+    and image urls per color (primary first). Prices come from products.pricing,
+    exact to the paisa and resolved like the cart.
+    in_wishlist is left False, it is per user.
+    Only JSON types in the result, it is cached and dumped straight into the page.
+    """
+    variants = (
+        product.variants
+        .filter(stock__gte=0)
+        .prefetch_related(
+            Prefetch('images', queryset=ProductImage.objects.order_by('-is_primary', '-created_at'))
+        )
+    )
+    product_offers, category_offers = get_active_offers([product.id], [product.category_id])
+    product_offer = product_offers.get(product.id)
+    category_offer = category_offers.get(product.category_id)
+
+    variants_by_color = {}
+    images_by_color = {}
+
+    variants = list(variants)
+    priced = price_items([(variant.final_price, product_offer, category_offer) for variant in variants])
+
+    for variant, (offer_price, offer, _) in zip(variants, priced):
+        price = variant.final_price
+        variants_by_color.setdefault(variant.color, []).append({
+            'id': variant.id,
+            'size': variant.size,
+            'stock': variant.stock,
+            'price': int(offer_price.quantize(Decimal('1'), rounding=ROUND_HALF_UP)),
+            'original_price': float(price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
+            'offer_type': offer.discount_type if offer else None,
+            'offer_value': float(offer.value) if offer else None,
+            'in_wishlist': False,
+            'has_offer': offer is not None,
+        })
+
+        images = images_by_color.setdefault(variant.color, [])
+        for image in variant.images.all():
+            if image.image_url not in images:
+                images.append(image.image_url)
+
+    return {
+        'variants_by_color': variants_by_color,
+        'images_by_color': images_by_color,
+        'all_colors': list(variants_by_color),
+    }
+
+
+def get_variant_matrix(product):
+    """
+    Cached build_variant_matrix. The key carries the product and category versions,
+    bumped on variant, image and offer writes, and expires at the next offer boundary.
+    """
+    cache_key = 'pdp:matrix:{}:{}:{}'.format(
+        product.pk,
+        get_cache_version(PRODUCT_VERSION_KEY.format(product.pk)),
+        get_cache_version(CATEGORY_VERSION_KEY.format(product.category_id)),
+    )
+    matrix = cache.get(cache_key)
+    if matrix is None:
+        matrix = build_variant_matrix(product)
+        cache.set(cache_key, matrix, cache_timeout_until_boundary(VARIANT_MATRIX_CACHE_TIMEOUT))
+    return matrix
+
+
+def product_search_document():
+    """
+    Weighted tsvector expression for Product.search_vector:
+    name (A), category name (B), variant colors (C), description (D).
+    """
+    category_name = Subquery(
+        Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1]
+    )
+    colors = Subquery(
+        ProductVariant.objects
+        .filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(colors=StringAgg('color', ' ', distinct=True))
+        .values('colors')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight='B', config=SEARCH_CONFIG)
+        + SearchVector(colors, weight='C', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(product_ids=None):
+    """
+    Rebuilds Product.search_vector in a single UPDATE (all products when no ids are given).
+    """
+    queryset = Product.objects.all()
+    if product_ids is not None:
+        queryset = queryset.filter(pk__in=set(product_ids))
+    queryset.update(search_vector=product_search_document())
+
+
+def search_products(queryset, q):
+    """
+    Filters a product queryset by full-text match or trigram (typo tolerant) name match,
+    and annotates search_rank for relevance ordering.
+    Both predicates are served by GIN indexes on search_vector and name.
+    The rank is cast to double precision so it round-trips exactly through pagination cursors.
+    """
+    q = q.strip()
+    query = SearchQuery(q, search_type='websearch', config=SEARCH_CONFIG)
+
+    return queryset.filter(
+        Q(search_vector=query) | Q(name__trigram_word_similar=q)
+    ).annotate(
+        search_rank=Cast(
+            SearchRank(F('search_vector'), query) + TrigramWordSimilarity(q, 'name'),
+            output_field=FloatField(),
+        )
+    )
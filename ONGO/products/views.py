@@ -7,16 +7,17 @@ from django_extensions import settings
 from adminpanel.models import Banner
 from .models import Product, ProductVariant, ProductImage, Category
 from cart.models import Cart
+from cart.utils import refresh_cart_count
 from accounts.models import Wishlist
 from offers.models import ProductOffer, CategoryOffer
 from order.models import ProductReview, Order
 
 from django.contrib.auth.models import AnonymousUser
 
-from django.db.models import Prefetch, Min, Case, When, DecimalField, Avg, Count
-from django.db.models.functions import Coalesce
+from django.db.models import Prefetch
 from django.db import transaction
 from django.views.decorators.cache import never_cache
+from django.core.cache import cache
 from django.contrib.auth.decorators import login_required
 
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -31,7 +32,10 @@ from django.utils.decorators import method_decorator
 
 from decimal import Decimal
 
-from .utils import calculate_discount
+from .utils import get_catalog_version, cache_timeout_until_boundary, search_products, get_variant_matrix
+from .pricing import price_items
+from adminpanel.pagination import KeysetPaginationMixin
+from .facets import apply_facet_filters, get_facets, parse_facet_selection
 
 # from django.shortcuts import get_object_or_404
 
@@ -49,10 +53,28 @@ logger = logging.getLogger(__name__)
 # Create your views here.
 
 
+HOMEPAGE_CACHE_TIMEOUT = 60 * 15
+
+
 def get_homepage_context(request):
+    """
+    Homepage payload is shared by every visitor, so it is built once per catalog
+    version and reused until a product/offer/banner write or the next promotion boundary.
+    """
+    cache_key = f'homepage:context:{get_catalog_version()}'
+    context = cache.get(cache_key)
+
+    if context is None:
+        now = timezone.now()
+        context = _build_homepage_context(now)
+        cache.set(cache_key, context, cache_timeout_until_boundary(HOMEPAGE_CACHE_TIMEOUT, now))
+
+    return context
+
+
+def _build_homepage_context(now):
     base_qs = Product.objects.filter(is_active=True, category__is_active=True).select_related('category')
 
-    now = timezone.now()
     active_offer_filter = (
         Q(active=True) &
         Q(start_date__lte=now) &
@@ -82,10 +104,8 @@ def get_homepage_context(request):
     )
 
     new_arrivals_qs = products_qs.order_by('-created_at')[:8]
-    trending_products_qs = products_qs.annotate(
-        review_count=Count('reviews')
-        ).order_by('-review_count', '-created_at')[:8]
-    categories = Category.objects.filter(is_active=True)[:6]
+    trending_products_qs = products_qs.order_by('-review_count', '-created_at')[:8]
+    categories = list(Category.objects.filter(is_active=True)[:6])
 
     new_arrivals = list(new_arrivals_qs)
     trending_products = list(trending_products_qs)
@@ -102,6 +122,7 @@ def get_homepage_context(request):
             else:
                 product_rep_map[product.id] = None
 
+        priced_products = []
         for product in products:
             rep_id = product_rep_map[product.id]
             product.rep_variant_id = rep_id
@@ -121,42 +142,31 @@ def get_homepage_context(request):
             else:
                 product.primary_image = None
 
-            base_price = Decimal(rep_variant.final_price) if rep_variant else Decimal('0.00')
-            product.base_price = base_price
-            best_discount = {'price': base_price, 'type': None, 'value': None}
-
-            if product.prefetched_product_offers:
-                offer = product.prefetched_product_offers[0]
-                discounted = calculate_discount(base_price, offer)
-                if discounted < best_discount['price']:
-                    best_discount = {
-                        'price': discounted,
-                        'type': offer.discount_type,
-                        'value': offer.value
-                    }
-
-            cat_offers = getattr(product.category, 'prefetched_category_offers', [])
-            if cat_offers:
-                offer = cat_offers[0]
-                discounted = calculate_discount(base_price, offer)
-                if discounted < best_discount['price']:
-                    best_discount = {
-                        'price': discounted,
-                        'type': offer.discount_type,
-                        'value': offer.value
-                    }
-
-            product.offer_price = best_discount['price'] if best_discount['price'] < base_price else None
-            product.offer_type = best_discount['type']
-            product.offer_value = best_discount['value']
+            product.base_price = Decimal(rep_variant.final_price) if rep_variant else Decimal('0.00')
+            priced_products.append(product)
+
+        priced = price_items([
+            (
+                product.base_price,
+                product.prefetched_product_offers[0] if product.prefetched_product_offers else None,
+                (getattr(product.category, 'prefetched_category_offers', None) or [None])[0],
+            )
+            for product in priced_products
+        ])
+
+        for product, (offer_price, offer, _) in zip(priced_products, priced):
+            discounted = offer is not None and offer_price < product.base_price
+            product.offer_price = offer_price if discounted else None
+            product.offer_type = offer.discount_type if discounted else None
+            product.offer_value = offer.value if discounted else None
 
     attach_offer_and_wishlist(new_arrivals)
     attach_offer_and_wishlist(trending_products)
 
-    banners = Banner.objects.filter(
+    banners = list(Banner.objects.filter(
         is_active=True,
-        start_date__lte=timezone.now(),
-        end_date__gte=timezone.now()).order_by('priority')
+        start_date__lte=now,
+        end_date__gte=now).order_by('priority'))
 
     return {
         'new_arrivals': new_arrivals,
@@ -176,7 +186,7 @@ def HomeView(request):
     return redirect('login')
 
 
-class ProductListView(ListView):
+class ProductListView(KeysetPaginationMixin, ListView):
 
     template_name = "products/productlist.html"
     model = Product
@@ -188,59 +198,30 @@ class ProductListView(ListView):
             Product.objects
             .filter(is_active=True, category__is_active=True)
             .select_related('category')
-            .prefetch_related(
-                Prefetch(
-                    'variants__images',
-                    queryset=ProductImage.objects.order_by('-is_primary', '-created_at')
-                )
-            )
         )
 
         # Search Query
         q = self.request.GET.get('q')
 
-        if q:
-            queryset = queryset.filter(name__icontains=q)
-
-        # Dynamic Category View
-        category_name = self.request.GET.getlist('category')  # e.g. ['men', 'women']
-        if category_name:
-            queryset = queryset.filter(category__name__in=category_name)
-
-        # ===== 2. PRICE FILTER =====
-        min_price = self.request.GET.get('min')
-        max_price = self.request.GET.get('max')
-
-        queryset = queryset.annotate(
-            display_price=Min(
-                Case(
-                    When(
-                        variants__stock__gt=0,
-                        then=Coalesce('variants__sale_price', 'variants__price')
-                    ),
-                    output_field=DecimalField()
-                )
-            )
-        )
+        if q and q.strip():
+            queryset = search_products(queryset, q)
 
-        if min_price:
-            try:
-                queryset = queryset.filter(display_price__gte=float(min_price))
-            except (ValueError, TypeError):
-                pass
-
-        if max_price:
-            try:
-                queryset = queryset.filter(display_price__lte=float(max_price))
-            except (ValueError, TypeError):
-                pass
+        # ===== 2. FACETS (category, price, size, color, availability) =====
+        # The sidebar counts are computed over the unfaceted result set
+        self.facet_base = queryset
+        self.facet_selection = parse_facet_selection(self.request.GET)
+        queryset = apply_facet_filters(queryset, self.facet_selection)
 
         # ===== 3. SORTING =====
-        sort = self.request.GET.get('sort', 'latest')
+        # effective_price is the materialized offer price of the cheapest in-stock variant
+        # Searches default to relevance unless the shopper picked a sort
+        searching = bool(q and q.strip())
+        sort = self.request.GET.get('sort', 'relevance' if searching else 'latest')
         ordering = {
+            'relevance': ['-search_rank', '-created_at'] if searching else ['-created_at'],
             'oldest': ['created_at'],
-            'l-h': ['display_price', '-created_at'],
-            'h-l': ['-display_price', '-created_at'],
+            'l-h': ['effective_price', '-created_at'],
+            'h-l': ['-effective_price', '-created_at'],
             'a-z': ['name'],
             'z-a': ['-name'],
         }.get(sort, ['-created_at'])
@@ -272,19 +253,12 @@ class ProductListView(ListView):
 
         products = context['products']
 
-        rep_variant_ids = []
-        product_rep_map = {}
-
-        for product in products:
-            rep_variant = product.get_representative_variant()
-            if rep_variant:
-                rep_variant_ids.append(rep_variant.id)
-                product_rep_map[product.id] = rep_variant.id
-            else:
-                product_rep_map[product.id] = None
+        # Card data is materialized on Product (representative_variant, thumbnail_url,
+        # base_price, effective_price), so cards cost no per-product queries
+        rep_variant_ids = [product.representative_variant_id for product in products if product.representative_variant_id]
 
         wishlist_variant_ids = set()
-        if self.request.user.is_authenticated:
+        if self.request.user.is_authenticated and rep_variant_ids:
             wishlist_variant_ids = set(
                 Wishlist.objects.filter(
                     user=self.request.user,
@@ -292,10 +266,19 @@ class ProductListView(ListView):
                 ).values_list('product_variant_id', flat=True)
             )
 
+        # Out of stock products have no materialized price, price their representative variant in one query
+        fallback_variants = ProductVariant.objects.in_bulk([
+            product.representative_variant_id for product in products
+            if product.base_price is None and product.representative_variant_id
+        ])
+
+        priced_products = []
         for product in products:
-            rep_id = product_rep_map[product.id]
+            rep_id = product.representative_variant_id
             product.rep_variant_id = rep_id
             product.in_wishlist = (rep_id in wishlist_variant_ids)
+            product.avg_rating_rounded = round(product.average_rating)
+            product.total_reviews = product.review_count
 
             if not rep_id:
                 product.offer_price = None
@@ -303,41 +286,34 @@ class ProductListView(ListView):
                 product.offer_value = None
                 continue
 
-            rep_variant = product.get_representative_variant()
-            base_price = Decimal(rep_variant.final_price)
-            best_discount = {'price': base_price, 'type': None, 'value': None}
-
-            if product.prefetched_product_offers:
-                offer = product.prefetched_product_offers[0]
-                discounted = calculate_discount(base_price, offer)
-                if discounted < best_discount['price']:
-                    best_discount = {
-                        'price': discounted,
-                        'type': offer.discount_type,
-                        'value': offer.value
-                    }
-
-            cat_offers = getattr(product.category, 'prefetched_category_offers', [])
-            if cat_offers:
-                offer = cat_offers[0]
-                discounted = calculate_discount(base_price, offer)
-                if discounted < best_discount['price']:
-                    best_discount = {
-                        'price': discounted,
-                        'type': offer.discount_type,
-                        'value': offer.value
-                    }
-
-            reviews = ProductReview.objects.filter(product=product).aggregate(avg_rating=Avg('star'),
-                                                                              total_reviews=Count('id'))
-            product.avg_rating_rounded = round(reviews['avg_rating']) if reviews['avg_rating'] else 0
-            product.total_reviews = reviews['total_reviews']
-
-            product.offer_price = best_discount['price']
-            product.offer_type = best_discount['type']
-            product.offer_value = best_discount['value']
-
-        context['categories'] = Category.objects.filter(is_active=True).order_by('name')
+            if product.base_price is not None:
+                product.card_price = product.base_price
+            else:
+                product.card_price = fallback_variants[rep_id].final_price
+            priced_products.append(product)
+
+        priced = price_items([
+            (
+                product.card_price,
+                product.prefetched_product_offers[0] if product.prefetched_product_offers else None,
+                (getattr(product.category, 'prefetched_category_offers', None) or [None])[0],
+            )
+            for product in priced_products
+        ])
+
+        for product, (offer_price, offer, _) in zip(priced_products, priced):
+            # Show the same price the list is filtered and sorted by
+            product.offer_price = product.effective_price if product.effective_price is not None else offer_price
+            if offer and offer_price < product.card_price:
+                product.offer_type = offer.discount_type
+                product.offer_value = offer.value
+            else:
+                product.offer_type = None
+                product.offer_value = None
+
+        categories = list(Category.objects.filter(is_active=True).order_by('name'))
+        context['categories'] = categories
+        context['facets'] = get_facets(self.facet_base, self.facet_selection, categories)
 
         # Preserve filters for pagination
         get_params = self.request.GET.copy()
@@ -378,37 +354,17 @@ class ProductDetailView(DetailView):
         return obj
 
     def get_queryset(self):
-        return Product.objects.filter(is_active=True)
+        return Product.objects.filter(is_active=True).select_related('category')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         product = self.object
-        category = product.category
         request = self.request
         user = request.user if request else AnonymousUser()
-        product_offer = (
-                product.offer
-                .filter(active=True)
-                .order_by('-priority')
-                .first()
-            )
-        category_offer = (
-                category.offer
-                .filter(active=True)
-                .order_by('-priority')
-                .first()
-            )
 
-        # Fetch all variants with images
-        variants = product.variants.filter(
-            stock__gte=0
-        ).prefetch_related(
-            Prefetch(
-                'images',
-                queryset=ProductImage.objects.order_by('-is_primary', '-created_at'),
-                to_attr='prefetched_images'
-            )
-        )
+        # Variant / price / image matrix is cached per product (see get_variant_matrix),
+        # only the wishlist flags are per user
+        matrix = get_variant_matrix(product)
 
         user_wishlist_variant_ids = set()
         if user.is_authenticated:
@@ -417,82 +373,21 @@ class ProductDetailView(DetailView):
                 .values_list('product_variant_id', flat=True)
             )
 
-        # Build raw data structures (no UX decisions)
         variants_by_color = {}
-        images_by_color = {}
         wishlist_status = {}  # Track wishlist per variant
-
-        for variant in variants:
-            color = variant.color
-
-            # for offers
-            variant_price = float(variant.final_price) if variant.final_price else None
-            offer_price = variant_price
-            offer_type = None
-            offer_value = None
-            has_offer = False
-            original_price = variant_price
-
-            if product_offer and product_offer.is_active_now():
-                offer_type = product_offer.discount_type
-                offer_value = float(product_offer.value)
-                has_offer = True
-
-                if offer_type == 'percent':
-                    offer_price = variant_price * (1 - offer_value / 100)
-                elif offer_type == 'fixed':
-                    offer_price = max(0, variant_price - offer_value)
-
-            if category_offer and category_offer.is_active_now():
-                category_offer_price = None
-                cat_offer_type = category_offer.discount_type
-                cat_offer_value = float(category_offer.value)
-
-                if cat_offer_type == 'percent':
-                    category_offer_price = variant_price * (1 - cat_offer_value / 100)
-
-                if category_offer_price < offer_price:
-                    offer_price = category_offer_price
-
-                    offer_type = category_offer.discount_type
-                    offer_value = float(cat_offer_value)
-                    has_offer = True
-
-            in_wishlist = variant.id in user_wishlist_variant_ids
-            wishlist_status[variant.id] = in_wishlist
-
-            # Raw variant data (truth only)
-            if color not in variants_by_color:
-                variants_by_color[color] = []
-
-            variants_by_color[color].append({
-                'id': variant.id,
-                'size': variant.size,
-                'stock': variant.stock,
-                'price': round(offer_price) if offer_price else None,
-                'original_price': round(original_price, 2) if original_price else None,
-                'offer_type': offer_type,
-                'offer_value': offer_value,
-                'in_wishlist': in_wishlist,
-                'has_offer': has_offer,
-            })
-
-            # All images for each color
-            if color not in images_by_color:
-                images_by_color[color] = set()
-            for img in variant.prefetched_images:
-                images_by_color[color].add(img.image_url)
-
-        # Convert sets to lists
-        for color in images_by_color:
-            images_by_color[color] = list(images_by_color[color])
+        for color, variants in matrix['variants_by_color'].items():
+            variants_by_color[color] = []
+            for variant in variants:
+                in_wishlist = variant['id'] in user_wishlist_variant_ids
+                wishlist_status[variant['id']] = in_wishlist
+                variants_by_color[color].append({**variant, 'in_wishlist': in_wishlist})
 
         # Context with raw data
         context.update({
             'product': product,
             'variants_by_color_json': variants_by_color,
-            'images_by_color_json': images_by_color,
-            'all_colors': list(variants_by_color.keys()),
+            'images_by_color_json': matrix['images_by_color'],
+            'all_colors': matrix['all_colors'],
             'wishlist_status_json': wishlist_status,
             'display_price': product.get_display_price(),
         })
@@ -506,25 +401,10 @@ class ProductDetailView(DetailView):
         )
         reviews_to_show = reviews_queryset[:3]
 
-        review_summary = reviews_queryset.aggregate(
-            total_reviews=Count('id'),
-            average_rating=Avg('star'),
-        )
-        total_reviews = review_summary['total_reviews'] or 0
-        average_rating = float(review_summary['average_rating'] or 0)
-
-        rating_distribution = {
-            'five_star': 0,
-            'four_star': 0,
-            'three_star': 0,
-            'two_star': 0,
-            'one_star': 0,
-        }
-        star_key_map = {5: 'five_star', 4: 'four_star', 3: 'three_star', 2: 'two_star', 1: 'one_star'}
-        for item in reviews_queryset.values('star').annotate(count=Count('id')):
-            key = star_key_map.get(item['star'])
-            if key:
-                rating_distribution[key] += item['count']
+        # Rating summary is maintained on the product row, no aggregate queries needed
+        total_reviews = product.review_count
+        average_rating = float(product.average_rating)
+        rating_distribution = product.rating_distribution
 
         rating_percentages = {
             key: round((value / total_reviews) * 100) if total_reviews else 0
@@ -599,6 +479,7 @@ class AddToCartView(LoginRequiredMixin, View):
 
             cart_item.quantity = new_quantity
             cart_item.save()
+            refresh_cart_count(request)
 
             message = 'Product added to cart.' if created else f'{qty} more added to cart.'
             return JsonResponse({'success': True, 'message': message})
@@ -13,7 +13,9 @@ document.addEventListener('DOMContentLoaded', () => {
                     method: 'POST',
                     headers: {
                         'X-CSRFToken': getCookie('csrftoken'),
-                        'Content-Type': 'application/json'
+                        'Content-Type': 'application/json',
+                        // Same key for every click on this page: a retry gets the first order back
+                        'Idempotency-Key': placeOrderBtn.dataset.idempotencyKey
                     },
                     body: JSON.stringify({})
                 });